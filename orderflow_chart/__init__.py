@@ -1,14 +1,84 @@
-import string
-import random
-import warnings
+import logging
 
 import pandas as pd
 import numpy as np
 
-from .data_wrangling import OrderFlowData
+from .cache import ProcessedCache
+from .identifiers import _candle_codes, _letter_identifiers
+from .imbalance import IMBALANCE_COLUMNS, DiagonalImbalance, build_engine
+from .profiler import StageProfiler, build_profiler, staged
+from .data_wrangling import (OrderFlowData, CUM_DELTA_WINDOW, SessionIndicators, build_indicators,
+                             infer_granularity)
 from .plot import OrderFlowPlot
 
-warnings.filterwarnings('ignore')
+logger = logging.getLogger(__name__)
+# the messages are only shown when the application configures logging
+logger.addHandler(logging.NullHandler())
+
+CANDLE_STATS = ('poc', 'max_delta', 'min_delta', 'buy_imbalance', 'sell_imbalance', 'vwap',
+                'stacked_buy', 'stacked_sell', 'unfinished_high', 'unfinished_low',
+                'session_delta', 'session_vwap', 'session_poc')
+# stats counted from the columns of an imbalance engine
+ENGINE_STATS = ('stacked_buy', 'stacked_sell', 'unfinished_high', 'unfinished_low')
+# stats taken from the columns of the session indicators
+INDICATOR_STATS = ('session_delta', 'session_vwap', 'session_poc')
+PRICE_STATS = ('poc', 'vwap', 'session_vwap', 'session_poc')
+IMBALANCE_THRESHOLD = 0.5
+PROFILE_BARS = np.array(['                    ' + '█' * i for i in range(11)], dtype=object)
+PROFILE_DTYPE = pd.CategoricalDtype(PROFILE_BARS)
+
+
+def _format_unique(values, formatter, na='nan'):
+    """
+    Format each distinct value once and map the results back onto the rows.
+    Footprint sizes and timestamps repeat heavily so this is much cheaper than
+    formatting every row. Missing values are mapped to na.
+    Floats are factorized on their bit patterns so that -0.0 keeps its own text.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        codes, uniques = pd.factorize(values.view(np.int64))
+        uniques = uniques.view(np.float64)
+    else:
+        codes, uniques = pd.factorize(values)
+    table = np.array([formatter(u) for u in uniques] + [na], dtype=object)
+    return table[codes]
+
+
+def _group_bounds(codes, n):
+    """
+    Return the first and last position of every code in the sorted codes,
+    and a mask of the codes which have at least one row.
+    """
+    counts = np.bincount(codes, minlength=n)
+    ends = np.cumsum(counts) - 1
+    return ends - counts + 1, ends, counts > 0
+
+
+def _group_max(keys, values):
+    """
+    Return the largest value of the rows sharing each row's key, ignoring NaN.
+    The rows of a candle are contiguous, so the maxima are taken over the runs of equal keys with
+    np.fmax.reduceat, hashing only the first key of every run to check that no key has two runs.
+    """
+    keys = np.asarray(keys)
+    if keys.shape[0] == 0:
+        return values
+    heads = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    if not pd.Index(keys[heads]).is_unique:
+        return pd.Series(values).groupby(keys).transform('max').to_numpy()
+    return np.repeat(np.fmax.reduceat(values, heads), np.diff(np.r_[heads, keys.shape[0]]))
+
+
+def _group_extremes(codes, values, n):
+    """
+    Return the positions of the smallest and largest value of every group, found with a
+    single lexsort. Groups without rows get position -1.
+    """
+    order = np.lexsort((values, codes))
+    first, last, present = _group_bounds(codes, n)
+    argmin = np.where(present, order[first.clip(0)], -1)
+    argmax = np.where(present, order[last.clip(0)], -1)
+    return argmin, argmax
 
 
 class OrderFlowChart(
@@ -21,7 +91,9 @@ class OrderFlowChart(
     It takes in orderflow data and OHLC data, processes it, and provides methods to plot
     the order flow chart.
     """
-    def __init__(self, orderflow_data, ohlc_data, identifier_col=None, imbalance_col=None, **kwargs):
+    def __init__(self, orderflow_data, ohlc_data, identifier_col=None, imbalance_col=None, lazy_text=False,
+                 cum_delta_window=CUM_DELTA_WINDOW, stats=None, integer_codes=False, cache=None, compact=False,
+                 imbalance_engine=None, indicators=None, profiler=None, **kwargs):
         """
         The constructor for OrderFlowChart class.
         It takes in the orderflow data and the ohlc data and creates a unique identifier for each candle if not provided.
@@ -31,165 +103,427 @@ class OrderFlowChart(
         ohlc_data: ['open', 'high', 'low', 'close', 'identifier']
 
         The identifier column is used to map the orderflow data to the ohlc data.
+        With lazy_text the bid/ask and volume profile text columns are not built while
+        processing, only for the cells that are plotted or exported.
+        cum_delta_window is the number of candles summed in the cumulative delta and stats
+        is a list of extra per candle labels taken from CANDLE_STATS.
+        With integer_codes the candles are keyed by dense int32 codes in time order instead of
+        the identifier strings, which are kept in the 'label' column of the ohlc data.
+        cache is a ProcessedCache, or the directory of one, in which process_data looks up
+        the processed frames of the same inputs and settings before processing them.
+        With compact the processed frames are kept in low memory dtypes: float32 sizes, prices as
+        int32 ticks of the granularity, integer codes, the footprint text built lazily and the
+        volume profile bars as a categorical. memory_report lists the bytes held by each frame.
+        imbalance_engine replaces the imbalance formula with one of the IMBALANCE_ENGINES, given
+        as an engine, a name or a dict of settings, e.g. DiagonalImbalance(ratio=3, stacked=3).
+        The engine computes the imbalance candle by candle and adds its IMBALANCE_COLUMNS to the
+        orderflow rows, from which the ENGINE_STATS are counted.
+        indicators adds the developing session indicators to the ohlc data: the session vwap and its
+        bands, the poc and value area of the session volume profile and the cumulative session delta,
+        given as a SessionIndicators, 'session' or a dict of settings, e.g. {'name': 'session',
+        'offset': '18h'}. They are drawn over the footprint and the INDICATOR_STATS label them.
+        profiler records the time, rows and allocated bytes of the stages of process_data and plot,
+        given as a StageProfiler, True for a new one, or a callable called with every record.
+        It is kept in the profiler attribute, which can also be set later.
         """
+        self.profiler = build_profiler(profiler)
+        self.cache = ProcessedCache(cache) if isinstance(cache, str) else cache
+        self.compact = compact
+        self.lazy_text = lazy_text or compact
+        self.integer_codes = integer_codes or compact
+        self.cum_delta_window = cum_delta_window
+        self.stats = list(stats or [])
+        unknown = set(self.stats) - set(CANDLE_STATS)
+        if unknown:
+            raise ValueError("Unknown stats {}, expected any of {}".format(sorted(unknown), CANDLE_STATS))
+        self.imbalance_engine = build_engine(imbalance_engine)
+        if self.imbalance_engine is None and set(self.stats) & set(ENGINE_STATS):
+            raise ValueError("The stats {} need an imbalance_engine".format(ENGINE_STATS))
+        if self.imbalance_engine is not None and imbalance_col is not None:
+            raise ValueError("imbalance_col and imbalance_engine cannot be used together")
+        self.indicators = build_indicators(indicators)
+        if self.indicators is None and set(self.stats) & set(INDICATOR_STATS):
+            raise ValueError("The stats {} need indicators".format(INDICATOR_STATS))
 
         if 'data' in kwargs:
             self.use_processed_data(kwargs['data'])
+        elif 'processed' in kwargs:
+            self.identifier_col = identifier_col
+            self.imbalance_col = imbalance_col
+            self.use_processed_frames(kwargs['processed'])
         else:
             self.orderflow_data = orderflow_data
             self.ohlc_data = ohlc_data
             self.identifier_col = identifier_col
             self.imbalance_col = imbalance_col
             self.is_processed = False
-            self.granularity = abs(self.orderflow_data.iloc[0]['price'] - self.orderflow_data.iloc[1]['price'])
+            self.granularity = infer_granularity(self.orderflow_data['price'])
 
     def create_identifier(self):
         """
-        This method will generate a unique gibberish string for each candle based on the timestamp and the price.
+        This method will generate a unique 5 letter string for each candle from its position.
         """
-        letters = string.ascii_letters
-        identifier = [ ''.join(random.choice(letters) for _ in range(5)) for i in range(self.ohlc_data.shape[0]) ]
-        self.ohlc_data['identifier'] = identifier
-        self.orderflow_data.loc[:, 'identifier'] = self.ohlc_data['identifier']
+        self.assign_identifier(self.orderflow_data, self.ohlc_data)
+
+    def assign_identifier(self, orderflow_data, ohlc_data, start=0):
+        """
+        This method will write an identifier column to the given ohlc rows, the position of every
+        candle counted from start written with 5 letters, and map it to the orderflow rows through
+        their timestamps. The candles appended later are counted on from the candles already in the
+        chart, so the identifiers stay unique across batches.
+        """
+        ohlc_data['identifier'] = _letter_identifiers(np.arange(start, start + ohlc_data.shape[0]))
+        orderflow_data.loc[:, 'identifier'] = ohlc_data['identifier']
 
     def create_sequence(self):
         """
         This method will create a sequence column in the ohlc_data and orderflow_data based on the identifier column.
         """
-        self.ohlc_data['sequence'] = self.ohlc_data[self.identifier_col].str.len()
-        self.orderflow_data['sequence'] = self.orderflow_data[self.identifier_col].str.len()
+        self.assign_sequence(self.orderflow_data, self.ohlc_data)
+
+    def assign_sequence(self, orderflow_data, ohlc_data):
+        """
+        This method will write the sequence column of the given rows, the identifier itself
+        for integer codes and the identifier length otherwise.
+        """
+        if self.integer_codes:
+            ohlc_data['sequence'] = ohlc_data['identifier']
+            orderflow_data['sequence'] = orderflow_data['identifier']
+        else:
+            ohlc_data['sequence'] = ohlc_data['identifier'].str.len()
+            orderflow_data['sequence'] = orderflow_data['identifier'].str.len()
 
-    def calc_imbalance(self, df):
+    def encode_candles(self, orderflow_data, ohlc_data, start=0, by_identifier=True):
+        """
+        This method will key the candles by dense int32 codes in time order, starting at start.
+        The ohlc rows are sorted by time (keeping the input order of equal timestamps), their
+        identifier is moved to a 'label' column and replaced by the code, and the orderflow rows
+        are mapped to the codes through their identifier, or through their timestamp when
+        by_identifier is False. Orderflow rows without a candle are dropped.
+        It returns the encoded (orderflow_data, ohlc_data).
+        """
+        ohlc_data = ohlc_data.iloc[np.argsort(ohlc_data.index.to_numpy(), kind='stable')].copy()
+        codes = np.arange(start, start + ohlc_data.shape[0], dtype=np.int32)
+        if ohlc_data.shape[0] == 1:
+            labels = ohlc_data['identifier'].to_numpy() if by_identifier else ohlc_data.index.astype(str)
+            row_codes = np.full(orderflow_data.shape[0], start)
+        elif by_identifier:
+            labels = ohlc_data['identifier'].to_numpy()
+            row_codes = _candle_codes(labels, orderflow_data['identifier'].to_numpy())
+        else:
+            labels = ohlc_data.index.astype(str)
+            row_codes = ohlc_data.index.get_indexer(orderflow_data.index)
+        if ohlc_data.shape[0] != 1:
+            rows = row_codes >= 0
+            orderflow_data = orderflow_data[rows].copy()
+            row_codes = codes[row_codes[rows]]
+        ohlc_data['label'] = labels
+        ohlc_data['identifier'] = codes
+        orderflow_data['identifier'] = row_codes.astype(np.int32)
+        return orderflow_data, ohlc_data
+
+    @staged('calc_imbalance')
+    def calc_imbalance(self, df, prev=None, size=None):
         """
         This method will calculate the imbalance for the orderflow data.
         It will create a new column 'size' which is the difference between the bid size and the ask size.
+        prev is the processed row preceding df, it is used when df continues an already
+        processed frame so that the shifted ask size and the filled imbalance carry over.
+        size is the imbalance of the rows when it was already computed, see imbalance.
         """
+        if self.compact:
+            self.downcast(df)
         df['sum'] = df['bid_size'] + df['ask_size']
-        df['time'] = df.index.astype(str)
-        bids, asks = [], []
-        for b, a in zip(df['bid_size'].astype(int).astype(str),
-                        df['ask_size'].astype(int).astype(str)):
-            dif = 4 - len(a)
-            a = a + (' ' * dif)
-            dif = 4 - len(b)
-            b = (' ' * dif) + b
-            bids.append(b)
-            asks.append(a)
-
-        df['text'] = pd.Series(bids, index=df.index) + '  ' + \
-            pd.Series(asks, index=df.index)
+        df['time'] = df.index if self.compact else self.time_text(df.index)
+        if not self.lazy_text:
+            df['text'] = self.footprint_text(df)
         df.index = df['identifier']
 
-        if self.imbalance_col is None:
-            print("Calculating imbalance, as no imbalance column was provided.")
-            df['size'] = (df['bid_size'] - df['ask_size'].shift().bfill()) / \
-                (df['bid_size'] + df['ask_size'].shift().bfill())
-            df['size'] = df['size'].ffill().bfill()
+        if size is not None:
+            df['size'] = size
+        elif self.imbalance_engine is not None:
+            if prev is None:
+                logger.info("Calculating imbalance with the %s engine.", self.imbalance_engine.name)
+            for column, values in self.engine_imbalance(df).items():
+                df[column] = values
+        elif self.imbalance_col is None:
+            if prev is None:
+                logger.info("Calculating imbalance, as no imbalance column was provided.")
+            df['size'] = self.imbalance(df, prev)
         else:
-            print("Using imbalance column: {}".format(self.imbalance_col))
+            if prev is None:
+                logger.info("Using imbalance column: %s", self.imbalance_col)
             df['size'] = df[self.imbalance_col]
             df = df.drop([self.imbalance_col], axis=1)
+        if self.compact:
+            df['size'] = df['size'].astype(np.float32)
         # df = df.drop(['bid_size', 'ask_size'], axis=1)
         return df
 
+    def engine_imbalance(self, df):
+        """
+        This method will return the columns of the imbalance engine for the orderflow rows,
+        indexed by identifier, grouping the price levels by candle.
+        """
+        codes, _ = pd.factorize(df.index)
+        ticks = np.rint(self.prices(df) / self.granularity)
+        return self.imbalance_engine(codes, ticks, df['bid_size'].to_numpy(), df['ask_size'].to_numpy())
+
+    def downcast(self, df):
+        """
+        This method will convert the orderflow rows to the compact dtypes in place:
+        float32 bid and ask sizes and prices as int32 ticks of the granularity.
+        Rows which are already converted are left as they are.
+        """
+        for column in ['bid_size', 'ask_size']:
+            if df[column].dtype != np.float32:
+                df[column] = df[column].astype(np.float32)
+        if df['price'].dtype.kind == 'f':
+            df['price'] = np.rint(df['price'].to_numpy() / self.granularity).astype(np.int32)
+
+    def prices(self, frame):
+        """
+        This method will return the prices of the rows of frame as floats,
+        converting the int32 ticks of the compact frames.
+        """
+        price = frame['price'].to_numpy()
+        if price.dtype.kind in 'iu':
+            return price * self.granularity
+        return price.astype(float, copy=False)
+
+    def imbalance(self, df, prev=None):
+        """
+        This method will return the imbalance of every orderflow row, between its bid size and
+        the ask size of the previous row, filled forward over the empty levels.
+        prev is the processed row preceding df, as in calc_imbalance.
+        """
+        ask = df['ask_size'].shift()
+        if prev is not None:
+            ask.iloc[0] = prev['ask_size']
+        ask = ask.bfill()
+        size = (df['bid_size'] - ask) / (df['bid_size'] + ask)
+        size = size.ffill()
+        if prev is not None:
+            size = size.fillna(prev['size'])
+        return size.bfill()
+
+    @staged('annotate')
     def annotate(self, df2):
         """
         This method will annotate the orderflow data with the sum of bid and ask sizes.
         It will create a new column 'text' which is a string of █ characters based on the sum of bid and ask sizes.
+        The rows are not modified, a new frame is returned. In compact mode it only holds the
+        columns of the volume profile and the bars are a categorical of PROFILE_BARS.
         """
-        df2 = df2.drop(['size'], axis=1)
-        df2['sum'] = df2['sum'] / df2.groupby(df2.index)['sum'].transform('max')
-        df2['text'] = ''
-        df2['time'] = df2['time'].astype(str)
-        df2['text'] = ['█' * int(sum_ * 10) for sum_ in df2['sum']]
-        df2['text'] = '                    ' + df2['text']
-        df2['time'] = df2['time'].astype(str)
+        if self.compact:
+            df2 = df2.drop([i for i in df2 if i not in ('price', 'identifier', 'sequence', 'sum')], axis=1)
+        else:
+            df2 = df2.drop([i for i in ('size',) + IMBALANCE_COLUMNS if i in df2], axis=1)
+        # normalised in double precision, so that float32 sizes give the same bars
+        sums = df2['sum'].to_numpy(dtype=np.float64)
+        df2['sum'] = sums / _group_max(df2.index.to_numpy(), sums)
+        if self.compact:
+            df2['text'] = pd.Categorical.from_codes(self.profile_steps(df2), dtype=PROFILE_DTYPE)
+            df2['sum'] = df2['sum'].astype(np.float32)
+        elif not self.lazy_text:
+            df2['text'] = self.profile_text(df2)
         return df2
 
-    def range_proc(self, ohlc, type_='hl'):
+    def time_text(self, index):
         """
-        This method will process the ohlc data to create a sequence of high and low prices
-        or open and close prices based on the type parameter.
-        It will create a new dataframe with the following columns:
-        - price: the high or low or open or close price
-        - identifier: the identifier of the candle
-        - sequence: the sequence number of the candle
-        - time: the timestamp of the candle
+        This method will return the timestamps of the index as strings.
         """
-        if type_ == 'hl':
-            seq = pd.concat([ohlc['low'], ohlc['high']])
-        if type_ == 'oc':
-            seq = pd.concat([ohlc['open'], ohlc['close']])
-        id_seq = pd.concat([ohlc['identifier'], ohlc['identifier']])
-        seq_hl = pd.concat([ohlc['sequence'], ohlc['sequence']])
-        seq = pd.DataFrame(seq, columns=['price'])
-        seq['identifier'] = id_seq
-        seq['sequence'] = seq_hl
-        seq['time'] = seq.index
-        seq = seq.sort_index()
-        seq = seq.set_index('identifier')
-        return seq
-
-    def candle_proc(self, df):
-        """
-        This method will process the dataframe to create a sequence of candles.
-        It will create a new dataframe with the following columns:
-        - price: the price of the candle
-        - identifier: the identifier of the candle
+        codes, uniques = pd.factorize(index)
+        return uniques.astype(str).to_numpy()[codes]
+
+    def footprint_text(self, df):
+        """
+        This method will return the 'bid  ask' text of each footprint cell,
+        with the bid size right aligned and the ask size left aligned on 4 characters.
+        """
+        bids = df['bid_size'].to_numpy().astype(np.int64)
+        asks = df['ask_size'].to_numpy().astype(np.int64)
+        # pack both sizes into one key so each distinct pair is formatted once
+        low = min(bids.min(initial=0), asks.min(initial=0))
+        span = max(bids.max(initial=0), asks.max(initial=0)) - low + 1
+        text = _format_unique((bids - low) * span + (asks - low),
+                              lambda key: '{:>4}  {:<4}'.format(key // span + low, key % span + low))
+        return pd.Series(text, index=df.index)
+
+    def profile_text(self, df2):
+        """
+        This method will return the volume profile bar of each cell, a string of up to 10 █
+        characters proportional to the normalised sum. The bars come from a lookup table
+        of the 11 possible strings.
+        """
+        return pd.Series(PROFILE_BARS[self.profile_steps(df2)], index=df2.index)
+
+    def profile_steps(self, df2):
+        """
+        This method will return the number of █ characters of the bar of each cell.
+        """
+        return np.nan_to_num(df2['sum'].to_numpy(dtype=float) * 10).clip(0, 10).astype(int)
+
+    def candle_segments(self, ohlc, type_='hl'):
+        """
+        This method will build the lines drawing the candles of ohlc in a single vectorized pass,
+        from the low to the high price (the wicks) with type_ 'hl', or between the open and
+        close prices (the bodies) with type_ 'oc'.
+        Every candle gives three rows, its lowest and its highest price followed by a row of NaN
+        which breaks the line before the next candle, and the candles are ordered by time and sequence.
+        It will return a dataframe indexed by identifier with the following columns:
+        - price: the price of the point
         - sequence: the sequence number of the candle
+        - time: the timestamp of the candle
         """
-        df = df.sort_values(by=['time', 'sequence', 'price'])
-        df = df.reset_index()
-        df_dp = df.iloc[1::2].copy()
-        df = pd.concat([df, df_dp])
-        df = df.sort_index()
-        df = df.set_index('identifier')
-        df = df.sort_values(by=['time', 'sequence'])
-        # df = df.sort_index()
-        df[2::3] = np.nan
-        return df
+        first, second = ('low', 'high') if type_ == 'hl' else ('open', 'close')
+        order = np.lexsort((ohlc['sequence'].to_numpy(), ohlc.index.to_numpy()))
+        first, second = ohlc[first].to_numpy(dtype=float)[order], ohlc[second].to_numpy(dtype=float)[order]
+        n = order.shape[0]
+        gap = np.tile([False, False, True], n)
 
-    def calc_params(self, of, ohlc):
+        price = np.stack([np.minimum(first, second), np.maximum(first, second), np.full(n, np.nan)], axis=1)
+        sequence = np.repeat(ohlc['sequence'].to_numpy(dtype=float)[order], 3)
+        sequence[gap] = np.nan
+        segments = pd.DataFrame({
+            'price': price.ravel(),
+            'sequence': sequence,
+            'time': ohlc.index.take(np.repeat(order, 3)).where(~gap),
+        }, index=pd.Index(np.repeat(ohlc['identifier'].to_numpy()[order], 3), name='identifier'))
+        return segments
+
+    @staged('calc_params')
+    def calc_params(self, of, ohlc, history=None):
         """
-        This method will calculate the delta, cumulative delta, rate of change and volume for the orderflow data.
+        This method will calculate the delta, cumulative delta, rate of change and volume for the orderflow data,
+        followed by the extra stats requested in the constructor.
         It will create a new dataframe with the following columns:
         - value: the value of the delta, cumulative delta, rate of change or volume
         - type: the type of the value (delta, cum_delta, roc, volume)
         - text: the text representation of the value
+        history holds the deltas of the candles preceding ohlc, for the rolling cumulative delta.
+        """
+        return self.param_labels(self.candle_stats(of, ohlc), history)
+
+    def candle_stats(self, of, ohlc):
+        """
+        This method will aggregate the orderflow rows of every candle in a single pass,
+        using np.bincount over the position of each row's candle in ohlc.
+        It returns a dataframe indexed by identifier, in ohlc order, with the ask, bid,
+        delta and volume of each candle and the extra stats requested in the constructor.
+        """
+        identifiers = ohlc['identifier'].to_numpy()
+        n = identifiers.shape[0]
+        codes = _candle_codes(identifiers, of['identifier'].to_numpy())
+        rows = codes >= 0
+        if rows.all():
+            rows = slice(None)
+        codes = codes[rows]
+        ask = of['ask_size'].to_numpy(dtype=float)[rows]
+        bid = of['bid_size'].to_numpy(dtype=float)[rows]
+
+        stats = {
+            'ask': np.bincount(codes, weights=ask, minlength=n),
+            'bid': np.bincount(codes, weights=bid, minlength=n),
+        }
+        stats['delta'] = stats['ask'] - stats['bid']
+        stats['volume'] = stats['ask'] + stats['bid']
+
+        price = self.prices(of)[rows]
+        if 'poc' in self.stats:
+            _, argmax = _group_extremes(codes, ask + bid, n)
+            stats['poc'] = np.where(argmax >= 0, price[argmax], np.nan)
+        if 'max_delta' in self.stats or 'min_delta' in self.stats:
+            level_delta = ask - bid
+            argmin, argmax = _group_extremes(codes, level_delta, n)
+            stats['max_delta'] = np.where(argmax >= 0, level_delta[argmax], np.nan)
+            stats['min_delta'] = np.where(argmin >= 0, level_delta[argmin], np.nan)
+        if 'buy_imbalance' in self.stats or 'sell_imbalance' in self.stats:
+            size = of['size'].to_numpy(dtype=float)[rows]
+            if 'buy_imbalance' in of:
+                buy, sell = of['buy_imbalance'].to_numpy()[rows], of['sell_imbalance'].to_numpy()[rows]
+            else:
+                buy, sell = size <= -IMBALANCE_THRESHOLD, size >= IMBALANCE_THRESHOLD
+            stats['buy_imbalance'] = np.bincount(codes[buy], minlength=n)
+            stats['sell_imbalance'] = np.bincount(codes[sell], minlength=n)
+        for name in ['stacked_buy', 'stacked_sell']:
+            if name in self.stats:
+                stats[name] = np.bincount(codes[of[name].to_numpy()[rows]], minlength=n)
+        if 'unfinished_high' in self.stats or 'unfinished_low' in self.stats:
+            unfinished = of['unfinished'].to_numpy()[rows]
+            stats['unfinished_high'] = np.bincount(codes[unfinished == 1], minlength=n)
+            stats['unfinished_low'] = np.bincount(codes[unfinished == -1], minlength=n)
+        if 'vwap' in self.stats:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                stats['vwap'] = np.round(np.bincount(codes, weights=price * (ask + bid), minlength=n) /
+                                         stats['volume'], 2)
+        for name in INDICATOR_STATS:
+            if name in self.stats:
+                stats[name] = ohlc[name].to_numpy()
+
+        columns = ['ask', 'bid', 'delta', 'volume'] + [i for i in CANDLE_STATS if i in self.stats]
+        return pd.DataFrame({i: stats[i] for i in columns}, index=pd.Index(identifiers, name='identifier'))
+
+    def param_labels(self, stats, history=None):
         """
-        delta = of.groupby(of['identifier']).sum()['ask_size'] - \
-            of.groupby(of['identifier']).sum()['bid_size']
-        delta = delta[ohlc['identifier']]
-        cum_delta = delta.rolling(10).sum()
+        This method will turn the candle stats into labels, adding the cumulative delta over
+        cum_delta_window candles and its rate of change.
+        history holds the deltas of the candles preceding stats.
+        """
+        history = np.asarray([] if history is None else history, dtype=float)
+        deltas = pd.Series(np.concatenate([history, stats['delta'].to_numpy()]))
+        cum_delta = deltas.rolling(self.cum_delta_window).sum()
         roc = cum_delta.diff()/cum_delta.shift(1) * 100
         roc = roc.fillna(0).round(2)
-        volume = of.groupby(of['identifier']).sum()['ask_size'] + of.groupby(of['identifier']).sum()['bid_size']
-        delta = pd.DataFrame(delta, columns=['value'])
-        delta['type'] = 'delta'
-        cum_delta = pd.DataFrame(cum_delta, columns=['value'])
-        cum_delta['type'] = 'cum_delta'
-        roc = pd.DataFrame(roc, columns=['value'])
-        roc['type'] = 'roc'
-        volume = pd.DataFrame(volume, columns=['value'])
-        volume['type'] = 'volume'
-
-        labels = pd.concat([delta, cum_delta, roc, volume])
-        labels = labels.sort_index()
-        labels['text'] = labels['value'].astype(str)
-
-        labels['value'] = np.tanh(labels['value'])
-        # raise Exception
+        new = slice(history.shape[0], None)
+
+        params = {
+            'delta': stats['delta'].to_numpy(),
+            'cum_delta': cum_delta.iloc[new].to_numpy(),
+            'roc': roc.iloc[new].to_numpy(),
+            'volume': stats['volume'].to_numpy(),
+        }
+        for name in self.stats:
+            params[name] = stats[name].to_numpy()
+        return self.label_frame(params, stats.index)
+
+    def label_frame(self, params, identifiers):
+        """
+        This method will stack the per candle parameters into the labels dataframe shown below the footprint.
+        params maps each label type to its values, in the order of identifiers.
+        Price like stats are given a neutral colour value.
+        """
+        n = len(identifiers)
+        texts = [_format_unique(np.asarray(values), str) for values in params.values()]
+        values = [np.zeros(n) if name in PRICE_STATS else np.asarray(values, dtype=float)
+                  for name, values in params.items()]
+        labels = pd.DataFrame({
+            'value': np.tanh(np.concatenate(values)),
+            'type': np.repeat(np.array(list(params), dtype=object), n),
+            'text': np.concatenate(texts),
+        }, index=pd.Index(np.tile(np.asarray(identifiers), len(params)), name='identifier'))
         return labels
 
-    def plot_ranges(self, ohlc):
+    def plot_ranges(self, ohlc, fit=False):
         """
         This method will calculate the ranges for the plot.
         It will return the ymin, ymax, xmin, xmax, tickvals and ticktext for the plot.
+        The ranges show the last 9 candles, or all the candles of ohlc with fit.
         """
-        ymin = ohlc['high'][-1] + 1
-        ymax = ymin - int(48*self.granularity)
-        xmax = ohlc.shape[0]
-        xmin = xmax - 9
+        if fit:
+            ymin = ohlc['high'].max() + self.granularity
+            ymax = ohlc['low'].min() - self.granularity
+            xmin, xmax = -0.5, ohlc.shape[0] - 0.5
+        else:
+            ymin = ohlc['high'].iloc[-1] + 1
+            ymax = ymin - int(48*self.granularity)
+            xmax = ohlc.shape[0]
+            xmin = xmax - 9
+        if self.integer_codes:
+            # the x axis is numeric, positioned by the codes of the candles
+            xmin += ohlc['identifier'].iloc[0]
+            xmax += ohlc['identifier'].iloc[0]
         tickvals = [i for i in ohlc['identifier']]
-        ticktext = [i for i in ohlc.index]
+        # plotly keeps microseconds, truncated here so that it does not warn about the nanoseconds
+        ticktext = [i for i in ohlc.index.floor('us')]
         return ymin, ymax, xmin, xmax, tickvals, ticktext
@@ -0,0 +1,155 @@
+import contextlib
+import importlib.util
+import io
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import OrderFlowChart
+from .plot import PLOT_CONFIG, figure_layout
+
+BATCH_FORMATS = ('html', 'json', 'png', 'svg', 'pdf')
+# formats written by plotly's static image export, which needs the kaleido package
+STATIC_FORMATS = ('png', 'svg', 'pdf')
+
+
+def check_jobs(jobs, formats):
+    """
+    Return the jobs as a list of dicts with a unique name and their formats, raising a ValueError
+    for an unknown format, a job without inputs, a name used twice or a static image format
+    when kaleido is not installed, before any job is started.
+    A job is a dict with either the 'orderflow' and 'ohlc' CSV paths of a chart, with their
+    'layout', or the 'processed' path of a save_processed file, and optionally its 'name',
+    the 'chart' keyword arguments of the constructor, the 'plot' keyword arguments of plot
+    and the 'formats' written instead of formats. The name defaults to the input file name.
+    """
+    checked = []
+    names = set()
+    for job in jobs:
+        job = dict(job)
+        source = job.get('processed') or job.get('orderflow')
+        if source is None or ('processed' not in job and 'ohlc' not in job):
+            raise ValueError("A job needs the 'orderflow' and 'ohlc' paths or a 'processed' path: {}".format(job))
+        job.setdefault('name', os.path.splitext(os.path.basename(source))[0])
+        job['formats'] = list(job.get('formats') or formats)
+        unknown = set(job['formats']) - set(BATCH_FORMATS)
+        if unknown:
+            raise ValueError("Unknown formats {}, expected any of {}".format(sorted(unknown), BATCH_FORMATS))
+        if job['name'] in names:
+            raise ValueError("The job name '{}' is used twice, the outputs would overwrite each other".format(
+                job['name']))
+        names.add(job['name'])
+        checked.append(job)
+    static = {f for job in checked for f in job['formats']} & set(STATIC_FORMATS)
+    if static and importlib.util.find_spec('kaleido') is None:
+        raise ValueError("The formats {} need the kaleido package for the static image export".format(
+            sorted(static)))
+    return checked
+
+
+def load_chart(job):
+    """
+    Return the processed chart of a job, see check_jobs.
+    """
+    if 'processed' in job:
+        return OrderFlowChart.load_processed(job['processed'])
+    return OrderFlowChart.from_csv(job['orderflow'], job['ohlc'], layout=job.get('layout', 'range'),
+                                   **job.get('chart', {}))
+
+
+def write_figure(fig, path, fmt, include_plotlyjs='cdn'):
+    """
+    Write fig to path in one of the BATCH_FORMATS. The file is written under a temporary name
+    and renamed, so that a reader watching the output directory never sees a partial file.
+    """
+    import plotly.io as pio
+
+    temp = os.path.join(os.path.dirname(path), '.{}.tmp'.format(uuid.uuid4().hex))
+    try:
+        if fmt == 'html':
+            pio.write_html(fig, temp, config=PLOT_CONFIG, include_plotlyjs=include_plotlyjs, validate=False)
+        elif fmt == 'json':
+            pio.write_json(fig, temp, validate=False)
+        else:
+            pio.write_image(fig, temp, format=fmt)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+@contextlib.contextmanager
+def captured_output(stream):
+    """
+    Send what is printed and the info messages of the orderflow_chart loggers to stream
+    within the with block, rather than to the console or the handlers of the application.
+    """
+    logger = logging.getLogger('orderflow_chart')
+    handler = logging.StreamHandler(stream)
+    level, propagate = logger.level, logger.propagate
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    try:
+        with contextlib.redirect_stdout(stream):
+            yield
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+
+def render_job(job, out_dir, include_plotlyjs='cdn'):
+    """
+    Load, plot and write one checked job, returning a dict of its name, the process which ran it,
+    the paths written, the seconds spent loading, plotting and writing and in total, and the
+    output printed and logged while processing, which is kept out of the console.
+    A failing job does not stop the batch, its error is returned instead.
+    """
+    result = {'name': job['name'], 'pid': os.getpid(), 'outputs': [], 'error': None,
+              'load': 0.0, 'plot': 0.0, 'write': 0.0}
+    log = io.StringIO()
+    start = lap = time.perf_counter()
+    try:
+        with captured_output(log):
+            chart = load_chart(job)
+            result['load'] = time.perf_counter() - lap
+            lap = time.perf_counter()
+            fig = chart.plot(return_figure=True, **job.get('plot', {}))
+            result['plot'] = time.perf_counter() - lap
+            lap = time.perf_counter()
+            for fmt in job['formats']:
+                path = os.path.join(out_dir, '{}.{}'.format(job['name'], fmt))
+                write_figure(fig, path, fmt, include_plotlyjs=include_plotlyjs)
+                result['outputs'].append(path)
+            result['write'] = time.perf_counter() - lap
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['seconds'] = time.perf_counter() - start
+    result['log'] = log.getvalue()
+    return result
+
+
+def render_batch(jobs, out_dir, formats=('html',), workers=None, include_plotlyjs='cdn'):
+    """
+    Render many charts in a pool of worker processes, yielding the result of every job
+    (see render_job) as soon as its outputs are written, in the order the jobs finish.
+    workers is the number of processes, os.cpu_count() by default, with 1 the jobs are rendered
+    one after the other in this process. Every process builds the figure layout once and shares
+    it between its jobs (see figure_layout).
+    include_plotlyjs is passed on to plotly's write_html: 'cdn' keeps each HTML file small by
+    loading plotly.js from the CDN, True embeds it.
+    """
+    jobs = check_jobs(jobs, formats)
+    os.makedirs(out_dir, exist_ok=True)
+    if workers == 1:
+        figure_layout()
+        for job in jobs:
+            yield render_job(job, out_dir, include_plotlyjs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=figure_layout) as pool:
+        futures = [pool.submit(render_job, job, out_dir, include_plotlyjs) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
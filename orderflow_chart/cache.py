@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import numpy as np
+
+from .columnar import FORMAT_VERSION, save_frames, load_frames
+
+# bump when the processing changes its output, so that older entries are never reused
+CACHE_VERSION = 1
+CACHE_BYTES = 1 << 30
+CACHE_SUFFIX = '.npz'
+
+
+def fingerprint(frames, params):
+    """
+    Return a hex digest of the content of the dataframes in frames, their columns, dtypes and
+    index, together with params, a JSON serialisable dict of the settings the result depends on.
+    The rows are hashed with pd.util.hash_pandas_object, which is vectorised.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([CACHE_VERSION, FORMAT_VERSION, params], sort_keys=True, default=str).encode())
+    for frame in frames:
+        if frame is None:
+            digest.update(b'None')
+            continue
+        digest.update(json.dumps([[str(i) for i in frame.columns], [str(i) for i in frame.dtypes],
+                                  frame.index.name, str(frame.index.dtype), frame.shape[0]]).encode())
+        digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(frame, index=True).to_numpy()).data)
+    return digest.hexdigest()
+
+
+class ProcessedCache():
+    """
+    ProcessedCache class for keeping processed charts on disk between runs.
+    Every entry is a save_frames file in directory named after the fingerprint of its inputs.
+    Once the entries take more than max_bytes, the least recently used ones are evicted,
+    the recency of an entry being the modification time of its file, refreshed on every hit.
+    The hits, misses and evictions of the instance are counted.
+    """
+    def __init__(self, directory, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        """
+        This method will return the path of the entry of key.
+        """
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """
+        This method will return the (frames, attrs) stored under key, or None on a miss.
+        The numeric columns are memory mapped, as by load_processed.
+        Entries which cannot be read are removed and count as misses.
+        """
+        path = self.path(key)
+        try:
+            frames, attrs = load_frames(path)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            if os.path.exists(path):
+                os.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frames, attrs
+
+    def put(self, key, frames, attrs=None):
+        """
+        This method will store the frames and attrs under key, then evict the least recently
+        used entries beyond max_bytes. The file is written under a temporary name and renamed,
+        so concurrent readers never see a partial entry.
+        """
+        path = self.path(key)
+        temp = os.path.join(self.directory, '.{}.tmp'.format(uuid.uuid4().hex))
+        try:
+            save_frames(temp, frames, attrs)
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        self.evict(keep=path)
+
+    def entries(self):
+        """
+        This method will return the (mtime, size, path) of every entry, least recently used first.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX) and not entry.name.startswith('.'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """
+        This method will remove the least recently used entries until they take at most max_bytes,
+        never removing keep, the entry just written.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        This method will remove every entry.
+        """
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def info(self):
+        """
+        This method will return the counters and the size of the cache as a dict.
+        """
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
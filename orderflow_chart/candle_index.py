@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class CandleIndex():
+    """
+    CandleIndex class locating the rows of a processed frame by candle, built once from the
+    position in the ohlc data of the candle of every row (-1 for the rows without a candle).
+    The rows are stored CSR style: offsets[i]:offsets[i + 1] are the rows of candle i in order,
+    order being None when the frame is already grouped by candle in the ohlc order, the usual case,
+    in which a range of candles is a plain slice of the frame.
+    With ticks, low and high hold the lowest and highest price tick of every candle, so that the
+    candles outside a price band are skipped without looking at their rows.
+    """
+    def __init__(self, positions, n, ticks=None):
+        positions = np.asarray(positions)
+        if positions.shape[0] and (np.diff(positions) < 0).any():
+            self.order = np.argsort(positions, kind='stable')
+            positions = positions[self.order]
+        else:
+            self.order = None
+        self.offsets = np.searchsorted(positions, np.arange(n + 1))
+        self.low = self.high = None
+        if ticks is not None:
+            ticks = np.asarray(ticks, dtype=np.int64)
+            if self.order is not None:
+                ticks = ticks[self.order]
+            present = np.diff(self.offsets) > 0
+            self.low = np.full(n, np.iinfo(np.int64).max)
+            self.high = np.full(n, np.iinfo(np.int64).min)
+            if present.any():
+                starts = self.offsets[:-1][present]
+                self.low[present] = np.minimum.reduceat(ticks, starts)
+                self.high[present] = np.maximum.reduceat(ticks, starts)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def locate(self, start, end, low=None, high=None):
+        """
+        This method will return the rows of the candles in [start, end), in frame order, as a slice
+        when the frame is grouped by candle and an array of positions otherwise.
+        With a (low, high) tick band only the candles which reach into the band are kept,
+        their rows still have to be filtered by price.
+        """
+        if low is None and high is None:
+            if self.order is None:
+                return slice(self.offsets[start], self.offsets[end])
+            return np.sort(self.order[self.offsets[start]:self.offsets[end]])
+        candles = np.arange(start, end)
+        candles = candles[(self.high[candles] >= low) & (self.low[candles] <= high)]
+        starts = self.offsets[candles]
+        counts = self.offsets[candles + 1] - starts
+        # the rows of each kept candle, as one ragged arange
+        rows = np.repeat(starts - np.cumsum(np.r_[0, counts[:-1]]), counts) + np.arange(counts.sum())
+        return rows if self.order is None else np.sort(self.order[rows])
+
+    def take(self, frame, start, end, low=None, high=None):
+        """
+        This method will return the rows of frame which belong to the candles in [start, end),
+        see locate.
+        """
+        return frame.iloc[self.locate(start, end, low, high)]
+
+    def drop_last(self, frame):
+        """
+        This method will return frame without the rows of the last candle, and the index of the result.
+        """
+        n = len(self)
+        start = self.offsets[n - 1]
+        index = self._with(self.offsets[:n], self.low, self.high, n - 1)
+        if self.order is None:
+            return frame.iloc[:start], index
+        removed = np.sort(self.order[start:])
+        keep = np.ones(frame.shape[0], dtype=bool)
+        keep[removed] = False
+        order = self.order[:start]
+        index.order = order - np.searchsorted(removed, order)
+        return frame[keep], index
+
+    def append(self, index):
+        """
+        This method will return the index of the rows of this index followed by the rows of index,
+        whose candles all come after the candles of this index. It returns None when index has rows
+        without a candle, which would have to move ahead of the others.
+        """
+        if index.offsets[0] > 0:
+            return None
+        rows = self.offsets[-1]
+        offsets = np.r_[self.offsets, index.offsets[1:] + rows]
+        both = self.low is not None and index.low is not None
+        combined = self._with(offsets, np.r_[self.low, index.low] if both else None,
+                              np.r_[self.high, index.high] if both else None, len(self) + len(index))
+        if self.order is None and index.order is None:
+            combined.order = None
+        else:
+            combined.order = np.r_[np.arange(rows) if self.order is None else self.order,
+                                   (np.arange(index.offsets[-1]) if index.order is None else index.order) + rows]
+        return combined
+
+    @classmethod
+    def _with(cls, offsets, low, high, n):
+        """
+        Return an index with the given offsets and the ticks of its first n candles, without an order.
+        """
+        index = cls.__new__(cls)
+        index.offsets = offsets
+        index.low = None if low is None else low[:n]
+        index.high = None if high is None else high[:n]
+        index.order = None
+        return index
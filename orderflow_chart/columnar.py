@@ -0,0 +1,134 @@
+import json
+import struct
+import zipfile
+
+import pandas as pd
+import numpy as np
+
+
+FORMAT_VERSION = 1
+META_KEY = '__meta__'
+# size of the fixed part of a zip local file header, followed by the file name and extra field
+LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+
+
+def _encode(values):
+    """
+    Return the arrays storing values and the description needed to decode them.
+    Numbers and datetimes are stored natively, everything else is dictionary encoded
+    into int32 codes and a fixed width unicode array of the distinct values.
+    Categoricals of strings keep their codes and categories.
+    """
+    spec = {'dtype': str(values.dtype)}
+    if isinstance(values.dtype, pd.CategoricalDtype) and values.dtype.categories.dtype == object:
+        spec['kind'] = 'categorical'
+        values = pd.Categorical(values)
+        return spec, {'': values.codes, '.categories': np.asarray(values.categories, dtype=str)}
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        spec['kind'] = 'datetime'
+        spec['tz'] = str(values.dtype.tz)
+        return spec, {'': values.tz_convert('UTC').tz_localize(None).to_numpy()}
+    values = np.asarray(values)
+    if values.dtype.kind in 'biufmM':
+        spec['kind'] = 'native'
+        return spec, {'': values}
+    spec['kind'] = 'dictionary'
+    codes, uniques = pd.factorize(values)
+    return spec, {'': codes.astype(np.int32), '.categories': np.asarray(uniques, dtype=str)}
+
+
+def _decode(spec, arrays):
+    """
+    Rebuild the values described by spec from the stored arrays.
+    """
+    values = arrays['']
+    if spec['kind'] == 'datetime':
+        return pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(spec['tz'])
+    if spec['kind'] == 'native':
+        return values
+    if spec['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, categories=arrays['.categories'].astype(object))
+    table = np.append(arrays['.categories'].astype(object), np.nan)
+    return table[values]
+
+
+def save_frames(path, frames, attrs=None):
+    """
+    This function will write the dataframes in frames, a dict of name to dataframe,
+    to a single uncompressed .npz file with one array per column and index.
+    attrs is a JSON serialisable dict stored alongside the frames.
+    """
+    meta = {'version': FORMAT_VERSION, 'attrs': attrs or {}, 'frames': {}}
+    arrays = {}
+    for name, frame in frames.items():
+        columns = [('index', frame.index)] + [(i, frame[column]) for i, column in enumerate(frame.columns)]
+        specs = []
+        for key, values in columns:
+            spec, stored = _encode(values.array if isinstance(values, pd.Series) else values)
+            for suffix, array in stored.items():
+                arrays['{}.{}{}'.format(name, key, suffix)] = array
+            specs.append(spec)
+        meta['frames'][name] = {
+            'columns': [str(i) for i in frame.columns],
+            'index_name': frame.index.name,
+            'specs': specs,
+        }
+    arrays[META_KEY] = np.array(json.dumps(meta))
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def _mapped_arrays(path):
+    """
+    Return the arrays of an uncompressed .npz file as read only memory maps.
+    Each member is located through its zip local header and mapped past its .npy header.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED or name == META_KEY:
+                arrays[name] = np.load(archive.open(info))
+                continue
+            f.seek(info.header_offset)
+            header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+            f.seek(info.header_offset + LOCAL_HEADER.size + header[-2] + header[-1])
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject or int(np.prod(shape)) == 0:
+                arrays[name] = np.load(archive.open(info))
+            else:
+                arrays[name] = np.memmap(f, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C').view(np.ndarray)
+    return arrays
+
+
+def load_frames(path, mmap=True):
+    """
+    This function will read the dataframes written by save_frames.
+    With mmap the numeric columns are memory mapped instead of read, only the
+    dictionary encoded columns are decoded in memory.
+    It returns the dict of dataframes and the attrs.
+    """
+    if mmap:
+        arrays = _mapped_arrays(path)
+    else:
+        with np.load(path) as stored:
+            arrays = {name: stored[name] for name in stored.files}
+    meta = json.loads(str(arrays.pop(META_KEY)))
+
+    frames = {}
+    for name, frame_meta in meta['frames'].items():
+        keys = ['index'] + [str(i) for i in range(len(frame_meta['columns']))]
+        values = []
+        for key, spec in zip(keys, frame_meta['specs']):
+            prefix = '{}.{}'.format(name, key)
+            stored = {suffix: arrays[prefix + suffix] for suffix in ['', '.categories']
+                      if prefix + suffix in arrays}
+            values.append(_decode(spec, stored))
+        index = pd.Index(values[0], name=frame_meta['index_name'])
+        frames[name] = pd.DataFrame(dict(zip(frame_meta['columns'], values[1:])), index=index, copy=False)
+    return frames, meta['attrs']
@@ -1,49 +1,1027 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
+from .cache import fingerprint
+from .candle_index import CandleIndex
+from .columnar import save_frames, load_frames
+from .identifiers import _candle_codes
+from .loader import CHUNK_ROWS, CSV_LAYOUTS, read_candles
+from .profiler import NO_STAGE, staged
+
+logger = logging.getLogger(__name__)
+
+CUM_DELTA_WINDOW = 10
+PROCESSED_FRAMES = ('df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels', 'ohlc_data')
+# keys of the processed data exports and the attributes holding them
+PROCESSED_KEYS = {
+    'orderflow': 'df',
+    'labels': 'labels',
+    'green_hl': 'green_hl',
+    'red_hl': 'red_hl',
+    'green_oc': 'green_oc',
+    'red_oc': 'red_oc',
+    'orderflow2': 'df2',
+    'ohlc': 'ohlc_data',
+}
+# settings of the constructor the processed frames depend on, part of the cache key
+CACHE_PARAMS = ('identifier_col', 'imbalance_col', 'lazy_text', 'cum_delta_window', 'stats', 'integer_codes',
+                'compact', 'imbalance_engine', 'indicators')
+SAVED_ATTRS = ('granularity', 'identifier_col', 'imbalance_col', 'lazy_text', 'cum_delta_window', 'stats',
+               'integer_codes', 'compact', 'imbalance_engine', 'indicators')
+# settings given as objects, saved as the dict of their params
+SPEC_ATTRS = ('imbalance_engine', 'indicators')
+
+BAR_TYPES = ('time', 'tick', 'volume', 'range')
+BAR_PREFIXES = {'time': 'T', 'tick': 'K', 'volume': 'V', 'range': 'R'}
+BUY_SIDES = ('buy', 'b', 'ask', 'a', 'bought')
+
+SESSION = '1D'
+VALUE_AREA = 0.7
+VWAP_BANDS = (1.0, 2.0)
+# columns added to the ohlc rows by the session indicators, followed by the upper and lower
+# vwap band of every standard deviation, named vwap_upper1, vwap_lower1, vwap_upper2...
+INDICATOR_COLUMNS = ('session_vwap', 'session_poc', 'session_vah', 'session_val', 'session_delta', 'session_volume')
+# indicator columns which are sizes, the others are prices
+INDICATOR_SIZES = ('session_delta', 'session_volume')
+# cells of the cumulative session profiles held in memory at a time
+PROFILE_CELLS = 1 << 22
+# orderflow rows below which process_data runs serially whatever its workers, as shipping the
+# partitions to the worker processes and their processed rows back costs more than processing them
+PARALLEL_ROWS = 2_000_000
+# value areas still growing below which they are finished one at a time rather than vectorised
+VALUE_AREA_ROWS = 16
+
+
+def _trade_side(side):
+    """
+    Return a boolean array which is True where the aggressor was the buyer.
+    Numeric sides are buys when positive, strings are matched against BUY_SIDES.
+    """
+    side = pd.Series(side)
+    if side.dtype == bool:
+        return side.to_numpy()
+    if pd.api.types.is_numeric_dtype(side):
+        return side.to_numpy() > 0
+    return side.astype(str).str.lower().isin(BUY_SIDES).to_numpy()
+
+
+def _range_bar_starts(ticks, range_ticks):
+    """
+    Return the index of the first trade of every range bar.
+    A new bar starts on the trade that would push the high-low range of the current
+    bar beyond range_ticks. The scan works on growing windows of trades so the
+    python loop only runs once per bar, not once per trade.
+    """
+    n = ticks.shape[0]
+    starts = [0]
+    i = 0
+    window = 256
+    while i < n:
+        chunk = ticks[i:i + window]
+        spread = np.maximum.accumulate(chunk) - np.minimum.accumulate(chunk)
+        breach = np.flatnonzero(spread > range_ticks)
+        if breach.shape[0]:
+            length = int(breach[0])
+            i += length
+            starts.append(i)
+            window = max(256, 2 * length)
+        elif i + window >= n:
+            break
+        else:
+            window *= 2
+    return np.asarray(starts, dtype=np.int64)
+
+
+def _bar_codes(ts, ticks, size, bar, bar_size):
+    """
+    Return a dense, non decreasing bar number for every trade and the bar timestamps
+    (in nanoseconds) for the time bars. Only time bars are snapped to a clock grid,
+    the other bar types are stamped with the time of their first trade.
+    """
+    n = ts.shape[0]
+    bucket = None
+    if bar == 'time':
+        step = pd.Timedelta(bar_size).value
+        raw = ts // step
+        bucket = raw * step
+    elif bar == 'tick':
+        raw = np.arange(n, dtype=np.int64) // int(bar_size)
+    elif bar == 'volume':
+        cum = np.cumsum(size)
+        raw = ((cum - size) // bar_size).astype(np.int64)
+    elif bar == 'range':
+        raw = np.zeros(n, dtype=np.int64)
+        raw[_range_bar_starts(ticks, int(bar_size))[1:]] = 1
+        raw = np.cumsum(raw)
+    else:
+        raise ValueError("Unknown bar type '{}', expected one of {}".format(bar, BAR_TYPES))
+
+    new_bar = np.empty(n, dtype=bool)
+    new_bar[:1] = True
+    np.not_equal(raw[1:], raw[:-1], out=new_bar[1:])
+    codes = np.cumsum(new_bar) - 1
+    starts = np.flatnonzero(new_bar)
+    stamps = bucket[starts] if bucket is not None else ts[starts]
+    return codes, starts, stamps
+
+
+def _process_partition(cls, attrs, orderflow_rows, ohlc_rows, size):
+    """
+    Run the per candle processing steps on one partition of the candles, in a worker process.
+    cls and attrs rebuild a chart holding the processing options only.
+    Returns the processed orderflow rows, their volume profile rows and the candle stats.
+    """
+    chart = cls.__new__(cls)
+    chart.__dict__.update(attrs)
+    df = chart.calc_imbalance(orderflow_rows, size=size)
+    return df, chart.annotate(df), chart.candle_stats(df, ohlc_rows)
+
+
+def infer_granularity(prices):
+    """
+    This function will return the price step of prices, the smallest positive difference
+    between its distinct values, or 1.0 when there are fewer than two.
+    """
+    steps = np.diff(np.sort(pd.unique(np.asarray(prices, dtype=np.float64))))
+    steps = steps[steps > 0]
+    return float(steps.min()) if steps.shape[0] else 1.0
+
+
+def aggregate_trades(trades, bar='time', bar_size='1min', granularity=None,
+                     price_col='price', size_col='size', side_col='side',
+                     time_col=None, prefix=None, return_granularity=False):
+    """
+    This function will aggregate raw trades into footprint and OHLC frames.
+    The trades should have a datetime index (or a time_col) and price, size and aggressor
+    side columns. The trades are binned into time, tick, volume or range bars and the
+    prices are snapped to the granularity (inferred from the smallest price step if None).
+    It returns the (orderflow_data, ohlc_data) frames expected by OrderFlowChart with
+    deterministic identifiers, one row per price level between the low and high of each
+    candle, sorted by candle and descending price.
+
+    bar_size is a pandas frequency for time bars, a trade count for tick bars,
+    a traded volume for volume bars and a number of ticks for range bars.
+    With return_granularity the granularity the prices were snapped to is returned as well,
+    as (orderflow_data, ohlc_data, granularity).
+    """
+    if time_col is None:
+        index = pd.DatetimeIndex(trades.index)
+    else:
+        index = pd.DatetimeIndex(trades[time_col])
+    ts = index.asi8
+    price = trades[price_col].to_numpy(dtype=np.float64)
+    size = trades[size_col].to_numpy(dtype=np.float64)
+    buy = _trade_side(trades[side_col])
+
+    if ts.shape[0] > 1 and not (ts[1:] >= ts[:-1]).all():
+        order = np.argsort(ts, kind='stable')
+        ts, price, size, buy = ts[order], price[order], size[order], buy[order]
+
+    if granularity is None:
+        granularity = infer_granularity(price)
+    ticks = np.rint(price / granularity).astype(np.int64)
+
+    codes, starts, stamps = _bar_codes(ts, ticks, size, bar, bar_size)
+    ends = np.r_[starts[1:], ticks.shape[0]] - 1
+
+    high = np.maximum.reduceat(ticks, starts)
+    low = np.minimum.reduceat(ticks, starts)
+
+    # every candle owns a contiguous block of cells, one per tick from high to low
+    spans = high - low + 1
+    offsets = np.zeros(spans.shape[0], dtype=np.int64)
+    np.cumsum(spans[:-1], out=offsets[1:])
+    total = int(spans.sum())
+    cell = offsets[codes] + (high[codes] - ticks)
+    ask_size = np.bincount(cell, weights=np.where(buy, size, 0.0), minlength=total)
+    bid_size = np.bincount(cell, weights=np.where(buy, 0.0, size), minlength=total)
+
+    cell_bar = np.repeat(np.arange(spans.shape[0]), spans)
+    cell_ticks = high[cell_bar] - (np.arange(total) - offsets[cell_bar])
+
+    if prefix is None:
+        prefix = BAR_PREFIXES[bar]
+    width = max(6, len(str(spans.shape[0] - 1)))
+    identifier = np.array(['{}{:0{}d}'.format(prefix, i, width) for i in range(spans.shape[0])],
+                          dtype=object)
+
+    bar_index = pd.DatetimeIndex(stamps.astype('datetime64[ns]'))
+    if index.tz is not None:
+        bar_index = bar_index.tz_localize('UTC').tz_convert(index.tz)
+
+    orderflow_data = pd.DataFrame({
+        'bid_size': bid_size,
+        'price': cell_ticks * granularity,
+        'ask_size': ask_size,
+        'identifier': identifier[cell_bar],
+    }, index=bar_index[cell_bar])
+
+    ohlc_data = pd.DataFrame({
+        'open': ticks[starts] * granularity,
+        'high': high * granularity,
+        'low': low * granularity,
+        'close': ticks[ends] * granularity,
+        'identifier': identifier,
+    }, index=bar_index)
+
+    if return_granularity:
+        return orderflow_data, ohlc_data, granularity
+    return orderflow_data, ohlc_data
+
+
+def resample_footprint(orderflow_data, ohlc_data, granularity, price_ticks=1, candles=1, freq=None):
+    """
+    This function will merge every group of consecutive candles into one candle and the price
+    levels into buckets of price_ticks ticks, summing the bid and ask sizes of each bucket.
+    The candles are grouped candles at a time, or by the period of freq, a pandas frequency,
+    which they start in. A bucket is priced at its lowest tick and a merged candle takes the
+    identifier of its first candle, and its timestamp or the start of its period with freq.
+    The volume of the ohlc data, when present, is summed. The ohlc data must be in time order.
+    It returns the merged (orderflow_data, ohlc_data), with the price levels of each candle
+    in descending order. Prices given as integer ticks of granularity, as in the compact
+    frames, are used as they are.
+    """
+    identifiers = ohlc_data['identifier'].to_numpy()
+    if freq is None:
+        candle_group = np.arange(identifiers.shape[0]) // candles
+        periods = ohlc_data.index
+    else:
+        periods = ohlc_data.index.floor(freq)
+        candle_group = np.r_[0, np.cumsum(periods[1:] != periods[:-1])]
+    positions = _candle_codes(identifiers, orderflow_data['identifier'].to_numpy())
+    rows = positions >= 0
+    group = candle_group[positions[rows]]
+    ticks = orderflow_data['price'].to_numpy()[rows]
+    if ticks.dtype.kind == 'f':
+        ticks = np.rint(ticks / granularity)
+    ticks = ticks.astype(np.int64)
+    bucket = np.floor_divide(ticks, price_ticks)
+
+    # sort the cells by candle and descending price through a single integer key
+    top = bucket.max(initial=0)
+    span = top - bucket.min(initial=0) + 1
+    cells, cell = np.unique(group * span + (top - bucket), return_inverse=True)
+    bid_size = np.bincount(cell, weights=orderflow_data['bid_size'].to_numpy(dtype=float)[rows],
+                           minlength=cells.shape[0])
+    ask_size = np.bincount(cell, weights=orderflow_data['ask_size'].to_numpy(dtype=float)[rows],
+                           minlength=cells.shape[0])
+    cell_group = cells // span
+    cell_price = (top - cells % span) * price_ticks * granularity
+
+    starts = np.flatnonzero(np.r_[True, candle_group[1:] != candle_group[:-1]])
+    ends = np.r_[starts[1:], identifiers.shape[0]] - 1
+    merged_ohlc = pd.DataFrame({
+        'open': ohlc_data['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(ohlc_data['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(ohlc_data['low'].to_numpy(), starts),
+        'close': ohlc_data['close'].to_numpy()[ends],
+        'identifier': identifiers[starts],
+    }, index=periods[starts])
+    if 'volume' in ohlc_data:
+        merged_ohlc.insert(4, 'volume', np.add.reduceat(ohlc_data['volume'].to_numpy(), starts))
+    merged_orderflow = pd.DataFrame({
+        'bid_size': bid_size,
+        'price': cell_price,
+        'ask_size': ask_size,
+        'identifier': identifiers[starts][cell_group],
+    }, index=periods[starts][cell_group])
+    return merged_orderflow, merged_ohlc
+
+
+class SessionIndicators():
+    """
+    SessionIndicators class computing the developing session indicators of the candles from their
+    footprint cells. A session starts every session, a pandas frequency, shifted by offset, e.g.
+    session='1D' and offset='18h' for sessions opening at 18:00. At the close of every candle:
+    - session_vwap: the volume weighted average price of the session so far, and vwap_upper<k>,
+      vwap_lower<k> the bands k volume weighted standard deviations away, for every k of bands
+    - session_poc: the price with the largest volume of the session volume profile so far,
+      the lowest one on ties
+    - session_vah, session_val: the high and low of the value area, grown from the poc one level at
+      a time towards the side with more volume until it holds value_area of the session volume
+    - session_delta, session_volume: the cumulative delta and volume of the session
+    The cells are aggregated into candles and price levels in one vectorised pass, the session profiles
+    are accumulated candle by candle as matrices of at most PROFILE_CELLS cells. A state carries a
+    session over to the next call, so candles can be added one batch at a time with the same results.
+    """
+    name = 'session'
+
+    def __init__(self, session=SESSION, offset='0h', value_area=VALUE_AREA, bands=VWAP_BANDS):
+        pd.tseries.frequencies.to_offset(session)
+        pd.Timedelta(offset)
+        if not 0 < value_area <= 1:
+            raise ValueError("value_area should be in (0, 1], got {}".format(value_area))
+        self.session = session
+        self.offset = offset
+        self.value_area = value_area
+        self.bands = tuple(bands)
+
+    def params(self):
+        """
+        This method will return the settings of the indicators as a JSON serialisable dict,
+        from which build_indicators builds them again.
+        """
+        return {'name': self.name, 'session': self.session, 'offset': self.offset,
+                'value_area': self.value_area, 'bands': list(self.bands)}
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(k, v) for k, v in self.params().items() if k != 'name'))
+
+    def columns(self):
+        """
+        This method will return the names of the columns of the indicators.
+        """
+        bands = ['vwap_{}{:g}'.format(side, k) for k in self.bands for side in ['upper', 'lower']]
+        return list(INDICATOR_COLUMNS) + bands
+
+    def session_keys(self, index):
+        """
+        This method will return the session of every timestamp of index, as the integer nanoseconds
+        of the start of the session.
+        """
+        return (pd.DatetimeIndex(index) - pd.Timedelta(self.offset)).floor(self.session).asi8
+
+    def __call__(self, codes, ticks, bid, ask, sessions, state=None):
+        """
+        Return the indicator columns of the candles, as a dict of arrays in ticks for the prices,
+        and the state at the close of the last candle.
+        codes is the candle of each cell, -1 for the cells to leave out, ticks its price in ticks
+        and bid and ask its sizes. sessions holds the session key of every candle, the candles
+        being in time order, and state the state returned for the preceding candles.
+        """
+        n = sessions.shape[0]
+        columns = {name: np.full(n, np.nan) for name in self.columns()}
+        if n == 0:
+            return columns, state
+        rows = codes >= 0
+        codes = codes[rows]
+        order = None if (np.diff(codes) >= 0).all() else np.argsort(codes, kind='stable')
+        ticks = np.asarray(ticks)[rows].astype(np.int64)
+        bid = np.asarray(bid, dtype=np.float64)[rows]
+        ask = np.asarray(ask, dtype=np.float64)[rows]
+        if order is not None:
+            codes, ticks, bid, ask = codes[order], ticks[order], bid[order], ask[order]
+        volume = bid + ask
+        candle_volume = np.bincount(codes, weights=volume, minlength=n)
+        candle_delta = np.bincount(codes, weights=ask - bid, minlength=n)
+
+        starts = np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]])
+        bounds = np.r_[starts, n]
+        row_bounds = np.searchsorted(codes, bounds)
+        for i in range(starts.shape[0]):
+            first, last = bounds[i], bounds[i + 1]
+            carry = state if i == 0 and state is not None and state['session'] == sessions[0] else None
+            cells = slice(row_bounds[i], row_bounds[i + 1])
+            state = self.session_run(columns, first, last, codes[cells] - first, ticks[cells], volume[cells],
+                                     candle_volume[first:last], candle_delta[first:last], carry)
+            state['session'] = sessions[first]
+        return columns, state
+
+    def session_run(self, columns, first, last, codes, ticks, volume, candle_volume, candle_delta, carry=None):
+        """
+        Fill the rows first to last of columns with the indicators of candles of a single session,
+        continuing the session of carry when given, and return the state after the last candle.
+        """
+        n = last - first
+        anchor = carry['anchor'] if carry is not None else (ticks[0] if ticks.shape[0] else 0)
+        # the sums are kept relative to the first price of the session, small enough to stay exact
+        relative = (ticks - anchor).astype(np.float64)
+        sums = {
+            'volume': candle_volume,
+            'delta': candle_delta,
+            'pv': np.bincount(codes, weights=relative * volume, minlength=n),
+            'p2v': np.bincount(codes, weights=relative * relative * volume, minlength=n),
+        }
+        for key, values in sums.items():
+            # summed in the same order whether or not the session is split over several calls
+            sums[key] = np.cumsum(np.r_[0.0 if carry is None else carry[key], values])[1:]
+        rows = slice(first, last)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums['pv'] / sums['volume']
+            deviation = np.sqrt(np.maximum(sums['p2v'] / sums['volume'] - mean * mean, 0))
+        columns['session_vwap'][rows] = anchor + mean
+        for k in self.bands:
+            columns['vwap_upper{:g}'.format(k)][rows] = anchor + mean + k * deviation
+            columns['vwap_lower{:g}'.format(k)][rows] = anchor + mean - k * deviation
+        columns['session_delta'][rows] = sums['delta']
+        columns['session_volume'][rows] = sums['volume']
+
+        low, high = ticks.min(initial=anchor), ticks.max(initial=anchor)
+        if carry is not None:
+            low, high = min(low, carry['low']), max(high, carry['low'] + carry['profile'].shape[0] - 1)
+        levels = high - low + 1
+        profile = np.zeros(levels)
+        if carry is not None:
+            profile[carry['low'] - low:carry['low'] - low + carry['profile'].shape[0]] = carry['profile']
+        block = max(PROFILE_CELLS // levels, 1)
+        for start in range(0, n, block):
+            end = min(start + block, n)
+            cells = slice(*np.searchsorted(codes, [start, end]))
+            added = np.bincount((codes[cells] - start) * levels + (ticks[cells] - low), weights=volume[cells],
+                                minlength=(end - start) * levels).reshape(end - start, levels)
+            cumulative = np.cumsum(np.vstack([profile, added]), axis=0)[1:]
+            profile = cumulative[-1].copy()
+            poc, vah, val = self.value_area_levels(cumulative)
+            for name, values in [('session_poc', poc), ('session_vah', vah), ('session_val', val)]:
+                columns[name][first + start:first + end] = low + values
+        state = {'anchor': anchor, 'low': low, 'profile': profile}
+        state.update({key: values[-1] for key, values in sums.items()})
+        return state
+
+    def value_area_levels(self, profiles):
+        """
+        Return the poc, value area high and value area low levels of every row of profiles,
+        NaN for the empty profiles. A value area only grows over the levels between the lowest and
+        highest level traded so far. The value areas of all the rows are grown together,
+        one level per step, the rows which are done dropping out, and the last VALUE_AREA_ROWS
+        are finished one at a time.
+        """
+        n, levels = profiles.shape
+        rows = np.arange(n)
+        traded = profiles > 0
+        first = traded.argmax(axis=1)
+        last = levels - 1 - traded[:, ::-1].argmax(axis=1)
+        total = profiles.sum(axis=1)
+        poc = profiles.argmax(axis=1)
+        low, high = poc.copy(), poc.copy()
+        # the rows still growing, kept in their own arrays indexing the flattened profiles
+        flat = profiles.ravel()
+        active = np.flatnonzero((profiles[rows, poc] < self.value_area * total) & (first < last))
+        offset = active * levels
+        a_low, a_high, a_first, a_last = low[active], high[active], first[active] + offset, last[active] + offset
+        a_low += offset
+        a_high += offset
+        covered = flat[a_low]
+        target = self.value_area * total[active]
+        while active.shape[0] > VALUE_AREA_ROWS:
+            down = np.where(a_low > a_first, flat[a_low - 1], -1.0)
+            up = np.where(a_high < a_last, flat[np.minimum(a_high + 1, a_last)], -1.0)
+            grow_up = up >= down
+            a_high += grow_up
+            a_low -= ~grow_up
+            covered += np.maximum(up, down)
+            done = (covered >= target) | ((a_low == a_first) & (a_high == a_last))
+            if done.any():
+                low[active[done]] = a_low[done] - offset[done]
+                high[active[done]] = a_high[done] - offset[done]
+                keep = ~done
+                active, offset, a_low, a_high = active[keep], offset[keep], a_low[keep], a_high[keep]
+                a_first, a_last, covered, target = a_first[keep], a_last[keep], covered[keep], target[keep]
+        for i in range(active.shape[0]):
+            span, start = _grow_value_area(flat[a_first[i]:a_last[i] + 1].tolist(), a_low[i] - a_first[i],
+                                           a_high[i] - a_first[i], covered[i], target[i])
+            low[active[i]] = a_first[i] - offset[i] + start
+            high[active[i]] = a_first[i] - offset[i] + start + span - 1
+        empty = total <= 0
+        return [np.where(empty, np.nan, values) for values in (poc, high, low)]
+
+
+def _grow_value_area(values, low, high, covered, target):
+    """
+    Grow the value area from values[low:high + 1] holding covered volume, one level at a time
+    towards the side with more volume, the upper one on ties, until it holds target.
+    Return its number of levels and first level.
+    """
+    last = len(values) - 1
+    while covered < target and (low > 0 or high < last):
+        down = values[low - 1] if low > 0 else -1.0
+        up = values[high + 1] if high < last else -1.0
+        if up >= down:
+            high += 1
+            covered += up
+        else:
+            low -= 1
+            covered += down
+    return high - low + 1, low
+
+
+INDICATOR_ENGINES = {
+    'session': SessionIndicators,
+}
+
+
+def build_indicators(spec):
+    """
+    Return the indicators described by spec: None, an indicators instance, the name of one of the
+    INDICATOR_ENGINES or a dict of its name and settings as returned by params.
+    """
+    if spec is None or callable(spec):
+        return spec
+    if isinstance(spec, str):
+        spec = {'name': spec}
+    spec = dict(spec)
+    name = spec.pop('name', None)
+    if name not in INDICATOR_ENGINES:
+        raise ValueError("Unknown indicators '{}', expected one of {}".format(name, list(INDICATOR_ENGINES)))
+    return INDICATOR_ENGINES[name](**spec)
+
 
 class OrderFlowData():
     """
     OrderFlowData class for processing order flow data and OHLC data.
     """
-    def process_data(self):
+    @staged('process_data', rows=lambda self, *args, **kwargs: self.orderflow_data.shape[0])
+    def process_data(self, workers=None):
         """
         This method will process the orderflow data and ohlc data.
         It will create a unique identifier for each candle if not provided,
         create a sequence column, calculate the imbalance, and annotate the data.
         It will also create high-low and open-close sequences for green and red candles.
+        With workers the candles are split into that many partitions which are processed
+        in a pool of worker processes (see process_partitions), with the same results.
+        The workers are capped by the number of cpus, and inputs of fewer than PARALLEL_ROWS
+        orderflow rows are processed serially.
+        With a cache the processed frames of the same inputs are loaded instead when present,
+        and stored after processing otherwise.
         """
-        if self.identifier_col is None:
+        key = self.cache_key() if getattr(self, 'cache', None) is not None else None
+        if key is not None and self.use_cached(key):
+            return
+
+        if self.integer_codes:
+            self.orderflow_data, self.ohlc_data = self.encode_candles(
+                self.orderflow_data, self.ohlc_data, by_identifier=self.identifier_col is not None)
+            self.identifier_col = 'identifier'
+        elif self.identifier_col is None:
             self.identifier_col = 'identifier'
             self.create_identifier()
 
         self.create_sequence()
+        if self.indicators is not None:
+            self.add_indicators(self.orderflow_data, self.ohlc_data)
 
-        self.df = self.calc_imbalance(self.orderflow_data)
+        workers = min(workers or 1, os.cpu_count() or 1)
+        partitions = None
+        if workers > 1 and self.orderflow_data.shape[0] >= PARALLEL_ROWS:
+            partitions = self.candle_partitions(workers)
+        if partitions is None:
+            self.df = self.calc_imbalance(self.orderflow_data)
+            self.df2 = self.annotate(self.df)
+        else:
+            self.df, self.df2, stats = self.process_partitions(partitions, workers)
+            self.orderflow_data = self.df
 
-        self.df2 = self.annotate(self.df.copy())
+        green = self.ohlc_data['close'] >= self.ohlc_data['open']
+        for type_ in ['hl', 'oc']:
+            for color, candles in [('green', green), ('red', ~green)]:
+                name = '{}_{}'.format(color, type_)
+                ohlc = self.ohlc_data[candles]
+                with self.stage('candle_segments', ohlc.shape[0], name):
+                    setattr(self, name, self.candle_segments(ohlc, type_=type_))
 
-        self.green_id = self.ohlc_data.loc[self.ohlc_data['close'] >= self.ohlc_data['open']]['identifier']
-        self.red_id = self.ohlc_data.loc[self.ohlc_data['close'] < self.ohlc_data['open']]['identifier']
+        if partitions is None:
+            self.labels = self.calc_params(self.orderflow_data, self.ohlc_data)
+        else:
+            self.labels = self.param_labels(stats)
 
-        self.high_low = self.range_proc(self.ohlc_data, type_='hl')
-        self.green_hl = self.high_low.loc[self.green_id]
-        self.green_hl = self.candle_proc(self.green_hl)
+        self._stream = None
+        self._pyramid = None
+        self._resampled = None
+        self._candle_index = None
+        self.is_processed = True
+        if key is not None:
+            self.cache.put(key, *self.processed_frames())
 
-        self.red_hl = self.high_low.loc[self.red_id]
-        self.red_hl = self.candle_proc(self.red_hl)
+    def stage(self, name, rows=None, key=None):
+        """
+        This method will return the context recording a stage with the profiler of the chart,
+        see StageProfiler.stage, and a shared context doing nothing without a profiler.
+        """
+        profiler = getattr(self, 'profiler', None)
+        return NO_STAGE if profiler is None else profiler.stage(name, rows, key)
 
-        self.open_close = self.range_proc(self.ohlc_data, type_='oc')
+    @staged('indicators')
+    def add_indicators(self, orderflow_data, ohlc_data, state=None):
+        """
+        This method will add the columns of the session indicators to the ohlc rows, computed from
+        the orderflow rows, see session_indicators. It returns the states before and after the last candle.
+        """
+        columns, boundary, state = self.session_indicators(orderflow_data, ohlc_data, state)
+        for name, values in columns.items():
+            ohlc_data[name] = values
+        return boundary, state
 
-        self.green_oc = self.open_close.loc[self.green_id]
-        self.green_oc = self.candle_proc(self.green_oc)
+    def session_indicators(self, orderflow_data, ohlc_data, state=None):
+        """
+        This method will compute the session indicators of the candles of ohlc_data, which must be in
+        time order, from their orderflow rows. state is the state of the indicators after the candles
+        preceding them, which continues their session. The last candle is computed on its own, so that
+        the state before it is kept for update_last_candle.
+        It returns the indicator columns, in prices for the prices, and the states before and after
+        the last candle.
+        """
+        n = ohlc_data.shape[0]
+        codes = _candle_codes(ohlc_data['identifier'].to_numpy(), orderflow_data['identifier'].to_numpy())
+        ticks = np.rint(self.prices(orderflow_data) / self.granularity)
+        bid, ask = orderflow_data['bid_size'].to_numpy(), orderflow_data['ask_size'].to_numpy()
+        sessions = self.indicators.session_keys(ohlc_data.index)
+        last = codes == n - 1
+        columns, boundary = self.indicators(np.where(last, -1, codes), ticks, bid, ask, sessions[:-1], state)
+        tail, state = self.indicators(np.where(last, 0, -1), ticks, bid, ask, sessions[-1:], boundary)
+        for name in columns:
+            columns[name] = np.concatenate([columns[name], tail[name]])
+            if name not in INDICATOR_SIZES:
+                columns[name] = columns[name] * self.granularity
+                if name.startswith('vwap') or name == 'session_vwap':
+                    columns[name] = np.round(columns[name], 2)
+        return columns, boundary, state
 
-        self.red_oc = self.open_close.loc[self.red_id]
-        self.red_oc = self.candle_proc(self.red_oc)
+    def cache_key(self):
+        """
+        This method will return the fingerprint of the unprocessed orderflow and ohlc data
+        and the CACHE_PARAMS settings, which keys the processed frames in the cache.
+        """
+        params = self.saved_attrs(CACHE_PARAMS)
+        params['granularity'] = float(self.granularity)
+        return fingerprint([self.orderflow_data, self.ohlc_data], params)
 
-        self.labels = self.calc_params(self.orderflow_data, self.ohlc_data)
+    def use_cached(self, key):
+        """
+        This method will set the processed frames from the cache entry of key.
+        It returns False when there is no entry.
+        """
+        cached = self.cache.get(key)
+        if cached is None:
+            return False
+        frames, attrs = cached
+        self.use_processed_frames(frames)
+        self.granularity = attrs['granularity']
+        self.identifier_col = attrs['identifier_col']
+        self._pyramid = None
+        self._resampled = None
+        return True
 
-        self.is_processed = True
+    def processed_frames(self):
+        """
+        This method will return the processed frames keyed like PROCESSED_KEYS and the
+        SAVED_ATTRS settings, as written by save_processed.
+        """
+        frames = {key: getattr(self, attr) for key, attr in PROCESSED_KEYS.items()}
+        attrs = self.saved_attrs(SAVED_ATTRS)
+        attrs['granularity'] = float(attrs['granularity'])
+        return frames, attrs
+
+    def saved_attrs(self, names):
+        """
+        This method will return the given attributes as a JSON serialisable dict,
+        the imbalance engine and the indicators being replaced by their settings.
+        """
+        attrs = {attr: getattr(self, attr) for attr in names}
+        for attr in SPEC_ATTRS:
+            if attrs.get(attr) is not None:
+                attrs[attr] = attrs[attr].params()
+        return attrs
+
+    def candle_partitions(self, parts):
+        """
+        This method will split the candles into up to parts ranges holding about the same number
+        of orderflow rows. It returns a list of (row_start, row_end, candle_start, candle_end)
+        positions in the orderflow and ohlc data, or None when the orderflow rows are not grouped
+        by candle in the ohlc order, in which case the data can only be processed serially.
+        """
+        codes = _candle_codes(self.ohlc_data['identifier'].to_numpy(), self.orderflow_data['identifier'].to_numpy())
+        if codes.shape[0] == 0 or codes.min() < 0 or (np.diff(codes) < 0).any():
+            return None
+        n = self.ohlc_data.shape[0]
+        cuts = np.unique(np.r_[0, codes[np.arange(1, parts) * codes.shape[0] // parts], n])
+        rows = np.searchsorted(codes, cuts)
+        return [(rows[i], rows[i + 1], cuts[i], cuts[i + 1]) for i in range(len(cuts) - 1)]
+
+    @staged('process_partitions', rows=lambda self, *args, **kwargs: self.orderflow_data.shape[0])
+    def process_partitions(self, partitions, workers):
+        """
+        This method will process the candle partitions in a pool of worker processes and merge
+        the results, returning the processed orderflow rows, volume profile rows and candle stats.
+        The imbalance, which carries over from one row to the next, is computed upfront for the
+        whole frame so that every partition is independent, unless an imbalance engine
+        computes it candle by candle in the workers.
+        """
+        orderflow_data = self.orderflow_data
+        if self.compact:
+            # the imbalance of the compact rows is computed from the float32 sizes
+            self.downcast(orderflow_data)
+        if self.imbalance_engine is not None:
+            logger.info("Calculating imbalance with the %s engine.", self.imbalance_engine.name)
+            size = None
+        elif self.imbalance_col is None:
+            logger.info("Calculating imbalance, as no imbalance column was provided.")
+            size = self.imbalance(orderflow_data).to_numpy()
+        else:
+            logger.info("Using imbalance column: %s", self.imbalance_col)
+            size = orderflow_data[self.imbalance_col].to_numpy()
+            orderflow_data = orderflow_data.drop([self.imbalance_col], axis=1)
+
+        attrs = {attr: getattr(self, attr) for attr in SAVED_ATTRS}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                _process_partition,
+                *zip(*[(type(self), attrs, orderflow_data.iloc[row_start:row_end],
+                        self.ohlc_data.iloc[candle_start:candle_end],
+                        None if size is None else size[row_start:row_end])
+                       for row_start, row_end, candle_start, candle_end in partitions])))
+        return tuple(pd.concat(frames) for frames in zip(*results))
+
+    def append(self, orderflow_rows, ohlc_rows):
+        """
+        This method will add new candles to the chart without reprocessing the existing ones.
+        orderflow_rows and ohlc_rows have the same layout as the constructor inputs and must
+        only hold candles which come after the candles already in the chart.
+        Only the new candles are processed, the results are buffered and merged into the
+        processed frames by flush, which plot and get_processed_data call.
+        """
+        if not self.is_processed:
+            self.orderflow_data = pd.concat([self.orderflow_data, orderflow_rows])
+            self.ohlc_data = pd.concat([self.ohlc_data, ohlc_rows])
+            return
+
+        state = self._stream_state()
+        orderflow_rows, ohlc_rows = orderflow_rows.copy(), ohlc_rows.copy()
+        if self.integer_codes:
+            orderflow_rows, ohlc_rows = self.encode_candles(orderflow_rows, ohlc_rows, start=state['last_id'] + 1,
+                                                            by_identifier='identifier' in ohlc_rows)
+        elif 'identifier' not in ohlc_rows:
+            count = self.ohlc_data.shape[0] + sum(frame.shape[0] for frame in self._pending['ohlc_data'])
+            self.assign_identifier(orderflow_rows, ohlc_rows, start=count)
+        self._process_rows(orderflow_rows, ohlc_rows, state['tail'], state['deltas'], state['indicators'])
+
+    def update_last_candle(self, orderflow_rows, ohlc_row):
+        """
+        This method will replace the last candle of the chart, e.g. while it is still being built.
+        orderflow_rows must hold all the price levels of the candle and ohlc_row its single ohlc row.
+        The identifier of the last candle is kept when the rows do not carry one,
+        with integer codes the candle always keeps its code.
+        """
+        if not self.is_processed:
+            last_id = self.ohlc_data['identifier'].iloc[-1]
+            self.orderflow_data = pd.concat([
+                self.orderflow_data[self.orderflow_data['identifier'] != last_id], orderflow_rows])
+            self.ohlc_data = pd.concat([self.ohlc_data.iloc[:-1], ohlc_row])
+            return
+
+        state = self._stream_state()
+        orderflow_rows, ohlc_row = orderflow_rows.copy(), ohlc_row.copy()
+        if self.integer_codes:
+            orderflow_rows, ohlc_row = self.encode_candles(orderflow_rows, ohlc_row, start=state['last_id'],
+                                                           by_identifier='identifier' in ohlc_row)
+        elif 'identifier' not in ohlc_row:
+            ohlc_row['identifier'] = state['last_id']
+            orderflow_rows['identifier'] = state['last_id']
+        self._drop_last_candle()
+        self._process_rows(orderflow_rows, ohlc_row, state['boundary'], state['deltas'][:-1],
+                           state['boundary_indicators'])
+
+    def flush(self):
+        """
+        This method will merge the candles buffered by append and update_last_candle
+        into the processed frames.
+        """
+        pending = getattr(self, '_pending', None)
+        if not pending or not pending['df']:
+            return
+        indexes = getattr(self, '_candle_index', None) or {}
+        added = {key: pd.concat(pending[key]) for key in ['ohlc_data'] + list(indexes)}
+        for key in PROCESSED_FRAMES:
+            setattr(self, key, pd.concat([getattr(self, key)] + pending[key]))
+            pending[key] = []
+        self.orderflow_data = self.df
+        self._pyramid = None
+        self._resampled = None
+        # the candle indexes are extended with the rows of the new candles only
+        identifiers = pd.Index(added['ohlc_data']['identifier'].to_numpy())
+        for key in list(indexes):
+            index = indexes[key].append(self._build_index(added[key], identifiers, key))
+            if index is None:
+                del indexes[key]
+            else:
+                indexes[key] = index
+
+    def _stream_state(self):
+        """
+        This method will return the state needed to process candles incrementally,
+        building it from the processed frames on first use:
+        - tail: the last processed orderflow row, which seeds the imbalance of the next candle
+        - boundary: the processed orderflow row preceding the last candle
+        - last_id: the identifier of the last candle
+        - deltas: the delta of the last cum_delta_window + 1 candles, for the rolling labels
+        - indicators, boundary_indicators: the state of the session indicators after the last candle
+          and before it, None without indicators
+        """
+        state = getattr(self, '_stream', None)
+        if state is not None:
+            return state
+
+        self._pending = {key: [] for key in PROCESSED_FRAMES}
+        last_id = self.ohlc_data['identifier'].iloc[-1]
+        n = self.ohlc_data.shape[0]
+        index = self.candle_index('df')
+        rows = index.locate(n - 1, n)
+        start = rows.start if isinstance(rows, slice) else rows[0]
+        first = max(n - self.cum_delta_window - 1, 0)
+        stats = self.candle_stats(index.take(self.df, first, n), self.ohlc_data.iloc[first:])
+        indicators = boundary_indicators = None
+        if self.indicators is not None:
+            # the session of the last candle is replayed from its first candle
+            sessions = self.indicators.session_keys(self.ohlc_data.index)
+            session_start = np.flatnonzero(sessions != sessions[-1])
+            session_start = session_start[-1] + 1 if session_start.shape[0] else 0
+            _, boundary_indicators, indicators = self.session_indicators(
+                index.take(self.df, session_start, n), self.ohlc_data.iloc[session_start:])
+        self._stream = {
+            'tail': self.df.iloc[-1],
+            'boundary': self.df.iloc[start - 1] if start > 0 else None,
+            'last_id': last_id,
+            'deltas': stats['delta'].to_numpy(),
+            'indicators': indicators,
+            'boundary_indicators': boundary_indicators,
+        }
+        return self._stream
+
+    def _process_rows(self, orderflow_rows, ohlc_rows, prev, deltas, indicators=None):
+        """
+        This method will run the processing steps on new candles only, buffer the results
+        and move the stream state forward. prev is the processed orderflow row preceding
+        the new rows, deltas the deltas of the candles preceding them and indicators the
+        state of the session indicators after them.
+        """
+        self.assign_sequence(orderflow_rows, ohlc_rows)
+        boundary_indicators = None
+        if self.indicators is not None:
+            boundary_indicators, indicators = self.add_indicators(orderflow_rows, ohlc_rows, indicators)
+
+        df = self.calc_imbalance(orderflow_rows, prev=prev)
+        frames = {
+            'df': df,
+            'df2': self.annotate(df),
+            'ohlc_data': ohlc_rows,
+        }
+        green = ohlc_rows['close'] >= ohlc_rows['open']
+        for type_ in ['hl', 'oc']:
+            frames['green_' + type_] = self.candle_segments(ohlc_rows[green], type_=type_)
+            frames['red_' + type_] = self.candle_segments(ohlc_rows[~green], type_=type_)
+
+        stats = self.candle_stats(df, ohlc_rows)
+        frames['labels'] = self.param_labels(stats, deltas)
+        deltas = np.concatenate([np.asarray(deltas, dtype=float), stats['delta'].to_numpy()])
+
+        for key in PROCESSED_FRAMES:
+            self._pending[key].append(frames[key])
+
+        last_id = ohlc_rows['identifier'].iloc[-1]
+        start = np.flatnonzero(df.index == last_id)[0]
+        self._stream = {
+            'tail': df.iloc[-1],
+            'boundary': df.iloc[start - 1] if start > 0 else prev,
+            'last_id': last_id,
+            'deltas': deltas[-(self.cum_delta_window + 1):],
+            'indicators': indicators,
+            'boundary_indicators': boundary_indicators,
+        }
+
+    def _drop_last_candle(self):
+        """
+        This method will remove the last candle from the processed frames, or from the
+        buffered frames when it has not been flushed yet. The rows of the processed frames
+        are found and the indexes trimmed through the candle indexes.
+        """
+        last_id = self._stream['last_id']
+        pending = self._pending['df'] != []
+        for key in PROCESSED_FRAMES:
+            frame = self._pending[key][-1] if pending else getattr(self, key)
+            if key == 'ohlc_data':
+                frame = frame[frame['identifier'] != last_id]
+            elif pending:
+                frame = frame[frame.index != last_id]
+            else:
+                frame, self._candle_index[key] = self.candle_index(key).drop_last(frame)
+            if pending:
+                self._pending[key][-1] = frame
+            else:
+                setattr(self, key, frame)
+        self.orderflow_data = self.df
+        self._pyramid = None
+        self._resampled = None
+
+    def candle_index(self, key='df'):
+        """
+        This method will return the CandleIndex of the processed frame key, one of PROCESSED_FRAMES,
+        built on first use and kept until the frames change. The indexes of the footprint
+        frames df and df2 also hold the lowest and highest price tick of every candle.
+        The indexes are extended by flush and trimmed by update_last_candle rather than rebuilt.
+        """
+        indexes = getattr(self, '_candle_index', None)
+        if indexes is None:
+            indexes = self._candle_index = {}
+        if key not in indexes:
+            indexes[key] = self._build_index(getattr(self, key), pd.Index(self.ohlc_data['identifier'].to_numpy()), key)
+        return indexes[key]
+
+    def _build_index(self, frame, identifiers, key):
+        """
+        This method will return the CandleIndex of the rows of frame over the candles of identifiers.
+        """
+        positions = _candle_codes(identifiers, frame.index.to_numpy())
+        ticks = np.rint(self.prices(frame) / self.granularity) if key in ['df', 'df2'] else None
+        return CandleIndex(positions, identifiers.shape[0], ticks)
+
+    def lod_level(self, factor):
+        """
+        This method will return the chart of the level of detail pyramid in which every factor
+        candles and factor price levels are merged, factor being a power of 2.
+        The levels are built from the previous level on first use and cached until the data changes.
+        Each level is a processed chart of its own, with the imbalance, volume profile and labels
+        recomputed on the merged data. Factor 1 is the chart itself.
+        """
+        if factor == 1:
+            return self
+        if not self.is_processed:
+            self.process_data()
+        self.flush()
+        pyramid = getattr(self, '_pyramid', None)
+        if pyramid is None:
+            pyramid = self._pyramid = {}
+        if factor not in pyramid:
+            finer = self.lod_level(factor // 2)
+            pyramid[factor] = finer.merged_chart(price_ticks=2, candles=2, integer_codes=True)
+        return pyramid[factor]
+
+    def build_pyramid(self, min_candles=16):
+        """
+        This method will build every level of the level of detail pyramid down to the
+        first level with at most min_candles candles, and return them keyed by factor.
+        """
+        factor = 1
+        while self.lod_level(factor).ohlc_data.shape[0] > min_candles:
+            factor *= 2
+        levels = {1: self}
+        levels.update(self._pyramid or {})
+        return levels
+
+    def resample(self, price_ticks=1, candles=1, freq=None):
+        """
+        This method will return the chart of the same footprint with the price levels merged into
+        buckets of price_ticks ticks and the candles merged candles at a time, or by the period of
+        freq, a pandas frequency such as '5min', see resample_footprint. The chart is processed with
+        the settings of this one and kept for each setting until the data changes, so switching
+        between settings only processes each of them once. The defaults return the chart itself.
+        """
+        if int(price_ticks) != price_ticks or price_ticks < 1 or int(candles) != candles or candles < 1:
+            raise ValueError("price_ticks and candles should be positive integers, got {} and {}".format(
+                price_ticks, candles))
+        if freq is not None and candles != 1:
+            raise ValueError("candles and freq cannot be used together")
+        freq = None if freq is None else pd.tseries.frequencies.to_offset(freq)
+        if price_ticks == 1 and candles == 1 and freq is None:
+            return self
+        if not self.is_processed:
+            self.process_data()
+        self.flush()
+        resampled = getattr(self, '_resampled', None)
+        if resampled is None:
+            resampled = self._resampled = {}
+        key = (int(price_ticks), int(candles), freq)
+        if key not in resampled:
+            resampled[key] = self.merged_chart(*key, integer_codes=self.integer_codes)
+        return resampled[key]
+
+    def merged_chart(self, price_ticks=1, candles=1, freq=None, integer_codes=False):
+        """
+        This method will return a new processed chart of the candles and price levels merged by
+        resample_footprint, with the processing settings of this chart.
+        """
+        orderflow_data, ohlc_data = resample_footprint(self.df, self.ohlc_data, self.granularity,
+                                                       price_ticks=price_ticks, candles=candles, freq=freq)
+        chart = type(self)(orderflow_data, ohlc_data, identifier_col='identifier', integer_codes=integer_codes,
+                           lazy_text=self.lazy_text, cum_delta_window=self.cum_delta_window,
+                           stats=self.stats, compact=self.compact, imbalance_engine=self.imbalance_engine,
+                           indicators=self.indicators, profiler=self.profiler)
+        chart.granularity = self.granularity * price_ticks
+        chart.process_data()
+        return chart
+
+    def memory_report(self):
+        """
+        This method will return the rows and bytes held by each processed frame, and their
+        total, as a dataframe indexed by frame name. The bytes of every column and index are
+        counted as by memory_usage(deep=True).
+        """
+        if not self.is_processed:
+            self.process_data()
+        self.flush()
+        report = {}
+        for key in PROCESSED_FRAMES:
+            frame = getattr(self, key)
+            report[key] = {
+                'rows': frame.shape[0],
+                'bytes': int(frame.memory_usage(deep=True).sum()),
+            }
+        report = pd.DataFrame.from_dict(report, orient='index')
+        report.loc['total'] = report.sum()
+        return report
 
     def get_processed_data(self):
         """
@@ -56,14 +1034,23 @@ class OrderFlowData():
                 self.process_data()
             except Exception as e:
                 raise Exception("Data processing failed. Please check the data types and the structure of the data. Refer to documentation for more information.")
+        self.flush()
+
+        df, df2 = self.df, self.df2
+        if self.compact:
+            df, df2 = df.assign(price=self.prices(df)), df2.assign(price=self.prices(df2))
+        if 'text' not in df:
+            df = df.assign(text=self.footprint_text(df))
+        if 'text' not in df2:
+            df2 = df2.assign(text=self.profile_text(df2))
 
-        datas = [self.df, self.labels, self.green_hl, self.red_hl, self.green_oc, self.red_oc, self.df2, self.ohlc_data]
+        datas = [df, self.labels, self.green_hl, self.red_hl, self.green_oc, self.red_oc, df2, self.ohlc_data]
         datas2 = []
         # Convert all timestamps to utc float
         temp = ''
         for data in datas:
-            temp = data.copy()
-            temp.index.name = 'index'
+            # reset_index returns a new frame, so the data is not copied beforehand
+            temp = data.rename_axis('index', copy=False)
             try:
                 temp = temp.reset_index()
             except Exception as e:
@@ -98,6 +1085,77 @@ class OrderFlowData():
         self = cls(None, None, data=data)
         return self
 
+    def save_processed(self, path):
+        """
+        This method will save the processed data to a binary columnar file at path.
+        Every column keeps its dtype, numbers and timestamps are stored as raw arrays and
+        strings are dictionary encoded. The file can be memory mapped by load_processed.
+        """
+        if not self.is_processed:
+            self.process_data()
+        self.flush()
+        save_frames(path, *self.processed_frames())
+
+    @classmethod
+    def load_processed(cls, path, mmap=True):
+        """
+        This class method will create an instance of OrderFlowChart from a file written by save_processed.
+        With mmap the numeric columns are memory mapped rather than read into memory.
+        """
+        frames, attrs = load_frames(path, mmap=mmap)
+        kwargs = {k: attrs[k] for k in SAVED_ATTRS if k != 'granularity' and k in attrs}
+        self = cls(None, None, processed=frames, **kwargs)
+        self.granularity = attrs['granularity']
+        return self
+
+    def use_processed_frames(self, frames):
+        """
+        This method will use processed dataframes, keyed like the get_processed_data output,
+        to set the instance variables.
+        """
+        for key, attr in PROCESSED_KEYS.items():
+            setattr(self, attr, frames[key])
+        self.orderflow_data = self.df
+        self.granularity = infer_granularity(self.df['price'])
+        self._stream = None
+        self._candle_index = None
+        self.is_processed = True
+
+    @classmethod
+    def from_trades(cls, trades, bar='time', bar_size='1min', granularity=None, **kwargs):
+        """
+        This class method will create an instance of OrderFlowChart from raw trades.
+        The trades are aggregated with aggregate_trades and the remaining keyword
+        arguments are passed on to aggregate_trades and the constructor. The chart keeps the
+        granularity the prices were snapped to, given or inferred from all the trades.
+        """
+        agg_kwargs = {k: kwargs.pop(k) for k in ['price_col', 'size_col', 'side_col', 'time_col', 'prefix']
+                      if k in kwargs}
+        orderflow_data, ohlc_data, granularity = aggregate_trades(trades, bar=bar, bar_size=bar_size,
+                                                                  granularity=granularity, return_granularity=True,
+                                                                  **agg_kwargs)
+        self = cls(orderflow_data, ohlc_data, identifier_col='identifier', **kwargs)
+        self.granularity = granularity
+        return self
+
+    @classmethod
+    def from_csv(cls, orderflow_path, ohlc_path, layout='range', chunksize=CHUNK_ROWS, **kwargs):
+        """
+        This class method will create a processed instance of OrderFlowChart from a pair of
+        orderflow and ohlc CSV files in one of the CSV_LAYOUTS. The orderflow file is parsed in
+        chunks of chunksize rows and each chunk is processed with append as soon as it is read.
+        The remaining keyword arguments are passed on to the constructor.
+        """
+        kwargs.setdefault('identifier_col', CSV_LAYOUTS[layout]['identifier_col'] if layout in CSV_LAYOUTS else None)
+        self = None
+        for orderflow_rows, ohlc_rows in read_candles(orderflow_path, ohlc_path, layout, chunksize):
+            if self is None:
+                self = cls(orderflow_rows.copy(), ohlc_rows.copy(), **kwargs)
+                self.process_data()
+            else:
+                self.append(orderflow_rows, ohlc_rows)
+        return self
+
     def use_processed_data(self, data):
         """
         This method will use the preprocessed data to set the instance variables.
@@ -168,6 +1226,8 @@ class OrderFlowData():
             self.ohlc_data = self.ohlc_data.set_index('index')
         except Exception as e:
             pass
-        self.granularity = abs(self.df.iloc[0]['price'] - self.df.iloc[1]['price'])
+        self.granularity = infer_granularity(self.df['price'])
+        self._stream = None
+        self._candle_index = None
         self.is_processed = True
 
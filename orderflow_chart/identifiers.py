@@ -0,0 +1,32 @@
+import string
+
+import pandas as pd
+import numpy as np
+
+# letters of the candle identifiers, which are letter strings like those of data/range_ohlc.csv
+IDENTIFIER_LETTERS = np.frombuffer(string.ascii_letters.encode(), dtype=np.uint8)
+
+
+def _letter_identifiers(numbers, length=5):
+    """
+    Return the numbers written with length letters, as base 52 digits of IDENTIFIER_LETTERS.
+    """
+    base = IDENTIFIER_LETTERS.shape[0]
+    digits = np.asarray(numbers, dtype=np.int64)[:, None] // base ** np.arange(length) % base
+    return IDENTIFIER_LETTERS[digits].view('S{}'.format(length)).ravel().astype(str).astype(object)
+
+
+def _candle_codes(identifiers, row_identifiers):
+    """
+    Return the position in identifiers of every row identifier, -1 when it is missing.
+    Rows of a candle are usually contiguous, so only the first row of every run is looked up.
+    Passing identifiers as a pd.Index reuses its hash table across calls.
+    """
+    row_identifiers = np.asarray(row_identifiers)
+    if row_identifiers.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    if not isinstance(identifiers, pd.Index):
+        identifiers = pd.Index(identifiers)
+    heads = np.flatnonzero(np.r_[True, row_identifiers[1:] != row_identifiers[:-1]])
+    lengths = np.diff(np.r_[heads, row_identifiers.shape[0]])
+    return np.repeat(identifiers.get_indexer(row_identifiers[heads]), lengths)
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+IMBALANCE_RATIO = 3.0
+STACKED_LEVELS = 3
+# columns added to the orderflow rows by the engines, besides the 'size' the heatmap is coloured by
+IMBALANCE_COLUMNS = ('buy_imbalance', 'sell_imbalance', 'stacked_buy', 'stacked_sell', 'unfinished')
+
+
+def _stacked(flags, step, levels):
+    """
+    Return the flags which belong to a run of at least levels consecutive flagged levels.
+    step marks the rows one level away from the previous row of the same candle, the rows
+    being sorted by candle and price.
+    """
+    start = flags & ~(np.r_[False, flags[:-1]] & step)
+    run = np.cumsum(start) - 1
+    lengths = np.bincount(run[flags], minlength=flags.shape[0])
+    return flags & (lengths[run.clip(0)] >= levels)
+
+
+class DiagonalImbalance():
+    """
+    DiagonalImbalance class computing the diagonal imbalances of footprint cells, candle by candle.
+    The bid of a level is compared with the ask of the level above and the ask with the bid of the
+    level below, the levels of different candles are never compared and a missing level has no volume.
+    - size: (bid - ask above) / (bid + ask above), 0 when both are empty, coloured by the heatmap
+    - buy_imbalance: the ask is at least ratio times the bid below and at least min_volume
+    - sell_imbalance: the bid is at least ratio times the ask above and at least min_volume
+    - stacked_buy, stacked_sell: the imbalance is part of a run of at least stacked consecutive levels
+    - unfinished: 1 at the high and -1 at the low of a candle when both sides traded there, 0 otherwise
+    All the cells are processed in a single vectorised pass over the cells sorted by candle and price.
+    """
+    name = 'diagonal'
+
+    def __init__(self, ratio=IMBALANCE_RATIO, stacked=STACKED_LEVELS, min_volume=1):
+        self.ratio = ratio
+        self.stacked = stacked
+        self.min_volume = min_volume
+
+    def params(self):
+        """
+        This method will return the settings of the engine as a JSON serialisable dict,
+        from which build_engine builds it again.
+        """
+        return {'name': self.name, 'ratio': self.ratio, 'stacked': self.stacked, 'min_volume': self.min_volume}
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(k, v) for k, v in self.params().items() if k != 'name'))
+
+    def __call__(self, codes, ticks, bid, ask):
+        """
+        Return the imbalance columns of the cells, as a dict of arrays in the order of the cells.
+        codes is the candle of each cell, ticks its price in ticks and bid and ask its sizes.
+        """
+        n = codes.shape[0]
+        if n == 0:
+            columns = {'size': np.zeros(0)}
+            columns.update({name: np.zeros(0, dtype=bool) for name in IMBALANCE_COLUMNS})
+            columns['unfinished'] = np.zeros(0, dtype=np.int8)
+            return columns
+        ticks = ticks.astype(np.int64)
+        top = ticks.max()
+        # the levels are keyed by candle then descending price, the usual order of the rows, which
+        # is then not sorted again. A spare level on both sides keeps the candles apart.
+        span = top - ticks.min() + 3
+        key = codes.astype(np.int64) * span + (top - ticks + 1)
+        order = None if (np.diff(key) > 0).all() else np.argsort(key, kind='stable')
+        if order is not None:
+            key, bid, ask = key[order], np.asarray(bid)[order], np.asarray(ask)[order]
+        bid = np.asarray(bid, dtype=np.float64)
+        ask = np.asarray(ask, dtype=np.float64)
+
+        # below marks the levels one tick under the previous level of the same candle
+        below = np.r_[False, np.diff(key) == 1]
+        ask_above = np.where(below, np.r_[0.0, ask[:-1]], 0.0)
+        bid_below = np.where(np.r_[below[1:], False], np.r_[bid[1:], 0.0], 0.0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            size = np.nan_to_num((bid - ask_above) / (bid + ask_above))
+        buy = (ask >= self.ratio * bid_below) & (ask >= self.min_volume)
+        sell = (bid >= self.ratio * ask_above) & (bid >= self.min_volume)
+
+        candle = key // span
+        high = np.r_[True, candle[1:] != candle[:-1]]
+        low = np.r_[candle[1:] != candle[:-1], True]
+        traded = (bid > 0) & (ask > 0)
+        unfinished = np.where(high & traded, 1, np.where(low & traded, -1, 0)).astype(np.int8)
+
+        columns = {
+            'size': size,
+            'buy_imbalance': buy,
+            'sell_imbalance': sell,
+            'stacked_buy': _stacked(buy, below, self.stacked),
+            'stacked_sell': _stacked(sell, below, self.stacked),
+            'unfinished': unfinished,
+        }
+        if order is not None:
+            for name, values in columns.items():
+                columns[name] = np.empty_like(values)
+                columns[name][order] = values
+        return columns
+
+
+IMBALANCE_ENGINES = {
+    'diagonal': DiagonalImbalance,
+}
+
+
+def build_engine(spec):
+    """
+    Return the imbalance engine described by spec: None, an engine, the name of one of the
+    IMBALANCE_ENGINES or a dict of its name and settings as returned by params.
+    """
+    if spec is None or callable(spec):
+        return spec
+    if isinstance(spec, str):
+        spec = {'name': spec}
+    spec = dict(spec)
+    name = spec.pop('name', None)
+    if name not in IMBALANCE_ENGINES:
+        raise ValueError("Unknown imbalance engine '{}', expected one of {}".format(name, list(IMBALANCE_ENGINES)))
+    return IMBALANCE_ENGINES[name](**spec)
@@ -0,0 +1,155 @@
+import pandas as pd
+import numpy as np
+
+from .identifiers import _candle_codes
+
+
+# rows parsed at a time, which bounds the memory used while reading
+CHUNK_ROWS = 1_000_000
+
+# column names, header and timestamp format of the supported CSV exports
+CSV_LAYOUTS = {
+    # data/range_candles.csv and data/range_ohlc.csv: no header, candles keyed by an identifier
+    'range': {
+        'orderflow': ['time', 'bid_size', 'price', 'ask_size', 'identifier'],
+        'ohlc': ['time', 'open', 'high', 'low', 'close', 'identifier'],
+        'header': None,
+        'index_name': None,
+        'time_format': '%Y-%m-%d %H:%M:%S',
+        'identifier_col': 'identifier',
+    },
+    # data/time_candles.csv and data/time_ohlc.csv: with a header, candles keyed by their timestamp
+    'time': {
+        'orderflow': ['time', 'bid_size', 'price', 'ask_size'],
+        'ohlc': ['time', 'open', 'high', 'low', 'close', 'volume'],
+        'header': 0,
+        'index_name': 'time',
+        'time_format': '%Y-%m-%d %H:%M:%S%z',
+        'identifier_col': None,
+    },
+}
+CSV_DTYPES = {
+    'time': object,
+    'bid_size': np.float32,
+    'ask_size': np.float32,
+    'price': np.float64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'identifier': object,
+}
+
+
+def _layout(layout):
+    """
+    Return the description of a CSV layout, raising a ValueError for unknown layouts.
+    """
+    if layout not in CSV_LAYOUTS:
+        raise ValueError("Unknown layout '{}', expected one of {}".format(layout, list(CSV_LAYOUTS)))
+    return CSV_LAYOUTS[layout]
+
+
+def parse_times(values, time_format, name=None):
+    """
+    Parse fixed format timestamp strings into a DatetimeIndex.
+    Footprint rows repeat the timestamp of their candle, so only the distinct strings are parsed.
+    """
+    codes, uniques = pd.factorize(values)
+    times = pd.to_datetime(pd.Index(uniques, dtype=object), format=time_format)
+    return pd.DatetimeIndex(times[codes], name=name)
+
+
+def _read_chunks(path, spec, key, chunksize, dtypes=None):
+    """
+    Yield the rows of a CSV file as dataframes of up to chunksize rows, indexed by time.
+    """
+    names = spec[key]
+    dtype = dict({name: CSV_DTYPES[name] for name in names}, **(dtypes or {}))
+    reader = pd.read_csv(path, header=spec['header'], names=names, dtype=dtype, chunksize=chunksize)
+    for chunk in reader:
+        chunk.index = parse_times(chunk.pop('time'), spec['time_format'], spec['index_name'])
+        yield chunk
+
+
+def read_ohlc(path, layout='range', chunksize=CHUNK_ROWS):
+    """
+    This function will read an ohlc CSV file of the given layout, sorted by time.
+    The ohlc file holds a single row per candle, so it is read whole.
+    """
+    spec = _layout(layout)
+    ohlc_data = pd.concat(_read_chunks(path, spec, 'ohlc', chunksize))
+    if not ohlc_data.index.is_monotonic_increasing:
+        ohlc_data = ohlc_data.iloc[np.argsort(ohlc_data.index.to_numpy(), kind='stable')]
+    return ohlc_data
+
+
+def read_orderflow(path, layout='range', chunksize=CHUNK_ROWS):
+    """
+    This function will read an orderflow CSV file of the given layout in chunks of up to
+    chunksize rows, yielding each chunk as it is parsed. The bid and ask sizes are read as float32.
+    """
+    return _read_chunks(path, _layout(layout), 'orderflow', chunksize)
+
+
+def read_candles(orderflow_path, ohlc_path, layout='range', chunksize=CHUNK_ROWS):
+    """
+    This function will read a pair of orderflow and ohlc CSV files and yield them in batches
+    of whole candles, as (orderflow_rows, ohlc_rows), ready for OrderFlowChart.append.
+    The rows of the last candle of a chunk are held back until the next chunk completes it,
+    so the orderflow rows of a candle must be contiguous and in the order of the ohlc rows.
+    The identifier column of the orderflow rows is a categorical of the ohlc identifiers.
+    """
+    spec = _layout(layout)
+    ohlc_data = read_ohlc(ohlc_path, layout, chunksize)
+    if spec['identifier_col'] is None:
+        keys = pd.Index(ohlc_data.index.asi8)
+    else:
+        keys = pd.CategoricalDtype(ohlc_data[spec['identifier_col']].to_numpy())
+
+    done = 0
+    carry = None
+    for chunk in read_orderflow(orderflow_path, layout, chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        rows, positions = _candle_positions(chunk, keys, spec)
+        last = np.flatnonzero(positions[:-1] != positions[-1])
+        if last.shape[0] == 0:
+            carry = chunk
+            continue
+        cut = last[-1] + 1
+        carry = chunk.iloc[cut:]
+        yield rows.iloc[:cut], ohlc_data.iloc[done:_batch_end(positions[:cut], done, chunk)]
+        done = positions[cut - 1] + 1
+
+    if carry is not None:
+        rows, positions = _candle_positions(carry, keys, spec)
+        _batch_end(positions, done, carry)
+        yield rows, ohlc_data.iloc[done:]
+
+
+def _candle_positions(rows, keys, spec):
+    """
+    Return the orderflow rows with their identifier column as a categorical of the ohlc
+    identifiers, and the position in the ohlc data of the candle of each row, -1 when it is missing.
+    keys is the categorical dtype of the ohlc identifiers, or the index of the ohlc timestamps
+    when the candles are keyed by time.
+    """
+    if spec['identifier_col'] is None:
+        return rows, _candle_codes(keys, rows.index.asi8)
+    codes = _candle_codes(keys.categories, rows[spec['identifier_col']].to_numpy())
+    rows = rows.copy()
+    rows[spec['identifier_col']] = pd.Categorical.from_codes(codes, dtype=keys)
+    return rows, codes
+
+
+def _batch_end(positions, done, rows):
+    """
+    Return the end of the ohlc rows of a batch whose candles are at positions,
+    checking that they follow the candles already read.
+    """
+    if positions.min() < done or (np.diff(positions) < 0).any():
+        raise ValueError("The candles of the rows from {} are missing from the ohlc data or out of order".format(
+            rows.index[0]))
+    return positions[-1] + 1
@@ -1,6 +1,97 @@
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from plotly.graph_objs import *
+import copy
+import functools
+import logging
+
+import pandas as pd
+import numpy as np
+
+from .profiler import staged
+
+# plotly is imported by the functions building figures, on the first plot, so that the charts
+# can be processed without loading it
+logger = logging.getLogger(__name__)
+
+# smallest candle width and price level height, in pixels, at which footprint text is readable
+CANDLE_PIXELS = 40
+LEVEL_PIXELS = 12
+# 'svg' draws the chart with the original traces, 'webgl' with WebGL line and text traces
+# fed with compact typed arrays (see webgl_traces)
+RENDER_MODES = ('svg', 'webgl')
+PLOT_CONFIG = {
+    'modeBarButtonsToRemove': ['zoomIn', 'zoomOut', 'zoom', 'autoScale'],
+    'scrollZoom': True,
+    'displaylogo': False,
+    'modeBarButtonsToAdd': ['drawline',
+                            'drawopenpath',
+                            'drawclosedpath',
+                            'drawcircle',
+                            'drawrect',
+                            'eraseshape'
+                            ]
+}
+
+# the lines of the session indicators drawn over the footprint: column, name, colour, dash and shape,
+# followed by the vwap bands
+INDICATOR_LINES = (
+    ('session_vwap', 'VWAP', 'orange', 'solid', 'linear'),
+    ('session_poc', 'POC', 'yellow', 'solid', 'hv'),
+    ('session_vah', 'VAH', 'yellow', 'dash', 'hv'),
+    ('session_val', 'VAL', 'yellow', 'dash', 'hv'),
+)
+# the x and y axes of the traces of the rows of the figure made by figure_layout
+SUBPLOT_AXES = {1: ('x', 'y'), 2: ('x2', 'y2')}
+
+
+@functools.lru_cache(maxsize=1)
+def base_layout():
+    """
+    Return the layout shared by all the figures as a plain dict: the two subplots, the theme, the axes
+    and the spikes. It is built once per process, as building it takes longer than most plots.
+    The dict is shared, figure_layout returns a copy to work on.
+    """
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
+                        vertical_spacing=0.0, row_heights=[9, 1])
+    fig.update_layout(title='Order Book Chart',
+                    yaxis=dict(title='Price', showgrid=False, tickformat='.2f'),
+                    yaxis2=dict(fixedrange=True, showgrid=False),
+                    xaxis2=dict(title='Time', showgrid=False),
+                    xaxis=dict(showgrid=False),
+                    height=780,
+                    template='plotly_dark',
+                    paper_bgcolor='#222', plot_bgcolor='#222',
+                    dragmode='pan', margin=dict(l=10, r=0, t=40, b=20),)
+
+    fig.update_xaxes(
+        showspikes=True,
+        spikecolor="white",
+        spikesnap="cursor",
+        spikemode="across",
+        spikethickness=0.25,
+        tickmode='array')
+    fig.update_yaxes(
+        showspikes=True,
+        spikecolor="white",
+        spikesnap="cursor",
+        spikemode="across",
+        spikethickness=0.25)
+    fig.update_layout(spikedistance=1000, hoverdistance=100)
+    return fig.layout.to_plotly_json()
+
+
+def figure_layout():
+    """
+    Return a copy of the layout of base_layout, which the caller can modify.
+    """
+    return copy.deepcopy(base_layout())
+
+
+def shared_figure():
+    """
+    Return an empty figure with a copy of the layout of base_layout.
+    """
+    import plotly.graph_objects as go
+    return go.Figure(layout=figure_layout())
 
 
 class OrderFlowPlot():
@@ -12,40 +103,86 @@ class OrderFlowPlot():
     The order flow data is plotted as a heatmap, the OHLC data is plotted as candlesticks,
     and the imbalance is plotted as a line chart.
     """
-    def plot(self, return_figure=False):
+    @staged('plot', rows=lambda self, *args, **kwargs: self.ohlc_data.shape[0])
+    def plot(self, return_figure=False, window=None, start=None, end=None, price_range=None, pixels=None,
+             fit=False, render='svg'):
         """
         This method will plot the order flow chart using the processed data.
         It will create a figure with two subplots: one for the order flow data and one for the OHLC data.
         It will also add traces for the order flow data, OHLC data, and the imbalance.
         The order flow data will be plotted as a heatmap, the OHLC data will be plotted as candlesticks,
         and the imbalance will be plotted as a line chart.
+        window, start and end restrict the figure to a range of candles (see window_bounds) and
+        price_range to a (low, high) band of prices, so that only the visible data is sent to the browser.
+        pixels is a (width, height) budget: the candles and price levels are then merged by the
+        level of detail pyramid (see lod_level) until the whole window fits, and shown in full.
+        With fit the initial view covers the whole window instead of the last 9 candles.
+        render is one of RENDER_MODES.
         The figure will be returned if return_figure is True, otherwise it will be shown.
         """
         if not self.is_processed:
             self.process_data()
+        self.flush()
+
+        if pixels is not None:
+            start, end = self.window_bounds(start, end, window)
+            factor = self.lod_factor(start, end, pixels)
+            return self.lod_level(factor).plot(return_figure=return_figure, start=start // factor,
+                                               end=-(-end // factor), price_range=price_range, fit=True,
+                                               render=render)
+
+        self._window = self.window_bounds(start, end, window)
+        frames = self.window_frames(*self._window, price_range=price_range)
+
+        ymin, ymax, xmin, xmax, tickvals, ticktext = self.plot_ranges(frames['ohlc_data'], fit=fit)
+        logger.info("Total candles: %d", self.ohlc_data.shape[0])
+        # Create figure from the shared layout, only the ranges and ticks depend on the data
+        fig = shared_figure()
+
+        with self.stage('figure_traces', frames['df'].shape[0]):
+            for trace, row in self.figure_traces(frames, render=render):
+                with self.stage('add_trace', key=trace.name or trace.type):
+                    fig.add_trace(trace.update(xaxis=SUBPLOT_AXES[row][0], yaxis=SUBPLOT_AXES[row][1]))
 
-        ymin, ymax, xmin, xmax, tickvals, ticktext = self.plot_ranges(self.ohlc_data)
-        print("Total candles: ", self.ohlc_data.shape[0])
-        # Create figure
-        fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
-                            vertical_spacing=0.0, row_heights=[9, 1])
-
-        fig.add_trace(go.Scatter(x=self.df2['identifier'], y=self.df2['price'], text=self.df2['text'],
-                                name='VolumeProfile', textposition='middle right',
-                                textfont=dict(size=8, color='rgb(0, 0, 255, 0.0)'), hoverinfo='none',
-                                mode='text', showlegend=True,
-                                marker=dict(
-                                sizemode='area',
-                                sizeref=0.1,  # Adjust the size scaling factor as needed
-                                )), row=1, col=1)
+        with self.stage('update_layout'):
+            fig.update_layout(yaxis_range=[ymax, ymin], xaxis_range=[xmin, xmax],
+                              xaxis_tickvals=tickvals, xaxis_ticktext=ticktext,
+                              xaxis2_tickvals=tickvals, xaxis2_ticktext=ticktext)
+
+        if return_figure:
+            return fig
+
+        # Show figure
+        fig.show(config=PLOT_CONFIG)
+
+    def figure_traces(self, frames, render='svg'):
+        """
+        This method will build the traces of the chart from the processed frames.
+        It returns a list of (trace, row) pairs, row being the subplot the trace belongs to.
+        """
+        if render not in RENDER_MODES:
+            raise ValueError("Unknown render mode '{}', expected one of {}".format(render, RENDER_MODES))
+        if render == 'webgl':
+            return self.webgl_traces(frames)
+        import plotly.graph_objects as go
+        df, df2, labels = frames['df'], frames['df2'], frames['labels']
+        traces = []
+        traces.append((go.Scatter(x=df2['identifier'], y=df2['price'], text=df2['text'],
+                                  name='VolumeProfile', textposition='middle right',
+                                  textfont=dict(size=8, color='rgb(0, 0, 255, 0.0)'), hoverinfo='none',
+                                  mode='text', showlegend=True,
+                                  marker=dict(
+                                  sizemode='area',
+                                  sizeref=0.1,  # Adjust the size scaling factor as needed
+                                  )), 1))
 
         # Add trace for orderflow data
-        fig.add_trace(
+        traces.append((
             go.Heatmap(
-                x=self.df['identifier'],
-                y=self.df['price'],
-                z=self.df['size'],
-                text=self.df['text'],
+                x=df['identifier'],
+                y=df['price'],
+                z=df['size'],
+                text=df['text'],
                 colorscale='icefire_r',
                 showscale=False,
                 showlegend=True,
@@ -55,128 +192,319 @@ class OrderFlowPlot():
                     "size": 11,
                     "family": "Courier New"},
                 hovertemplate="Price: %{y}<br>Size: %{text}<br>Imbalance: %{z}<extra></extra>",
-                xgap=60),
-            row=1,
-            col=1)
+                xgap=60), 1))
 
-        fig.add_trace(
+        traces.append((
             go.Scatter(
-                x=self.green_hl.index,
-                y=self.green_hl['price'],
+                x=frames['green_hl'].index,
+                y=frames['green_hl']['price'],
                 name='Candle',
                 legendgroup='group',
                 showlegend=True,
                 line=dict(
                     color='green',
-                    width=1.5)),
-            row=1,
-            col=1)
+                    width=1.5)), 1))
 
-        fig.add_trace(
+        traces.append((
             go.Scatter(
-                x=self.red_hl.index,
-                y=self.red_hl['price'],
+                x=frames['red_hl'].index,
+                y=frames['red_hl']['price'],
                 name='Candle',
                 legendgroup='group',
                 showlegend=False,
                 line=dict(
                     color='red',
-                    width=1.5)),
-            row=1,
-            col=1)
+                    width=1.5)), 1))
 
-        fig.add_trace(
+        traces.append((
             go.Scatter(
-                x=self.green_oc.index,
-                y=self.green_oc['price'],
+                x=frames['green_oc'].index,
+                y=frames['green_oc']['price'],
                 name='Candle',
                 legendgroup='group',
                 showlegend=False,
                 line=dict(
                     color='green',
-                    width=6)),
-            row=1,
-            col=1)
+                    width=6)), 1))
 
-        fig.add_trace(
+        traces.append((
             go.Scatter(
-                x=self.red_oc.index,
-                y=self.red_oc['price'],
+                x=frames['red_oc'].index,
+                y=frames['red_oc']['price'],
                 name='Candle',
                 legendgroup='group',
                 showlegend=False,
                 line=dict(
                     color='red',
-                    width=6)),
-            row=1,
-            col=1)
+                    width=6)), 1))
+
+        traces.extend(self.indicator_traces(frames['ohlc_data']))
+
+        traces.append((
+            go.Heatmap(
+                x=labels.index,
+                y=labels['type'],
+                z=labels['value'],
+                colorscale='rdylgn',
+                showscale=False,
+                showlegend=True,
+                name='Parameters',
+                text=labels['text'],
+                texttemplate="%{text}",
+                textfont={
+                    "size": 10},
+                hovertemplate="%{x}<br>%{text}<extra></extra>",
+                xgap=4,
+                ygap=4), 2))
 
-        # fig.add_trace(go.Scatter(x=buy_vwap.index, y=buy_vwap, name='VWAP', legendgroup='group', showlegend=True, line=dict(color='green', width=1.5)), row=1, col=1)
+        return traces
 
-        # fig.add_trace(go.Scatter(x=sell_vwap.index, y=sell_vwap, name='VWAP', legendgroup='group', showlegend=False, line=dict(color='red', width=1.5)), row=1, col=1)
+    def webgl_traces(self, frames):
+        """
+        This method will build the traces of the chart for the 'webgl' render mode, in the order of figure_traces.
+        The numbers are passed as numpy arrays, which plotly serialises as base64 typed arrays,
+        and the repeated strings are not sent once per cell:
+        - the volume profile is split into one text trace per bar length, each with a single text,
+          and the empty bars are left out
+        - the parameters are sent as a matrix of candles by label type
+        The candle lines and the volume profile are drawn with WebGL.
+        """
+        import plotly.graph_objects as go
+        df, df2, labels = frames['df'], frames['df2'], frames['labels']
+        traces = []
+        x, y = df2.index.to_numpy(), df2['price'].to_numpy()
+        codes, bars = pd.factorize(df2['text'])
+        for i, bar in enumerate(bars):
+            if not bar.strip():
+                continue
+            points = codes == i
+            traces.append((go.Scattergl(x=x[points], y=y[points], text=bar,
+                                        name='VolumeProfile', legendgroup='VolumeProfile',
+                                        showlegend=not traces, textposition='middle right',
+                                        textfont=dict(size=8, color='rgb(0, 0, 255, 0.0)'), hoverinfo='none',
+                                        mode='text'), 1))
 
-        fig.add_trace(
+        traces.append((
             go.Heatmap(
-                x=self.labels.index,
-                y=self.labels['type'],
-                z=self.labels['value'],
+                x=df['identifier'].to_numpy(),
+                y=df['price'].to_numpy(),
+                z=df['size'].to_numpy(dtype=np.float32),
+                text=df['text'].to_numpy(),
+                colorscale='icefire_r',
+                showscale=False,
+                showlegend=True,
+                name='BidAsk',
+                texttemplate="%{text}",
+                textfont={
+                    "size": 11,
+                    "family": "Courier New"},
+                hovertemplate="Price: %{y}<br>Size: %{text}<br>Imbalance: %{z}<extra></extra>",
+                xgap=60), 1))
+
+        for key, color, width in [('green_hl', 'green', 1.5), ('red_hl', 'red', 1.5),
+                                  ('green_oc', 'green', 6), ('red_oc', 'red', 6)]:
+            traces.append((
+                go.Scattergl(
+                    x=frames[key].index.to_numpy(),
+                    y=frames[key]['price'].to_numpy(),
+                    name='Candle',
+                    legendgroup='group',
+                    showlegend=key == 'green_hl',
+                    mode='lines',
+                    line=dict(
+                        color=color,
+                        width=width)), 1))
+
+        traces.extend(self.indicator_traces(frames['ohlc_data'], webgl=True))
+
+        candles, candle_ids = pd.factorize(labels.index)
+        types, type_names = pd.factorize(labels['type'])
+        value = np.full((type_names.shape[0], candle_ids.shape[0]), np.nan, dtype=np.float32)
+        value[types, candles] = labels['value'].to_numpy()
+        text = np.full(value.shape, '', dtype=object)
+        text[types, candles] = labels['text'].to_numpy()
+        traces.append((
+            go.Heatmap(
+                x=np.asarray(candle_ids),
+                y=list(type_names),
+                z=value,
                 colorscale='rdylgn',
                 showscale=False,
                 showlegend=True,
                 name='Parameters',
-                text=self.labels['text'],
+                text=text.tolist(),
                 texttemplate="%{text}",
                 textfont={
                     "size": 10},
                 hovertemplate="%{x}<br>%{text}<extra></extra>",
                 xgap=4,
-                ygap=4),
-            row=2,
-            col=1)
-
-        fig.update_layout(title='Order Book Chart',
-                        yaxis=dict(title='Price', showgrid=False, range=[
-                                    ymax, ymin], tickformat='.2f'),
-                        yaxis2=dict(fixedrange=True, showgrid=False),
-                        xaxis2=dict(title='Time', showgrid=False),
-                        xaxis=dict(showgrid=False, range=[xmin, xmax]),
-                        height=780,
-                        template='plotly_dark',
-                        paper_bgcolor='#222', plot_bgcolor='#222',
-                        dragmode='pan', margin=dict(l=10, r=0, t=40, b=20),)
-
-        fig.update_xaxes(
-            showspikes=True,
-            spikecolor="white",
-            spikesnap="cursor",
-            spikemode="across",
-            spikethickness=0.25,
-            tickmode='array',
-            tickvals=tickvals,
-            ticktext=ticktext)
-        fig.update_yaxes(
-            showspikes=True,
-            spikecolor="white",
-            spikesnap="cursor",
-            spikemode="across",
-            spikethickness=0.25)
-        fig.update_layout(spikedistance=1000, hoverdistance=100)
-
-        config = {
-            'modeBarButtonsToRemove': ['zoomIn', 'zoomOut', 'zoom', 'autoScale'],
-            'scrollZoom': True,
-            'displaylogo': False,
-            'modeBarButtonsToAdd': ['drawline',
-                                    'drawopenpath',
-                                    'drawclosedpath',
-                                    'drawcircle',
-                                    'drawrect',
-                                    'eraseshape'
-                                    ]
-        }
+                ygap=4), 2))
 
-        if return_figure:
-            return fig
+        return traces
 
-        # Show figure
-        fig.show(config=config)
+    def indicator_traces(self, ohlc, webgl=False):
+        """
+        This method will build the lines of the session indicators held by the ohlc rows, drawn over
+        the footprint, see INDICATOR_LINES, or none when the chart has no indicators. The lines
+        are broken at the start of every session by a point without a price.
+        """
+        indicators = getattr(self, 'indicators', None)
+        if indicators is None or 'session_vwap' not in ohlc or ohlc.shape[0] == 0:
+            return []
+        import plotly.graph_objects as go
+        scatter = go.Scattergl if webgl else go.Scatter
+        sessions = indicators.session_keys(ohlc.index)
+        breaks = np.flatnonzero(sessions[1:] != sessions[:-1]) + 1
+        x = ohlc['identifier'].to_numpy()
+        x = np.insert(x, breaks, x[breaks])
+        lines = list(INDICATOR_LINES)
+        for k in indicators.bands:
+            lines += [('vwap_upper{:g}'.format(k), 'VWAP band', 'orange', 'dot', 'linear'),
+                      ('vwap_lower{:g}'.format(k), 'VWAP band', 'orange', 'dot', 'linear')]
+        traces = []
+        for column, name, color, dash, shape in lines:
+            y = np.insert(ohlc[column].to_numpy(dtype=float), breaks, np.nan)
+            traces.append((
+                scatter(
+                    x=x,
+                    y=y,
+                    name=name,
+                    legendgroup='Indicators',
+                    showlegend=not traces,
+                    mode='lines',
+                    hovertemplate=name + ": %{y}<extra></extra>",
+                    line=dict(
+                        color=color,
+                        width=1,
+                        dash=dash,
+                        shape=shape)), 1))
+        return traces
+
+    def lod_factor(self, start, end, pixels):
+        """
+        This method will return the smallest power of 2 by which the candles in [start, end)
+        and their price levels must be merged for the window to fit in a (width, height)
+        pixel budget, given CANDLE_PIXELS and LEVEL_PIXELS.
+        """
+        width, height = pixels
+        ohlc = self.ohlc_data.iloc[start:end]
+        candles = end - start
+        levels = (ohlc['high'].max() - ohlc['low'].min()) / self.granularity + 1
+        factor = 1
+        while (candles / factor * CANDLE_PIXELS > width or levels / factor * LEVEL_PIXELS > height) \
+                and candles / factor > 1:
+            factor *= 2
+        return factor
+
+    def window_bounds(self, start=None, end=None, window=None):
+        """
+        This method will return the (start, end) positions of a range of candles in the ohlc data.
+        start and end are candle positions (negative values count from the end) or timestamps,
+        window is a number of candles counted from start, back from end, or back from the last candle.
+        Without any argument the range covers all the candles.
+        """
+        n = self.ohlc_data.shape[0]
+        start, end = self._candle_position(start, n), self._candle_position(end, n)
+        if window is not None:
+            if start is None and end is None:
+                end = n
+            if start is None:
+                start = end - window
+            elif end is None:
+                end = start + window
+        start = 0 if start is None else min(max(start, 0), n)
+        end = n if end is None else min(max(end, 0), n)
+        if start >= end:
+            raise ValueError("The candle window [{}, {}) is empty".format(start, end))
+        return start, end
+
+    def _candle_position(self, value, n):
+        """
+        This method will convert a candle position or timestamp to a position in the ohlc data.
+        A timestamp maps to the first candle at or after it.
+        """
+        if value is None:
+            return None
+        if isinstance(value, (int, np.integer)):
+            return int(value) + n if value < 0 else int(value)
+        after = self.ohlc_data.index >= pd.Timestamp(value)
+        return int(np.argmax(after)) if after.any() else n
+
+    @staged('window_frames')
+    def window_frames(self, start, end, price_range=None):
+        """
+        This method will slice the processed frames to the candles in [start, end) and,
+        if price_range is given, the footprint cells to the (low, high) price band.
+        The rows are located through the candle indexes, which also skip the candles outside
+        the price band. The text columns which are built lazily are added to the sliced frames
+        and the ticks of the compact frames are converted to prices.
+        It returns a dict of the sliced frames keyed by attribute name.
+        """
+        ohlc = self.ohlc_data.iloc[start:end]
+        frames = {'ohlc_data': ohlc}
+        everything = start == 0 and end == self.ohlc_data.shape[0]
+        band = {}
+        if price_range is not None:
+            band = {'low': np.floor(min(price_range) / self.granularity),
+                    'high': np.ceil(max(price_range) / self.granularity)}
+        for key in ['df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels']:
+            frame = getattr(self, key)
+            if key in ['df', 'df2'] and band:
+                frames[key] = self.candle_index(key).take(frame, start, end, **band)
+            else:
+                frames[key] = frame if everything else self.candle_index(key).take(frame, start, end)
+
+        if self.compact:
+            # the compact frames hold prices as ticks, only the window is converted
+            for key in ['df', 'df2']:
+                frames[key] = frames[key].assign(price=self.prices(frames[key]))
+
+        if price_range is not None:
+            low, high = min(price_range), max(price_range)
+            for key in ['df', 'df2']:
+                frame = frames[key]
+                frames[key] = frame[(frame['price'] >= low) & (frame['price'] <= high)]
+
+        if 'text' not in frames['df']:
+            frames['df'] = frames['df'].assign(text=self.footprint_text(frames['df']))
+        if 'text' not in frames['df2']:
+            frames['df2'] = frames['df2'].assign(text=self.profile_text(frames['df2']))
+        return frames
+
+    def page(self, offset=1, window=None, render='svg'):
+        """
+        This method will move the plotted candle window by offset windows (negative to go back)
+        and return the figure pieces of the new window, for updating a figure already in the
+        browser with Plotly.react / Plotly.relayout:
+        - start, end: the candle positions of the window
+        - data: the traces as plotly JSON dicts on the axes of their subplot, in the order of figure_traces
+        - layout: the axis ranges and ticks of the window, as relayout updates
+        The window defaults to the last window plotted, or the last 9 candles, and render is
+        one of RENDER_MODES.
+        """
+        if not self.is_processed:
+            self.process_data()
+        self.flush()
+
+        start, end = getattr(self, '_window', None) or self.window_bounds(window=9)
+        size = window or end - start
+        n = self.ohlc_data.shape[0]
+        start = min(max(start + offset * size, 0), max(n - size, 0))
+        self._window = self.window_bounds(start=start, window=size)
+        frames = self.window_frames(*self._window)
+
+        ymin, ymax, xmin, xmax, tickvals, ticktext = self.plot_ranges(frames['ohlc_data'])
+        layout = {
+            'xaxis.range': [float(xmin), float(xmax)],
+            'yaxis.range': [float(ymax), float(ymin)],
+        }
+        for axis in ['xaxis', 'xaxis2']:
+            layout[axis + '.tickvals'] = pd.Series(tickvals).tolist()
+            layout[axis + '.ticktext'] = [str(i) for i in ticktext]
+        return {
+            'start': self._window[0],
+            'end': self._window[1],
+            'data': [trace.update(xaxis=SUBPLOT_AXES[row][0], yaxis=SUBPLOT_AXES[row][1]).to_plotly_json()
+                     for trace, row in self.figure_traces(frames, render=render)],
+            'layout': layout,
+        }
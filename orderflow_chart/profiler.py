@@ -0,0 +1,117 @@
+import contextlib
+import functools
+import logging
+import time
+import tracemalloc
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# the context of the stages of charts without a profiler, shared as it holds no state
+NO_STAGE = contextlib.nullcontext()
+
+
+class StageProfiler():
+    """
+    StageProfiler class recording the stages of process_data and plot of the charts it is attached to.
+    Every stage gives a record dict with:
+    - stage, key: the name of the stage and what it works on, e.g. 'candle_segments' and 'green_hl'
+    - parent, depth: the stage it runs in, None at the top, and the number of enclosing stages
+    - rows: the number of rows the stage works on, None when it does not apply
+    - seconds: the wall time of the stage, enclosed stages included
+    - allocated: with memory, the bytes allocated by the stage and still held at its end,
+      as traced by tracemalloc, which is started on the first stage and slows down allocations
+    The records are kept in records in the order the stages end, passed to callback when given
+    and logged at the debug level. report summarises them by stage.
+    """
+    def __init__(self, callback=None, memory=False):
+        self.callback = callback
+        self.memory = memory
+        self.records = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None, key=None):
+        """
+        This method will record the code run in the with block as a stage, yielding its record,
+        in which rows can still be filled in.
+        """
+        parent = self._stack[-1] if self._stack else None
+        record = {'stage': name, 'key': key, 'parent': None if parent is None else parent['stage'],
+                  'depth': len(self._stack), 'rows': rows, 'seconds': None, 'allocated': None}
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0] if self.memory else None
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._stack.pop()
+            if before is not None:
+                record['allocated'] = tracemalloc.get_traced_memory()[0] - before
+            self.records.append(record)
+            logger.debug("%s%s: %.6fs, %s rows", name, '' if key is None else '[{}]'.format(key),
+                         record['seconds'], rows)
+            if self.callback is not None:
+                self.callback(record)
+
+    def report(self):
+        """
+        This method will return a dataframe of the calls, total and mean seconds, rows and
+        allocated bytes of every stage and key, in the order the stages first ended.
+        """
+        columns = ['stage', 'key', 'parent', 'depth', 'rows', 'seconds', 'allocated']
+        records = pd.DataFrame(self.records, columns=columns)
+        records['key'] = records['key'].fillna('')
+        return records.groupby(['stage', 'key'], sort=False).agg(
+            calls=('seconds', 'size'), seconds=('seconds', 'sum'), mean=('seconds', 'mean'),
+            rows=('rows', lambda rows: rows.sum(min_count=1)),
+            allocated=('allocated', lambda allocated: allocated.sum(min_count=1))).reset_index()
+
+    def clear(self):
+        """
+        This method will forget the recorded stages.
+        """
+        self.records = []
+
+
+def build_profiler(spec):
+    """
+    Return the profiler described by spec: None, a StageProfiler, True for a new one or
+    a callable, called with the record of every stage.
+    """
+    if spec is None or spec is False:
+        return None
+    if isinstance(spec, StageProfiler):
+        return spec
+    if spec is True:
+        return StageProfiler()
+    if callable(spec):
+        return StageProfiler(callback=spec)
+    raise ValueError("profiler should be a StageProfiler, True or a callable, got {!r}".format(spec))
+
+
+def staged(name, rows=None, key=None):
+    """
+    Return a decorator recording every call of a chart method as the stage name, when the chart
+    has a profiler. rows and key are functions of the arguments of the call, by default the rows
+    are those of the first argument when it is a dataframe. Without a profiler the method is
+    called directly.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            if rows is not None:
+                count = rows(self, *args, **kwargs)
+            else:
+                count = args[0].shape[0] if args and isinstance(args[0], pd.DataFrame) else None
+            with profiler.stage(name, count, None if key is None else key(self, *args, **kwargs)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
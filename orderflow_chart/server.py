@@ -0,0 +1,331 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from .plot import PLOT_CONFIG
+
+FRAME_RATE = 10
+# frames a client may lag behind before it is disconnected, it gets the whole figure again on reconnect
+CLIENT_QUEUE = 32
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+TRACE_KEYS = ('x', 'y', 'z', 'text')
+
+# applies the messages of the server to the figure: 'figure' replaces it and 'delta' removes the points
+# of the candles listed in remove, appends the new points of every trace and updates the layout,
+# e.g. the axis ranges and ticks of a window which moved
+CLIENT_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+var config = %s;
+function connect() {
+    var socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+    socket.onmessage = function (event) {
+        var msg = JSON.parse(event.data);
+        if (msg.type === 'figure') {
+            Plotly.react(gd, msg.data, msg.layout, config);
+            return;
+        }
+        var remove = new Set(msg.remove);
+        msg.traces.forEach(function (points, i) {
+            var trace = gd.data[i];
+            var keep = [];
+            for (var j = 0; j < trace.x.length; j++) {
+                if (!remove.has(trace.x[j])) keep.push(j);
+            }
+            Object.keys(points).forEach(function (key) {
+                var old = trace[key] || [];
+                trace[key] = keep.map(function (j) { return old[j]; }).concat(points[key]);
+            });
+        });
+        Object.keys(msg.layout).forEach(function (path) {
+            var keys = path.split('.');
+            gd.layout[keys[0]] = gd.layout[keys[0]] || {};
+            gd.layout[keys[0]][keys[1]] = msg.layout[path];
+        });
+        gd.layout.datarevision = msg.revision;
+        Plotly.react(gd, gd.data, gd.layout, config);
+    };
+    socket.onclose = function () { setTimeout(connect, 1000); };
+}
+connect();
+""" % json.dumps(PLOT_CONFIG)
+
+
+def encode_frame(payload, opcode=0x1):
+    """
+    Return a websocket frame holding payload, unmasked as sent by a server.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+async def read_frame(reader):
+    """
+    Read a websocket frame and return its (opcode, payload), unmasking the payload when needed.
+    Fragmented messages are not reassembled, the clients of the server only send control frames.
+    """
+    first, second = await reader.readexactly(2)
+    n = second & 0x7f
+    if n == 126:
+        n = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif n == 127:
+        n = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(n)
+    if mask is not None:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0f, payload
+
+
+def accept_key(key):
+    """
+    Return the Sec-WebSocket-Accept header answering a Sec-WebSocket-Key.
+    """
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+class ChartServer():
+    """
+    ChartServer class for watching an OrderFlowChart build in real time in the browser.
+    It serves a page at / which connects to the websocket at /ws, sends the figure of the last window
+    candles to every new client, then pushes the changes made through append and update_last_candle
+    as deltas: the points of the new or changed candles and the candles to remove.
+    The changes of a burst of updates are coalesced into one delta per frame, at fps frames per second.
+    """
+    def __init__(self, chart, window=100, fps=FRAME_RATE, include_plotlyjs='cdn'):
+        self.chart = chart
+        self.window = window
+        self.fps = fps
+        self.include_plotlyjs = include_plotlyjs
+        self.clients = set()
+        self.revision = 0
+        self._dirty = None
+        self._sent = None
+        self._server = None
+        self._frames = None
+
+    def append(self, orderflow_rows, ohlc_rows):
+        """
+        This method will add new candles to the chart, see OrderFlowChart.append.
+        """
+        count = self._candle_count()
+        self.chart.append(orderflow_rows, ohlc_rows)
+        self._touch(count)
+
+    def update_last_candle(self, orderflow_rows, ohlc_row):
+        """
+        This method will replace the last candle of the chart, see OrderFlowChart.update_last_candle.
+        """
+        count = self._candle_count()
+        self.chart.update_last_candle(orderflow_rows, ohlc_row)
+        self._touch(count - 1)
+
+    def _candle_count(self):
+        """
+        This method will return the number of candles of the chart, processing it on first use.
+        """
+        if not self.chart.is_processed:
+            self.chart.process_data()
+        pending = getattr(self.chart, '_pending', None) or {}
+        return self.chart.ohlc_data.shape[0] + sum(i.shape[0] for i in pending.get('ohlc_data', []))
+
+    def _touch(self, position):
+        """
+        This method will mark the candles from position onwards as changed since the last frame.
+        """
+        self._dirty = position if self._dirty is None else min(self._dirty, position)
+
+    def figure(self):
+        """
+        This method will return the figure message of the current window, sent to new clients.
+        """
+        fig = self.chart.plot(return_figure=True, window=self.window)
+        start, end = self.chart.window_bounds(window=self.window)
+        if self._sent is None:
+            self._sent = (start, end, self.chart.ohlc_data['identifier'].iloc[start:end].to_numpy())
+        return {
+            'type': 'figure',
+            'data': [trace.to_plotly_json() for trace in fig.data],
+            'layout': fig.layout.to_plotly_json(),
+        }
+
+    def delta(self):
+        """
+        This method will return the delta message bringing the clients from the last frame to the
+        current window, or None when nothing changed. The points of the candles which changed or left
+        the window are removed by identifier and the points of the new or changed candles appended,
+        so a delta can be applied to a figure which already holds some of the changes.
+        The message holds the start and end positions of the window, and when the window moved,
+        the axis ranges and ticks of plot for the new window as layout updates, which bring the
+        new candles into view.
+        """
+        if self._dirty is None:
+            return None
+        self.chart.flush()
+        dirty, self._dirty = self._dirty, None
+        start, end = self.chart.window_bounds(window=self.window)
+        identifiers = self.chart.ohlc_data['identifier']
+        if self._sent is None:
+            self._sent = (start, end, identifiers.iloc[start:end].to_numpy())
+            return None
+
+        sent_start, sent_end, sent_ids = self._sent
+        first = max(dirty, start)
+        remove = list(sent_ids[:max(start - sent_start, 0)]) + list(sent_ids[max(first - sent_start, 0):])
+        frames = self.chart.window_frames(first, end)
+        traces = []
+        for trace, row in self.chart.figure_traces(frames):
+            trace = trace.to_plotly_json()
+            traces.append({key: trace[key] for key in TRACE_KEYS if key in trace})
+        self._sent = (start, end, identifiers.iloc[start:end].to_numpy())
+        self.revision += 1
+
+        layout = {}
+        if (start, end) != (sent_start, sent_end):
+            ohlc = self.chart.ohlc_data.iloc[start:end]
+            ymin, ymax, xmin, xmax, tickvals, ticktext = self.chart.plot_ranges(ohlc)
+            layout['xaxis.range'] = [xmin, xmax]
+            layout['yaxis.range'] = [ymax, ymin]
+            for axis in ['xaxis', 'xaxis2']:
+                layout[axis + '.tickvals'] = list(tickvals)
+                layout[axis + '.ticktext'] = list(ticktext)
+        return {'type': 'delta', 'revision': self.revision, 'start': start, 'end': end, 'remove': remove,
+                'traces': traces, 'layout': layout}
+
+    def page(self):
+        """
+        This method will return the html page of the chart, which loads the figure from the websocket.
+        """
+        return pio.to_html(go.Figure(), config=PLOT_CONFIG, include_plotlyjs=self.include_plotlyjs,
+                           full_html=True, div_id='orderflow-chart', post_script=CLIENT_SCRIPT)
+
+    async def start(self, host='127.0.0.1', port=8050):
+        """
+        This method will start serving the chart and pushing a frame every 1/fps seconds.
+        It returns once the server listens, its sockets are in self.sockets.
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._frames = asyncio.ensure_future(self._push_frames())
+        self.sockets = self._server.sockets
+
+    async def stop(self):
+        """
+        This method will disconnect the clients and stop the server.
+        """
+        self._frames.cancel()
+        for queue in list(self.clients):
+            queue.put_nowait(None)
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def serve(self, host='127.0.0.1', port=8050):
+        """
+        This method will serve the chart until cancelled.
+        """
+        await self.start(host, port)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def broadcast(self, message):
+        """
+        This method will queue a message for every client, disconnecting the clients too far behind.
+        """
+        frame = encode_frame(json.dumps(message, cls=PlotlyJSONEncoder))
+        for queue in list(self.clients):
+            if queue.full():
+                self.clients.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(frame)
+
+    async def _push_frames(self):
+        """
+        This method will send the coalesced changes to the clients at the frame rate.
+        """
+        while True:
+            await asyncio.sleep(1 / self.fps)
+            if not self.clients:
+                # the next client gets the whole figure
+                self._dirty = self._sent = None
+                continue
+            message = self.delta()
+            if message is not None:
+                self.broadcast(message)
+
+    async def _handle(self, reader, writer):
+        """
+        This method will answer an http request, upgrading the requests to /ws to a websocket.
+        """
+        try:
+            request = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            path = request[0].split(' ')[1] if len(request[0].split(' ')) > 1 else '/'
+            headers = dict(line.lower().split(': ', 1) for line in request[1:] if ': ' in line)
+            if path == '/ws' and headers.get('upgrade') == 'websocket':
+                key = [line.split(': ', 1)[1] for line in request[1:] if line.lower().startswith('sec-websocket-key:')]
+                writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                              'Sec-WebSocket-Accept: {}\r\n\r\n').format(accept_key(key[0].strip())).encode())
+                await self._serve_client(reader, writer)
+            elif path == '/':
+                body = self.page().encode('utf-8')
+                writer.write('HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n'
+                             'Content-Length: {}\r\nConnection: close\r\n\r\n'.format(len(body)).encode() + body)
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_client(self, reader, writer):
+        """
+        This method will send the figure then the frames to a websocket client, answering its pings
+        until it closes the connection.
+        """
+        queue = asyncio.Queue(CLIENT_QUEUE)
+        queue.put_nowait(encode_frame(json.dumps(self.figure(), cls=PlotlyJSONEncoder)))
+        self.clients.add(queue)
+        sender = asyncio.ensure_future(self._send(queue, writer))
+        try:
+            while not sender.done():
+                receive = asyncio.ensure_future(read_frame(reader))
+                done, _ = await asyncio.wait([receive, sender], return_when=asyncio.FIRST_COMPLETED)
+                if receive not in done:
+                    receive.cancel()
+                    break
+                opcode, payload = receive.result()
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9 and not queue.full():
+                    queue.put_nowait(encode_frame(payload, opcode=0xa))
+        finally:
+            self.clients.discard(queue)
+            sender.cancel()
+            writer.write(encode_frame(b'', opcode=0x8))
+
+    async def _send(self, queue, writer):
+        """
+        This method will write the frames queued for a client, until it is sent None.
+        """
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                return
+            writer.write(frame)
+            await writer.drain()
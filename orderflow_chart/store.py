@@ -0,0 +1,397 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import numpy as np
+
+from . import OrderFlowChart
+from .columnar import save_frames, load_frames
+from .data_wrangling import PROCESSED_KEYS, SAVED_ATTRS, infer_granularity
+from .identifiers import _candle_codes, _letter_identifiers
+from .loader import CHUNK_ROWS, CSV_LAYOUTS, read_candles
+
+SERIES_FILE = 'series.json'
+PARTITION_SUFFIX = '.npz'
+DAY_FORMAT = '%Y-%m-%d'
+# frames of a partition holding the raw footprint, next to the processed frames keyed like PROCESSED_KEYS
+RAW_FRAMES = ('raw_orderflow', 'raw_ohlc', 'candle_rows')
+# columns holding the integer codes of the candles, shifted when partitions are joined
+CODE_COLUMNS = ('identifier', 'sequence')
+# letters of the identifiers written from the nanoseconds of the candle times
+TIME_IDENTIFIER_LETTERS = 12
+
+
+def _check_name(name):
+    """
+    Return name, raising a ValueError when it cannot be used as a directory name.
+    """
+    name = str(name)
+    if not name or name.startswith('.') or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError("'{}' cannot be used as a symbol or bar type".format(name))
+    return name
+
+
+def _bound(value, tz):
+    """
+    Return value as a timestamp comparable with candle times in tz, None being no bound.
+    Naive values are taken as times in tz.
+    """
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    if tz is None:
+        return value if value.tz is None else value.tz_convert('UTC').tz_localize(None)
+    return value.tz_localize(tz) if value.tz is None else value.tz_convert(tz)
+
+
+def group_candles(orderflow_data, ohlc_data, identifier_col=None):
+    """
+    Return the ohlc rows sorted by time, the orderflow rows grouped by candle in the same order,
+    and the offsets of the rows of every candle, candle i holding rows offsets[i]:offsets[i + 1].
+    The rows are mapped to their candle through identifier_col, or through their timestamp when
+    it is None. Rows without a candle are dropped and the order of the rows of a candle is kept.
+    """
+    ohlc_data = ohlc_data.iloc[np.argsort(ohlc_data.index.to_numpy(), kind='stable')]
+    if identifier_col is None:
+        codes = ohlc_data.index.get_indexer(orderflow_data.index)
+    else:
+        ohlc_data, orderflow_data = ohlc_data.copy(), orderflow_data.copy()
+        for frame in [ohlc_data, orderflow_data]:
+            if isinstance(frame[identifier_col].dtype, pd.CategoricalDtype):
+                frame[identifier_col] = np.asarray(frame[identifier_col], dtype=object)
+        codes = _candle_codes(ohlc_data[identifier_col].to_numpy(), orderflow_data[identifier_col].to_numpy())
+    rows = np.flatnonzero(codes >= 0)
+    order = rows[np.argsort(codes[rows], kind='stable')]
+    offsets = np.searchsorted(codes[order], np.arange(ohlc_data.shape[0] + 1))
+    return orderflow_data.iloc[order], ohlc_data, offsets
+
+
+def _shift_codes(frame, offset):
+    """
+    Return frame with offset added to its integer candle codes, in its index and CODE_COLUMNS.
+    """
+    codes = {i: frame[i] + offset for i in CODE_COLUMNS if i in frame}
+    frame = frame.assign(**codes)
+    if frame.index.dtype.kind in 'iu':
+        frame.index = (frame.index + offset).astype(frame.index.dtype).rename(frame.index.name)
+    return frame
+
+
+def _chart_rows(orderflow_data, ohlc_data, identifier_col, kwargs):
+    """
+    Return copies of the rows of candles to process with the constructor kwargs, and the
+    identifier_col to process them with. Candles keyed by their time would be numbered from the
+    first candle of their day, so unless they get integer codes they are given identifiers
+    written from their time, which do not collide across the days of a chart.
+    """
+    orderflow_data, ohlc_data = orderflow_data.copy(), ohlc_data.copy()
+    if identifier_col is None and not (kwargs.get('integer_codes') or kwargs.get('compact')):
+        identifiers = _letter_identifiers(ohlc_data.index.asi8, length=TIME_IDENTIFIER_LETTERS)
+        ohlc_data['identifier'] = identifiers
+        orderflow_data['identifier'] = identifiers[ohlc_data.index.get_indexer(orderflow_data.index)]
+        identifier_col = 'identifier'
+    return orderflow_data, ohlc_data, identifier_col
+
+
+def _processed_chart(frames, attrs):
+    """
+    Return the chart of processed frames keyed like PROCESSED_KEYS, with the SAVED_ATTRS settings
+    they were processed with.
+    """
+    kwargs = {k: attrs[k] for k in SAVED_ATTRS if k != 'granularity' and k in attrs}
+    chart = OrderFlowChart(None, None, processed=frames, **kwargs)
+    chart.granularity = attrs['granularity']
+    return chart
+
+
+def _rebase_cum_delta(chart, starts):
+    """
+    Recompute the cumulative delta and its rate of change of the first cum_delta_window candles
+    from every position of starts, the first candle of a day in the chart, with the deltas of the
+    candles before it. The days are processed on their own, so their cumulative delta starts over.
+    """
+    window = chart.cum_delta_window
+    index = chart.candle_index('df')
+    n = chart.ohlc_data.shape[0]
+    rebased = []
+    for start in starts:
+        first, last = max(start - window, 0), min(start + window, n)
+        stats = chart.candle_stats(index.take(chart.df, first, last), chart.ohlc_data.iloc[first:last])
+        labels = chart.param_labels(stats.iloc[start - first:], stats['delta'].to_numpy()[:start - first])
+        rebased.append(labels[labels['type'].isin(['cum_delta', 'roc'])])
+    rebased = pd.concat(rebased)
+    keys = pd.MultiIndex.from_arrays([rebased.index, rebased['type']])
+    positions = keys.get_indexer(pd.MultiIndex.from_arrays([chart.labels.index, chart.labels['type']]))
+    rows = positions >= 0
+    labels = chart.labels.copy()
+    for column in ['value', 'text']:
+        values = labels[column].to_numpy().copy()
+        values[rows] = rebased[column].to_numpy()[positions[rows]]
+        labels[column] = values
+    chart.labels = labels
+
+
+class SessionStore():
+    """
+    SessionStore class keeping the footprints of many symbols and bar types on disk.
+    Every symbol and bar type, e.g. 'ES' and 'range' or 'NQ' and '1min', is a series stored in
+    directory/symbol/bar_type, with one save_frames file per day named after it, holding the raw
+    orderflow and ohlc rows of the candles of that day sorted by time, the offsets of the rows
+    of every candle and, unless written with process=False, the frames processed for that day.
+    Candles coming after the stored candles of their day are processed on their own and appended.
+    A query for a time range only opens the files of its days, memory mapped, and locates
+    its candles by binary search on their times, so the rest of the history is never read.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def series_path(self, symbol, bar_type):
+        """
+        This method will return the directory of the series of symbol and bar_type.
+        """
+        return os.path.join(self.directory, _check_name(symbol), _check_name(bar_type))
+
+    def series(self):
+        """
+        This method will return the (symbol, bar_type) of every stored series.
+        """
+        series = []
+        for symbol in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, symbol)
+            if os.path.isdir(path):
+                series.extend((symbol, bar_type) for bar_type in sorted(os.listdir(path))
+                              if os.path.exists(os.path.join(path, bar_type, SERIES_FILE)))
+        return series
+
+    def series_meta(self, symbol, bar_type):
+        """
+        This method will return the settings shared by the partitions of a series: the column
+        mapping the orderflow rows to their candle and the timezone of the candle times.
+        """
+        path = os.path.join(self.series_path(symbol, bar_type), SERIES_FILE)
+        if not os.path.exists(path):
+            raise ValueError("No series of {} {} in {}".format(symbol, bar_type, self.directory))
+        with open(path) as f:
+            return json.load(f)
+
+    def days(self, symbol, bar_type):
+        """
+        This method will return the days of the partitions of a series, in order, as strings.
+        """
+        path = self.series_path(symbol, bar_type)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name[:-len(PARTITION_SUFFIX)] for name in os.listdir(path)
+                      if name.endswith(PARTITION_SUFFIX) and not name.startswith('.'))
+
+    def write(self, symbol, bar_type, orderflow_data, ohlc_data, identifier_col=None, process=True, **kwargs):
+        """
+        This method will add the candles of orderflow_data and ohlc_data, in the layout of the
+        OrderFlowChart inputs, to the series of symbol and bar_type. The candles are split by day
+        and merged into the partitions of their day, replacing the stored candles with the same
+        identifier, or time when identifier_col is None. The candles are processed with the
+        remaining keyword arguments of the constructor, unless process is False. When they come
+        after the stored candles of their day, see continues, only they are processed and appended
+        to the processed frames of the day, with the results of processing the day as a whole.
+        Otherwise the partition is processed again as a whole. The candles of a series keep the
+        identifier_col and timezone of the first write.
+        """
+        path = self.series_path(symbol, bar_type)
+        meta = {'identifier_col': identifier_col,
+                'tz': None if ohlc_data.index.tz is None else str(ohlc_data.index.tz)}
+        if os.path.exists(os.path.join(path, SERIES_FILE)):
+            stored = self.series_meta(symbol, bar_type)
+            if stored != meta:
+                raise ValueError("The series of {} {} is stored with {}, got {}".format(
+                    symbol, bar_type, stored, meta))
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, SERIES_FILE), 'w') as f:
+                json.dump(meta, f)
+
+        orderflow_data, ohlc_data, offsets = group_candles(orderflow_data, ohlc_data, identifier_col)
+        days = ohlc_data.index.normalize()
+        cuts = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True])
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            day = days[start].strftime(DAY_FORMAT)
+            of, ohlc = orderflow_data.iloc[offsets[start]:offsets[end]], ohlc_data.iloc[start:end]
+            partition = os.path.join(path, day + PARTITION_SUFFIX)
+            rows = offsets[start:end + 1] - offsets[start]
+            chart = None
+            if os.path.exists(partition):
+                frames, attrs = load_frames(partition, mmap=False)
+                if process and self.continues(frames, attrs, of, ohlc, identifier_col, kwargs):
+                    chart = _processed_chart({key: frames[key] for key in PROCESSED_KEYS}, attrs['processed'])
+                    chart.append(*_chart_rows(of, ohlc, identifier_col, kwargs)[:2])
+                    stored = frames['candle_rows']['rows'].to_numpy()
+                    rows = np.r_[stored[:-1], rows + stored[-1]]
+                    of = pd.concat([frames['raw_orderflow'], of])
+                    ohlc = pd.concat([frames['raw_ohlc'], ohlc])
+                else:
+                    of, ohlc = self.merge_partition(frames, of, ohlc, identifier_col)
+                    of, ohlc, rows = group_candles(of, ohlc, identifier_col)
+            if process and chart is None:
+                orderflow_rows, ohlc_rows, key = _chart_rows(of, ohlc, identifier_col, kwargs)
+                chart = OrderFlowChart(orderflow_rows, ohlc_rows, identifier_col=key, **kwargs)
+                chart.process_data()
+            self.write_partition(partition, of, ohlc, rows, chart)
+
+    def continues(self, frames, attrs, orderflow_data, ohlc_data, identifier_col, kwargs):
+        """
+        This method will return whether new candles can be processed on their own and appended
+        to the frames of a partition: the partition was processed with the settings of kwargs and
+        the tick size of the day with the new prices, and the new candles come after its candles
+        without replacing any of them.
+        """
+        settings, stored = attrs['processed'], frames['raw_ohlc']
+        if settings is None or stored.shape[0] == 0 or ohlc_data.index[0] < stored.index[-1]:
+            return False
+        if identifier_col is None:
+            if ohlc_data.index[0] == stored.index[-1]:
+                return False
+        elif stored[identifier_col].isin(ohlc_data[identifier_col]).any():
+            return False
+        prices = np.r_[frames['raw_orderflow']['price'].to_numpy(), orderflow_data['price'].to_numpy()]
+        if infer_granularity(prices) != settings['granularity']:
+            return False
+        chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col=identifier_col, **kwargs)
+        expected = json.loads(json.dumps(chart.saved_attrs(SAVED_ATTRS)))
+        return all(expected[k] == settings.get(k) for k in SAVED_ATTRS if k not in ['granularity', 'identifier_col'])
+
+    def merge_partition(self, frames, orderflow_data, ohlc_data, identifier_col):
+        """
+        This method will return the raw rows of the frames of a partition followed by the new rows,
+        dropping the stored candles which the new rows replace.
+        """
+        of, ohlc = frames['raw_orderflow'], frames['raw_ohlc']
+        if identifier_col is None:
+            keep, rows = ~ohlc.index.isin(ohlc_data.index), ~of.index.isin(ohlc_data.index)
+        else:
+            keep = ~ohlc[identifier_col].isin(ohlc_data[identifier_col]).to_numpy()
+            rows = ~of[identifier_col].isin(ohlc_data[identifier_col]).to_numpy()
+        return pd.concat([of[rows], orderflow_data]), pd.concat([ohlc[keep], ohlc_data])
+
+    def write_partition(self, partition, orderflow_data, ohlc_data, rows, chart=None):
+        """
+        This method will write the raw rows of one day to partition, with the processed frames
+        of chart, the processed chart of that day, unless it is None. The file is written under
+        a temporary name and renamed, so that concurrent queries never see a partial file.
+        """
+        frames = {'raw_orderflow': orderflow_data, 'raw_ohlc': ohlc_data,
+                  'candle_rows': pd.DataFrame({'rows': rows})}
+        attrs = {'processed': None}
+        if chart is not None:
+            chart.flush()
+            processed, attrs['processed'] = chart.processed_frames()
+            frames.update(processed)
+        temp = os.path.join(os.path.dirname(partition), '.{}.tmp'.format(uuid.uuid4().hex))
+        try:
+            save_frames(temp, frames, attrs)
+            os.replace(temp, partition)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def partitions(self, symbol, bar_type, start=None, end=None):
+        """
+        This method will yield the frames, attrs and the positions of the first and past the last
+        candle between start and end, both included, of every partition holding such candles.
+        """
+        tz = self.series_meta(symbol, bar_type)['tz']
+        start, end = _bound(start, tz), _bound(end, tz)
+        path = self.series_path(symbol, bar_type)
+        for day in self.days(symbol, bar_type):
+            if (start is not None and day < start.strftime(DAY_FORMAT)) or \
+                    (end is not None and day > end.strftime(DAY_FORMAT)):
+                continue
+            frames, attrs = load_frames(os.path.join(path, day + PARTITION_SUFFIX))
+            times = frames['raw_ohlc'].index
+            first = 0 if start is None else times.searchsorted(start, side='left')
+            last = len(times) if end is None else times.searchsorted(end, side='right')
+            if last > first:
+                yield frames, attrs, first, last
+
+    def read(self, symbol, bar_type, start=None, end=None):
+        """
+        This method will return the raw (orderflow_data, ohlc_data) of the candles of a series
+        between start and end, both included, None reading from the first or to the last candle.
+        Naive times are taken in the timezone of the series.
+        """
+        orderflow, ohlc = [], []
+        for frames, _, first, last in self.partitions(symbol, bar_type, start, end):
+            rows = frames['candle_rows']['rows'].to_numpy()
+            orderflow.append(frames['raw_orderflow'].iloc[rows[first]:rows[last]])
+            ohlc.append(frames['raw_ohlc'].iloc[first:last])
+        if not ohlc:
+            raise ValueError("No candles of {} {} between {} and {}".format(symbol, bar_type, start, end))
+        return pd.concat(orderflow), pd.concat(ohlc)
+
+    def chart(self, symbol, bar_type, start=None, end=None, **kwargs):
+        """
+        This method will return a processed OrderFlowChart of the candles of a series between
+        start and end, as selected by read. Without keyword arguments the chart is cut from the
+        processed frames of the partitions, so the imbalance and labels of its first candles
+        carry over from the earlier candles of their day. The cumulative delta of the first
+        candles of the following days runs on from the day before, while their imbalance and
+        session indicators start with the day. With keyword arguments, or when the
+        partitions were written with process=False, the raw rows are processed with them instead.
+        """
+        partitions = list(self.partitions(symbol, bar_type, start, end))
+        if not partitions:
+            raise ValueError("No candles of {} {} between {} and {}".format(symbol, bar_type, start, end))
+        settings = [attrs['processed'] for _, attrs, _, _ in partitions]
+        if kwargs or None in settings:
+            orderflow_data, ohlc_data = self.read(symbol, bar_type, start, end)
+            identifier_col = self.series_meta(symbol, bar_type)['identifier_col']
+            chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col=identifier_col, **kwargs)
+            chart.process_data()
+            return chart
+        if any(i != settings[0] for i in settings[1:]):
+            raise ValueError("The partitions of {} {} were processed with different settings, "
+                             "pass the settings to process them again".format(symbol, bar_type))
+
+        frames = {key: [] for key in PROCESSED_KEYS}
+        candles, starts = 0, []
+        for partition, attrs, first, last in partitions:
+            for key, frame in self.cut_processed(partition, first, last).items():
+                if attrs['processed']['integer_codes']:
+                    # the codes of every partition start at 0, they are made contiguous over the chart
+                    frame = _shift_codes(frame, candles - first)
+                frames[key].append(frame)
+            starts.append(candles)
+            candles += last - first
+        chart = _processed_chart({key: pd.concat(frames[key]) for key in frames}, settings[0])
+        if len(starts) > 1:
+            _rebase_cum_delta(chart, starts[1:])
+        return chart
+
+    def cut_processed(self, frames, first, last):
+        """
+        This method will return the processed frames of the candles first to last of a partition,
+        keyed like PROCESSED_KEYS. The footprint rows are sliced with the candle offsets,
+        the candle segments and labels are selected by identifier.
+        """
+        rows = frames['candle_rows']['rows'].to_numpy()
+        ohlc = frames['ohlc'].iloc[first:last]
+        identifiers = ohlc['identifier'].to_numpy()
+        cut = {'ohlc': ohlc}
+        for key in PROCESSED_KEYS:
+            if key in ['orderflow', 'orderflow2']:
+                cut[key] = frames[key].iloc[rows[first]:rows[last]]
+            elif key != 'ohlc':
+                cut[key] = frames[key][frames[key].index.isin(identifiers)]
+        return cut
+
+    def import_csv(self, symbol, bar_type, orderflow_path, ohlc_path, layout='range', chunksize=CHUNK_ROWS,
+                   **kwargs):
+        """
+        This method will write a pair of orderflow and ohlc CSV files in one of the CSV_LAYOUTS
+        to the series of symbol and bar_type, batch by batch of whole candles as read by
+        read_candles. The remaining keyword arguments are passed on to write, which processes
+        every batch on its own and appends it to the partitions of its days.
+        """
+        identifier_col = CSV_LAYOUTS[layout]['identifier_col'] if layout in CSV_LAYOUTS else None
+        for orderflow_rows, ohlc_rows in read_candles(orderflow_path, ohlc_path, layout, chunksize):
+            self.write(symbol, bar_type, orderflow_rows, ohlc_rows, identifier_col=identifier_col, **kwargs)
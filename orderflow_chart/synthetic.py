@@ -0,0 +1,95 @@
+import pandas as pd
+import numpy as np
+
+from .identifiers import IDENTIFIER_LETTERS, _letter_identifiers
+from .loader import _layout
+
+SYNTHETIC_START = '2023-06-14 13:30:00'
+SYNTHETIC_PRICE = 15000.0
+
+
+def _identifiers(rng, n, length=5):
+    """
+    Return n distinct random identifiers of length letters.
+    """
+    numbers = rng.choice(len(IDENTIFIER_LETTERS) ** length, size=n, replace=False)
+    return _letter_identifiers(numbers, length=length)
+
+
+def synthetic_candles(candles, levels=20, layout='range', seed=0, granularity=0.25, price=SYNTHETIC_PRICE,
+                      start=SYNTHETIC_START, freq='1min'):
+    """
+    Return seeded random (orderflow_data, ohlc_data) frames of candles candles, each with levels
+    price levels, in one of the CSV_LAYOUTS, as read from the CSV files of data/:
+    - 'range': range bars at irregular times, keyed by distinct 5 letter identifiers
+    - 'time': freq bars at UTC timestamps, keyed by their time, the ohlc data with a volume column
+    The orderflow rows of every candle are contiguous, from the highest price down, and
+    every candle opens at the close of the previous one, starting at price.
+    """
+    spec = _layout(layout)
+    rng = np.random.default_rng(seed)
+    open_level = rng.integers(0, levels, size=candles)
+    close_level = rng.integers(0, levels, size=candles)
+    opens = round(price / granularity) + np.r_[0, np.cumsum(close_level - open_level)[:-1]]
+    lows = opens - open_level
+
+    # the volume is heavier in the middle of the candle
+    level = np.tile(np.arange(levels), candles)
+    weight = 1 + np.minimum(level, levels - 1 - level)
+    ticks = np.repeat(lows + levels - 1, levels) - level
+    orderflow_data = pd.DataFrame({
+        'bid_size': rng.poisson(5 * weight).astype(np.float64),
+        'price': ticks * granularity,
+        'ask_size': rng.poisson(5 * weight).astype(np.float64),
+    })
+    ohlc_data = pd.DataFrame({
+        'open': opens * granularity,
+        'high': (lows + levels - 1) * granularity,
+        'low': lows * granularity,
+        'close': (lows + close_level) * granularity,
+    })
+
+    if spec['identifier_col'] is None:
+        times = pd.date_range(start, periods=candles, freq=freq, tz='UTC', name=spec['index_name'])
+        volume = orderflow_data['bid_size'] + orderflow_data['ask_size']
+        ohlc_data['volume'] = volume.to_numpy().reshape(candles, levels).sum(axis=1).astype(np.int64)
+    else:
+        # range bars close after a random number of seconds
+        seconds = np.cumsum(rng.exponential(30, size=candles)).astype(np.int64)
+        times = pd.DatetimeIndex(pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s'), name=spec['index_name'])
+        identifiers = _identifiers(rng, candles)
+        orderflow_data['identifier'] = np.repeat(identifiers, levels)
+        ohlc_data['identifier'] = identifiers
+    orderflow_data.index = times.repeat(levels)
+    ohlc_data.index = times
+    return orderflow_data, ohlc_data
+
+
+def write_csv(orderflow_data, ohlc_data, orderflow_path, ohlc_path, layout='range'):
+    """
+    Write the orderflow and ohlc data to CSV files in one of the CSV_LAYOUTS, which
+    OrderFlowChart.from_csv and read_candles read back.
+    """
+    spec = _layout(layout)
+    header = spec['header'] is not None
+    for frame, path, columns in [(orderflow_data, orderflow_path, spec['orderflow']),
+                                 (ohlc_data, ohlc_path, spec['ohlc'])]:
+        frame[columns[1:]].to_csv(path, header=header, index_label=columns[0] if header else None,
+                                  date_format=None if header else '%Y-%m-%d %H:%M:%S')
+
+
+def synthetic_trades(rows, seed=0, granularity=0.25, start=SYNTHETIC_START, session='6h30min'):
+    """
+    Return a seeded random walk of rows trades spread over one session, with the price, size
+    and side (True for a buy) columns aggregate_trades expects.
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.choice([-1, 0, 0, 0, 1], size=rows)
+    ticks = 60000 + np.cumsum(steps)
+    offsets = np.sort(rng.integers(0, pd.Timedelta(session).value, size=rows))
+    index = pd.Timestamp(start) + pd.to_timedelta(offsets)
+    return pd.DataFrame({
+        'price': ticks * granularity,
+        'size': rng.integers(1, 10, size=rows).astype(np.float64),
+        'side': rng.integers(0, 2, size=rows).astype(bool),
+    }, index=index)
@@ -0,0 +1,68 @@
+"""
+Render many order flow charts in parallel.
+
+The jobs are read from a JSON file holding a list of jobs, or a JSON lines file with one job
+per line, see orderflow_chart.batch.check_jobs, for example:
+    {"name": "es-range", "orderflow": "data/range_candles.csv", "ohlc": "data/range_ohlc.csv",
+     "layout": "range", "plot": {"window": 50}}
+    {"processed": "charts/nq.npz", "plot": {"pixels": [1600, 800]}, "formats": ["html", "png"]}
+
+Run from the repository root, for example:
+    python scripts/batch.py jobs.jsonl --out-dir charts --formats html json --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from orderflow_chart.batch import BATCH_FORMATS, check_jobs, render_batch
+
+
+def read_jobs(path):
+    """
+    Return the jobs of a JSON or JSON lines file.
+    """
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('jobs', help='JSON or JSON lines file of jobs')
+    parser.add_argument('--out-dir', default='charts')
+    parser.add_argument('--formats', nargs='+', default=['html'], choices=BATCH_FORMATS)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cpus by default')
+    parser.add_argument('--embed-plotlyjs', action='store_true',
+                        help='embed plotly.js in every HTML file instead of loading it from the CDN')
+    parser.add_argument('--verbose', action='store_true', help='show the output printed by every job')
+    args = parser.parse_args()
+
+    jobs = read_jobs(args.jobs)
+    try:
+        jobs = check_jobs(jobs, args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    failed = 0
+    for result in render_batch(jobs, args.out_dir, formats=args.formats, workers=args.workers,
+                               include_plotlyjs=True if args.embed_plotlyjs else 'cdn'):
+        if result['error'] is not None:
+            failed += 1
+            print("{name}: failed after {seconds:.3f}s: {error}".format(**result), file=sys.stderr)
+        else:
+            print("{name}: {seconds:.3f}s (load {load:.3f}s, plot {plot:.3f}s, write {write:.3f}s) "
+                  "pid {pid} -> {files}".format(files=', '.join(os.path.basename(p) for p in result['outputs']),
+                                                **result))
+        if args.verbose and result['log']:
+            print(result['log'].rstrip())
+    elapsed = time.perf_counter() - start
+    print("{} jobs, {} failed, in {:.3f}s: {:.2f} jobs/s".format(len(jobs), failed, elapsed, len(jobs) / elapsed))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
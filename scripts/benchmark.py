@@ -0,0 +1,1014 @@
+"""
+Benchmarks for the orderflow_chart processing stages.
+
+Run from the repository root, for example:
+    python scripts/benchmark.py aggregate --rows 20000000 --bar time --bar-size 1min
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from orderflow_chart import OrderFlowChart, ProcessedCache, StageProfiler
+from orderflow_chart import data_wrangling
+from orderflow_chart.batch import render_batch
+from orderflow_chart.imbalance import DiagonalImbalance
+from orderflow_chart.data_wrangling import SessionIndicators, aggregate_trades
+from orderflow_chart.loader import CSV_LAYOUTS, read_candles
+from orderflow_chart.plot import base_layout, shared_figure
+from orderflow_chart.server import ChartServer, read_frame
+from orderflow_chart.store import SessionStore
+from orderflow_chart.synthetic import synthetic_candles, synthetic_trades, write_csv
+
+# the implementations replaced by the vectorised paths, shared with the tests as their references
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tests'))
+from legacy import legacy_calc_params, legacy_candle_segments, legacy_footprint_text, legacy_profile_text  # noqa: E402
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """
+    Return the best wall time of repeat calls and the result of the last call.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def range_fixture(scale=1):
+    """
+    Read the range bar fixture from data/, repeated scale times with distinct identifiers.
+    """
+    orderflow_data = pd.read_csv('data/range_candles.csv', names=['bid_size', 'price', 'ask_size', 'identifier'],
+                                 index_col=0, parse_dates=True)
+    ohlc_data = pd.read_csv('data/range_ohlc.csv', names=['open', 'high', 'low', 'close', 'identifier'],
+                            index_col=0, parse_dates=True)
+    if scale > 1:
+        orderflow_data = pd.concat([orderflow_data.assign(identifier=orderflow_data['identifier'] + str(i))
+                                    for i in range(scale)])
+        ohlc_data = pd.concat([ohlc_data.assign(identifier=ohlc_data['identifier'] + str(i))
+                               for i in range(scale)])
+    return orderflow_data, ohlc_data
+
+
+def peak_memory(func, *args, **kwargs):
+    """
+    Return the peak number of bytes allocated by python while running func.
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def synthetic_footprint(candles, trades_per_candle=50, seed=0):
+    """
+    Aggregate synthetic trades into tick bars, returning (orderflow_data, ohlc_data).
+    """
+    trades = synthetic_trades(candles * trades_per_candle, seed=seed)
+    return aggregate_trades(trades, bar='tick', bar_size=trades_per_candle, granularity=0.25)
+
+
+def bench_aggregate(args):
+    trades = synthetic_trades(args.rows, seed=args.seed)
+    bar_size = args.bar_size
+    if args.bar != 'time':
+        bar_size = float(bar_size)
+    elapsed, (orderflow_data, ohlc_data) = timed(aggregate_trades, trades, bar=args.bar,
+                                                 bar_size=bar_size, granularity=0.25,
+                                                 repeat=args.repeat)
+    print("trades: {:,}  candles: {:,}  cells: {:,}".format(
+        args.rows, ohlc_data.shape[0], orderflow_data.shape[0]))
+    print("aggregate_trades[{}]: {:.3f}s  {:,.0f} rows/s".format(
+        args.bar, elapsed, args.rows / elapsed))
+
+
+def bench_append(args):
+    trades = synthetic_trades(args.candles * 200, seed=args.seed, session='{}min'.format(args.candles))
+    orderflow_data, ohlc_data = aggregate_trades(trades, bar='time', bar_size='1min', granularity=0.25)
+    ids = ohlc_data['identifier']
+    for history in args.history:
+        head = orderflow_data['identifier'] <= ids.iloc[history - 1]
+        chart = OrderFlowChart(orderflow_data[head].copy(), ohlc_data.iloc[:history].copy(),
+                               identifier_col='identifier', integer_codes=args.integer_codes)
+        chart.process_data()
+        latencies = []
+        for i in range(history, history + args.updates):
+            rows = orderflow_data[orderflow_data['identifier'] == ids.iloc[i]]
+            start = time.perf_counter()
+            chart.append(rows, ohlc_data.iloc[i:i + 1])
+            chart.update_last_candle(rows, ohlc_data.iloc[i:i + 1])
+            latencies.append(time.perf_counter() - start)
+        print("history: {:>7,} candles  append+update: {:.2f}ms median".format(
+            history, np.median(latencies) * 1000))
+
+
+def bench_text(args):
+    orderflow_data, ohlc_data = range_fixture(args.scale)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    df = orderflow_data.assign(sum=orderflow_data['bid_size'] + orderflow_data['ask_size'])
+    df['sum'] = df['sum'] / df.groupby('identifier')['sum'].transform('max')
+    print("footprint cells: {:,}".format(df.shape[0]))
+    stages = [
+        ('time', lambda: df.index.astype(str), lambda: chart.time_text(df.index)),
+        ('footprint text', lambda: legacy_footprint_text(df), lambda: chart.footprint_text(df)),
+        ('profile text', lambda: legacy_profile_text(df), lambda: chart.profile_text(df)),
+    ]
+    for name, before, after in stages:
+        before_time, _ = timed(before)
+        after_time, _ = timed(after)
+        print("{:<16} before: {:.3f}s  after: {:.3f}s  {:.1f}x".format(
+            name, before_time, after_time, before_time / after_time))
+
+
+def bench_params(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    chart.process_data()
+    print("candles: {:,}  cells: {:,}".format(ohlc_data.shape[0], chart.df.shape[0]))
+    before_time, _ = timed(legacy_calc_params, chart.df, chart.ohlc_data)
+    after_time, _ = timed(chart.calc_params, chart.df, chart.ohlc_data)
+    before_peak = peak_memory(legacy_calc_params, chart.df, chart.ohlc_data)
+    after_peak = peak_memory(chart.calc_params, chart.df, chart.ohlc_data)
+    print("calc_params before: {:.3f}s {:,.0f} KiB peak  after: {:.3f}s {:,.0f} KiB peak".format(
+        before_time, before_peak / 1024, after_time, after_peak / 1024))
+    chart.stats = ['poc', 'max_delta', 'min_delta', 'buy_imbalance', 'sell_imbalance', 'vwap']
+    stats_time, _ = timed(chart.calc_params, chart.df, chart.ohlc_data)
+    print("calc_params with all stats: {:.3f}s".format(stats_time))
+
+
+def bench_codes(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    print("candles: {:,}  cells: {:,}".format(ohlc_data.shape[0], orderflow_data.shape[0]))
+    for integer_codes in [False, True]:
+        chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                               integer_codes=integer_codes)
+        elapsed, _ = timed(chart.process_data)
+        size = sum(getattr(chart, key).memory_usage(deep=True).sum()
+                   for key in ['df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels'])
+        print("integer_codes={!s:<5}  process_data: {:.3f}s  processed frames: {:,.1f} MiB".format(
+            integer_codes, elapsed, size / 2 ** 20))
+
+
+def bench_storage(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    chart.process_data()
+    print("candles: {:,}  cells: {:,}".format(ohlc_data.shape[0], chart.df.shape[0]))
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'processed.json')
+        npz_path = os.path.join(tmp, 'processed.npz')
+
+        def save_json():
+            with open(json_path, 'w') as f:
+                json.dump(chart.get_processed_data(), f)
+
+        def load_json():
+            with open(json_path) as f:
+                return OrderFlowChart.from_preprocessed_data(json.load(f))
+
+        rows = [
+            ('json', save_json, load_json, json_path),
+            ('npz', lambda: chart.save_processed(npz_path),
+             lambda: OrderFlowChart.load_processed(npz_path, mmap=False), npz_path),
+            ('npz mmap', lambda: chart.save_processed(npz_path),
+             lambda: OrderFlowChart.load_processed(npz_path), npz_path),
+        ]
+        for name, save, load, path in rows:
+            save_time, _ = timed(save)
+            load_time, _ = timed(load, repeat=3)
+            print("{:<9} size: {:>8,.1f} MiB  save: {:.3f}s  load: {:.3f}s".format(
+                name, os.path.getsize(path) / 2 ** 20, save_time, load_time))
+
+
+def bench_window(args):
+    orderflow_data, ohlc_data = synthetic_footprint(max(args.history), seed=args.seed)
+    ids = ohlc_data['identifier']
+    for history in args.history:
+        head = orderflow_data['identifier'] <= ids.iloc[history - 1]
+        chart = OrderFlowChart(orderflow_data[head].copy(), ohlc_data.iloc[:history].copy(),
+                               identifier_col='identifier', integer_codes=True, lazy_text=True)
+        chart.process_data()
+        cases = [('window={}'.format(args.window), {'window': args.window})]
+        if history <= args.full_max:
+            cases.insert(0, ('full', {}))
+        for name, kwargs in cases:
+            elapsed, fig = timed(chart.plot, return_figure=True, **kwargs)
+            print("history: {:>7,} candles  {:<11} build: {:.3f}s  json: {:>10,.0f} KiB".format(
+                history, name, elapsed, len(fig.to_json()) / 1024))
+
+
+def mask_window(chart, start, end, price_range=None):
+    """
+    The rows of the footprint frames of a window selected with masks over every row,
+    as window_frames did before the candle indexes.
+    """
+    identifiers = chart.ohlc_data['identifier'].iloc[start:end]
+    frames = {}
+    for key in ['df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels']:
+        frame = getattr(chart, key)
+        if chart.integer_codes:
+            frame = frame[(frame.index >= identifiers.iloc[0]) & (frame.index <= identifiers.iloc[-1])]
+        else:
+            frame = frame[frame.index.isin(identifiers)]
+        if price_range is not None and key in ['df', 'df2']:
+            frame = frame[(frame['price'] >= min(price_range)) & (frame['price'] <= max(price_range))]
+        frames[key] = frame
+    return frames
+
+
+def index_window(chart, start, end, price_range=None):
+    """
+    The rows of the footprint frames of a window located through the candle indexes,
+    which skip the candles outside the price band.
+    """
+    frames = {}
+    for key in ['df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels']:
+        band = {}
+        if price_range is not None and key in ['df', 'df2']:
+            band = {'low': np.floor(min(price_range) / chart.granularity),
+                    'high': np.ceil(max(price_range) / chart.granularity)}
+        frame = chart.candle_index(key).take(getattr(chart, key), start, end, **band)
+        if band:
+            frame = frame[(frame['price'] >= min(price_range)) & (frame['price'] <= max(price_range))]
+        frames[key] = frame
+    return frames
+
+
+def bench_index(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    print("{:,} candles, {:,} footprint rows".format(ohlc_data.shape[0], orderflow_data.shape[0]))
+    rng = np.random.default_rng(args.seed)
+    n = ohlc_data.shape[0]
+    for name, kwargs in [('identifiers', {}), ('integer_codes', {'integer_codes': True})]:
+        chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                               lazy_text=True, **kwargs)
+        chart.process_data()
+        start = time.perf_counter()
+        for key in ['df', 'df2', 'green_hl', 'red_hl', 'green_oc', 'red_oc', 'labels']:
+            chart.candle_index(key)
+        print("{}: index build: {:.3f}s".format(name, time.perf_counter() - start))
+
+        for window in args.windows:
+            starts = rng.integers(0, n - window + 1, args.queries)
+            mid = ohlc_data['close'].to_numpy()[starts]
+            for band in [None, 4]:
+                ranges = [None] * args.queries if band is None else list(zip(mid - band, mid + band))
+                line = "  window: {:>5}  {:<10}".format(window, 'all prices' if band is None else '+-{} band'.format(band))
+                for label, func in [('masks', mask_window), ('index', index_window)]:
+                    begin = time.perf_counter()
+                    for i, price_range in zip(starts, ranges):
+                        func(chart, i, i + window, price_range)
+                    line += "  {}: {:>8.3f} ms/query".format(label, (time.perf_counter() - begin) / args.queries * 1e3)
+                print(line)
+
+
+def bench_lod(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', integer_codes=True, lazy_text=True)
+    chart.process_data()
+    elapsed, levels = timed(chart.build_pyramid)
+    print("pyramid: {} levels built in {:.3f}s".format(len(levels), elapsed))
+    for window in args.windows:
+        start, end = chart.window_bounds(window=window)
+        factor = chart.lod_factor(start, end, args.pixels)
+        lookup, _ = timed(chart.lod_level, factor, repeat=10)
+        elapsed, fig = timed(chart.plot, return_figure=True, window=window, pixels=args.pixels)
+        print("window: {:>7,} candles  factor: {:>5}  lookup: {:.6f}s  build: {:.3f}s  json: {:>8,.0f} KiB".format(
+            window, factor, lookup, elapsed, len(fig.to_json()) / 1024))
+
+
+# price ticks and candle frequencies switched between by the resample benchmark
+RESAMPLE_SETTINGS = [('4', '5min'), ('2', '15min'), ('8', '1h'), ('4', '5min')]
+
+
+def bench_resample(args):
+    trades = synthetic_trades(args.trades, seed=args.seed)
+    chart = OrderFlowChart.from_trades(trades, bar='time', bar_size='1min', granularity=0.25, lazy_text=True)
+    chart.process_data()
+    print("{:,} trades, {:,} candles, {:,} footprint rows".format(args.trades, chart.ohlc_data.shape[0],
+                                                                chart.df.shape[0]))
+    for price_ticks, freq in args.settings or RESAMPLE_SETTINGS:
+        def rebuild():
+            rebuilt = OrderFlowChart.from_trades(trades, bar='time', bar_size=freq,
+                                                 granularity=0.25 * int(price_ticks), lazy_text=True)
+            rebuilt.process_data()
+            return rebuilt
+
+        source, _ = timed(rebuild)
+        first, resampled = timed(chart.resample, price_ticks=int(price_ticks), freq=freq)
+        again, _ = timed(chart.resample, price_ticks=int(price_ticks), freq=freq, repeat=args.repeat)
+        print("{:>2} ticks {:>6}: {:>6,} candles  from trades: {:.3f}s  resample: {:.3f}s  memoized: {:.6f}s".format(
+            price_ticks, freq, resampled.ohlc_data.shape[0], source, first, again))
+
+
+def bench_parallel(args):
+    trades = synthetic_trades(args.trades, seed=args.seed, session='{}D'.format(args.days))
+    orderflow_data, ohlc_data = aggregate_trades(trades, bar='time', bar_size='1min', granularity=0.25)
+    print("{:,} candles, {:,} footprint rows, {} cpus".format(ohlc_data.shape[0], orderflow_data.shape[0],
+                                                            os.cpu_count()))
+    if args.parallel_rows is not None:
+        data_wrangling.PARALLEL_ROWS = args.parallel_rows
+    baseline = None
+    for workers in args.workers:
+        chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                               integer_codes=args.integer_codes, profiler=StageProfiler())
+        elapsed, _ = timed(chart.process_data, workers=workers)
+        pool = any(record['stage'] == 'process_partitions' for record in chart.profiler.records)
+        if baseline is None:
+            baseline = elapsed
+        print("workers: {:>2}  process_data: {:.3f}s  speedup: {:.2f}x  {}".format(
+            workers, elapsed, baseline / elapsed, 'pool' if pool else 'serial'))
+
+
+def bench_imbalance(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    codes, _ = pd.factorize(orderflow_data['identifier'])
+    ticks = np.rint(orderflow_data['price'].to_numpy() / 0.25)
+    bid, ask = orderflow_data['bid_size'].to_numpy(), orderflow_data['ask_size'].to_numpy()
+    cells = orderflow_data.shape[0]
+    print("{:,} candles, {:,} footprint cells".format(ohlc_data.shape[0], cells))
+    engine = DiagonalImbalance(ratio=args.ratio, stacked=args.stacked)
+
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    frame = orderflow_data.set_index('identifier', drop=False)
+    elapsed, _ = timed(chart.imbalance, frame, repeat=args.repeat)
+    print("shift formula:   {:.3f}s  {:>12,.0f} cells/s".format(elapsed, cells / elapsed))
+    elapsed, columns = timed(engine, codes, ticks, bid, ask, repeat=args.repeat)
+    print("diagonal engine: {:.3f}s  {:>12,.0f} cells/s".format(elapsed, cells / elapsed))
+    print("buy imbalances: {:,}  sell imbalances: {:,}  stacked cells: {:,}  unfinished auctions: {:,}".format(
+        columns['buy_imbalance'].sum(), columns['sell_imbalance'].sum(),
+        columns['stacked_buy'].sum() + columns['stacked_sell'].sum(), np.count_nonzero(columns['unfinished'])))
+
+
+def bench_indicators(args):
+    orderflow_data, ohlc_data = synthetic_candles(args.cells // args.levels, levels=args.levels, layout='range',
+                                                  seed=args.seed)
+    cells = orderflow_data.shape[0]
+    print("{:,} candles, {:,} footprint cells".format(ohlc_data.shape[0], cells))
+    indicators = SessionIndicators(session=args.session)
+    chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier', indicators=indicators)
+    chart.granularity = 0.25
+    elapsed, columns = timed(chart.session_indicators, orderflow_data, ohlc_data, repeat=args.repeat)
+    print("session indicators: {:.3f}s  {:>12,.0f} cells/s  {} sessions".format(
+        elapsed, cells / elapsed, len(set(indicators.session_keys(ohlc_data.index)))))
+
+    # one candle at a time, as new candles and updates of the last one come in
+    for kwargs in [{}, {'indicators': indicators}]:
+        history = ohlc_data.shape[0] - args.updates
+        rows = history * args.levels
+        chart = OrderFlowChart(orderflow_data.iloc[:rows].copy(), ohlc_data.iloc[:history].copy(),
+                               identifier_col='identifier', lazy_text=True, **kwargs)
+        chart.process_data()
+        latencies = []
+        for i in range(history, ohlc_data.shape[0]):
+            candle = orderflow_data.iloc[i * args.levels:(i + 1) * args.levels]
+            start = time.perf_counter()
+            chart.append(candle, ohlc_data.iloc[i:i + 1])
+            chart.update_last_candle(candle, ohlc_data.iloc[i:i + 1])
+            latencies.append(time.perf_counter() - start)
+        print("append+update {:<18} {:.2f}ms median".format(
+            'with indicators:' if kwargs else 'without indicators:', np.median(latencies) * 1000))
+
+
+def bench_memory(args):
+    trades = synthetic_trades(args.trades, seed=args.seed, session='{}D'.format(args.days))
+    orderflow_data, ohlc_data = aggregate_trades(trades, bar='time', bar_size='1min', granularity=0.25)
+    del trades
+    print("{:,} candles, {:,} footprint rows".format(ohlc_data.shape[0], orderflow_data.shape[0]))
+    modes = [('default', {}), ('integer_codes', {'integer_codes': True}), ('compact', {'compact': True})]
+    baseline = None
+    for name, kwargs in modes:
+        chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier', **kwargs)
+        peak = peak_memory(chart.process_data)
+        report = chart.memory_report()
+        total = report.loc['total', 'bytes']
+        if baseline is None:
+            baseline = total
+        print("{:<14} processed: {:>8,.1f} MiB ({:>4.0%})  peak while processing: {:>8,.1f} MiB".format(
+            name, total / 2 ** 20, total / baseline, peak / 2 ** 20))
+        if args.frames:
+            print((report['bytes'] / 2 ** 20).round(2).to_string())
+
+
+def bench_csv(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        orderflow_csv, ohlc_csv = os.path.join(tmp, 'candles.csv'), os.path.join(tmp, 'ohlc.csv')
+        orderflow_data.to_csv(orderflow_csv, header=False, date_format='%Y-%m-%d %H:%M:%S')
+        ohlc_data.to_csv(ohlc_csv, header=False, date_format='%Y-%m-%d %H:%M:%S')
+        size = os.path.getsize(orderflow_csv)
+        print("{:,} footprint rows, {:,.1f} MiB".format(orderflow_data.shape[0], size / 2 ** 20))
+
+        def read_full():
+            return pd.read_csv(orderflow_csv, names=['bid_size', 'price', 'ask_size', 'identifier'],
+                               index_col=0, parse_dates=True)
+
+        def read_chunked():
+            return sum(rows.shape[0] for rows, _ in read_candles(orderflow_csv, ohlc_csv, chunksize=args.chunksize))
+
+        for name, func in [('read_csv', read_full), ('chunked', read_chunked)]:
+            elapsed, _ = timed(func, repeat=args.repeat)
+            print("{:<9} parse: {:.3f}s  {:>10,.0f} rows/s  {:>6.1f} MiB/s  peak: {:>7,.1f} MiB".format(
+                name, elapsed, orderflow_data.shape[0] / elapsed, size / 2 ** 20 / elapsed,
+                peak_memory(func) / 2 ** 20))
+        if args.process:
+            elapsed, _ = timed(OrderFlowChart.from_csv, orderflow_csv, ohlc_csv, chunksize=args.chunksize,
+                               integer_codes=True, lazy_text=True)
+            print("from_csv  parse and process: {:.3f}s".format(elapsed))
+
+
+def bench_cache(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, seed=args.seed)
+    print("{:,} candles, {:,} footprint rows".format(ohlc_data.shape[0], orderflow_data.shape[0]))
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ProcessedCache(tmp)
+
+        def process(cache=None, **kwargs):
+            chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                                   lazy_text=True, cache=cache, **kwargs)
+            chart.process_data()
+            return chart
+
+        elapsed, _ = timed(process)
+        print("no cache:  {:.3f}s".format(elapsed))
+        elapsed, _ = timed(process, cache)
+        print("miss:      {:.3f}s  entry: {:,.1f} MiB".format(elapsed, cache.info()['bytes'] / 2 ** 20))
+        elapsed, _ = timed(process, cache, repeat=args.repeat)
+        print("hit:       {:.3f}s".format(elapsed))
+
+        # a different setting is a different entry, a bound of one entry evicts the older ones
+        cache.max_bytes = cache.info()['bytes']
+        process(cache, cum_delta_window=5)
+        print("counters:  {}".format(cache.info()))
+
+
+def bench_candles(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles, trades_per_candle=20, seed=args.seed)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', integer_codes=True)
+    orderflow_data, ohlc_data = chart.encode_candles(orderflow_data, ohlc_data)
+    chart.assign_sequence(orderflow_data, ohlc_data)
+    green = ohlc_data['close'] >= ohlc_data['open']
+
+    def legacy():
+        return [legacy_candle_segments(ohlc_data, ohlc_data.loc[mask, 'identifier'], type_)
+                for type_ in ['hl', 'oc'] for mask in [green, ~green]]
+
+    def vectorized():
+        return [chart.candle_segments(ohlc_data[mask], type_=type_)
+                for type_ in ['hl', 'oc'] for mask in [green, ~green]]
+
+    before, _ = timed(legacy, repeat=args.repeat)
+    after, _ = timed(vectorized, repeat=args.repeat)
+    print("{:,} candles  range_proc/candle_proc: {:.3f}s  candle_segments: {:.3f}s  speedup: {:.1f}x".format(
+        ohlc_data.shape[0], before, after, before / after))
+
+
+def bench_render(args):
+    orderflow_data, ohlc_data = synthetic_footprint(max(args.candles), seed=args.seed)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier',
+                           integer_codes=args.integer_codes, lazy_text=True)
+    chart.process_data()
+    for candles in args.candles:
+        for render in ['svg', 'webgl']:
+            fig = chart.plot(return_figure=True, window=candles, render=render)
+            elapsed, payload = timed(fig.to_json, repeat=args.repeat)
+            print("{:>7,} candles  {:<6} traces: {:>2}  to_json: {:.3f}s  json: {:>9,.0f} KiB".format(
+                candles, render, len(fig.data), elapsed, len(payload) / 1024))
+
+
+def bench_batch(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.candles * args.charts, seed=args.seed)
+    identifiers = ohlc_data['identifier'].to_numpy()
+    print("{} charts of {:,} candles, {} cpus".format(args.charts, args.candles, os.cpu_count()))
+
+    # an empty figure with the shared layout, against building the layout for every figure
+    def fresh_figure():
+        base_layout.cache_clear()
+        return shared_figure()
+
+    built, _ = timed(fresh_figure, repeat=args.repeat)
+    shared, _ = timed(shared_figure, repeat=args.repeat)
+    print("layout built per figure: {:.1f}ms  shared layout: {:.1f}ms".format(built * 1000, shared * 1000))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = []
+        for i in range(args.charts):
+            candles = identifiers[i * args.candles:(i + 1) * args.candles]
+            chart = OrderFlowChart(orderflow_data[orderflow_data['identifier'].isin(candles)].copy(),
+                                   ohlc_data[ohlc_data['identifier'].isin(candles)].copy(),
+                                   identifier_col='identifier', lazy_text=True)
+            chart.process_data()
+            path = os.path.join(tmp, 'chart{:04d}.npz'.format(i))
+            chart.save_processed(path)
+            jobs.append({'processed': path, 'plot': {'render': args.render}})
+
+        baseline = None
+        for workers in args.workers:
+            out_dir = os.path.join(tmp, 'out{}'.format(workers))
+            start = time.perf_counter()
+            results = list(render_batch(jobs, out_dir, formats=args.formats, workers=workers))
+            elapsed = time.perf_counter() - start
+            errors = [r['error'] for r in results if r['error'] is not None]
+            if errors:
+                raise RuntimeError(errors[0])
+            baseline = baseline or elapsed
+            print("workers: {:>2}  {:.3f}s  {:.1f} jobs/s  speedup: {:.2f}x  per job: load {:.1f}ms  plot {:.1f}ms  "
+                  "write {:.1f}ms".format(workers, elapsed, len(jobs) / elapsed, baseline / elapsed,
+                                          *(1000 * np.mean([r[k] for r in results]) for k in ['load', 'plot', 'write'])))
+
+
+# the stages timed by the stages suite, in processing order
+STAGES = ('calc_imbalance', 'annotate', 'candle_segments_hl', 'candle_segments_oc', 'calc_params', 'process_data',
+          'get_processed_data', 'to_json', 'from_json', 'save_processed', 'load_processed', 'figure', 'figure_json')
+
+
+def stage_runs(orderflow_data, ohlc_data, layout, tmp, **kwargs):
+    """
+    Return the (stage, setup, func) of every STAGES entry on the given candles: setup returns the
+    arguments of func, so that the copies and inputs a stage needs are not timed with it.
+    """
+    identifier_col = CSV_LAYOUTS[layout]['identifier_col']
+
+    def chart():
+        return OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col=identifier_col, **kwargs)
+
+    # the state of process_data before the imbalance, then after it
+    base = chart()
+    if base.integer_codes:
+        base.orderflow_data, base.ohlc_data = base.encode_candles(base.orderflow_data, base.ohlc_data,
+                                                                  by_identifier=identifier_col is not None)
+        base.identifier_col = 'identifier'
+    elif base.identifier_col is None:
+        base.identifier_col = 'identifier'
+        base.create_identifier()
+    base.create_sequence()
+    rows = base.orderflow_data
+    df = base.calc_imbalance(rows.copy())
+    green = (base.ohlc_data['close'] >= base.ohlc_data['open']).to_numpy()
+
+    processed = chart()
+    processed.process_data()
+    payload = json.dumps(processed.get_processed_data())
+    path = os.path.join(tmp, 'processed.npz')
+    processed.save_processed(path)
+    fig = processed.plot(return_figure=True)
+
+    def segments(type_):
+        return lambda ohlc: (base.candle_segments(ohlc[green], type_=type_),
+                             base.candle_segments(ohlc[~green], type_=type_))
+
+    return [
+        ('calc_imbalance', lambda: (rows.copy(),), base.calc_imbalance),
+        ('annotate', lambda: (df,), base.annotate),
+        ('candle_segments_hl', lambda: (base.ohlc_data,), segments('hl')),
+        ('candle_segments_oc', lambda: (base.ohlc_data,), segments('oc')),
+        ('calc_params', lambda: (df, base.ohlc_data), base.calc_params),
+        ('process_data', lambda: (chart(),), lambda c: c.process_data()),
+        ('get_processed_data', lambda: (), processed.get_processed_data),
+        ('to_json', lambda: (processed.get_processed_data(),), json.dumps),
+        ('from_json', lambda: (payload,), lambda text: OrderFlowChart.from_preprocessed_data(json.loads(text))),
+        ('save_processed', lambda: (os.path.join(tmp, 'saved.npz'),), processed.save_processed),
+        ('load_processed', lambda: (path,), lambda p: OrderFlowChart.load_processed(p, mmap=False)),
+        ('figure', lambda: (), lambda: processed.plot(return_figure=True)),
+        ('figure_json', lambda: (), fig.to_json),
+    ]
+
+
+def measure(setup, func, repeat, memory=True):
+    """
+    Return the best and mean wall time of repeat calls of func on the arguments returned by setup,
+    and the peak bytes allocated by one more call when memory is set.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'mean': sum(times) / len(times),
+            'peak_bytes': peak_memory(func, *setup()) if memory else None}
+
+
+def run_info(args):
+    """
+    Return the environment of a benchmark run, stored with its results.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': pd.Timestamp.now(tz='UTC').isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'args': {k: v for k, v in vars(args).items() if k != 'func'},
+    }
+
+
+def bench_stages(args):
+    stages = args.stages or STAGES
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['layout'], r['candles'], r['levels'], r['stage']): r for r in json.load(f)['results']}
+    kwargs = {'integer_codes': args.integer_codes, 'lazy_text': args.lazy_text, 'compact': args.compact}
+
+    results = []
+    for layout in args.layouts:
+        for candles in args.candles:
+            orderflow_data, ohlc_data = synthetic_candles(candles, args.levels, layout=layout, seed=args.seed)
+            print("{} layout: {:,} candles x {} levels, {:,} rows".format(layout, candles, args.levels,
+                                                                         orderflow_data.shape[0]))
+            with tempfile.TemporaryDirectory() as tmp:
+                runs = stage_runs(orderflow_data, ohlc_data, layout, tmp, **kwargs)
+                measured = []
+                for stage, setup, func in runs:
+                    if stage in stages:
+                        measured.append((stage, measure(setup, func, args.repeat, memory=not args.no_memory)))
+            for stage, result in measured:
+                result = dict(layout=layout, candles=candles, levels=args.levels, rows=orderflow_data.shape[0],
+                              stage=stage, **result)
+                results.append(result)
+                line = "  {:<20} {:>9.4f}s  mean {:>9.4f}s".format(stage, result['seconds'], result['mean'])
+                if result['peak_bytes'] is not None:
+                    line += "  peak {:>9,.1f} MiB".format(result['peak_bytes'] / 2 ** 20)
+                before = baseline.get((layout, candles, args.levels, stage))
+                if before is not None:
+                    line += "  {:.2f}x the baseline time".format(result['seconds'] / before['seconds'])
+                print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'info': run_info(args), 'results': results}, f, indent=1)
+        print("results written to {}".format(args.output))
+
+
+def bench_profile(args):
+    orderflow_data, ohlc_data = synthetic_candles(args.candles, args.levels, seed=args.seed)
+    print("{:,} candles, {:,} rows".format(args.candles, orderflow_data.shape[0]))
+
+    def run(profiler):
+        chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                               profiler=profiler)
+        chart.process_data()
+        chart.plot(return_figure=True, window=args.window)
+
+    # without a profiler the hooks cost one function call per stage
+    for name, profiler in [('no profiler', None), ('profiler', StageProfiler()),
+                           ('profiler, memory', StageProfiler(memory=True))]:
+        elapsed, _ = timed(run, profiler, repeat=args.repeat)
+        print("{:<17} process_data + plot: {:.3f}s".format(name, elapsed))
+    with pd.option_context('display.width', 160, 'display.max_columns', 10):
+        print(profiler.report())
+
+
+# the code run in a fresh interpreter by the startup benchmark, after which the import time,
+# the peak memory and whether plotly was loaded are printed
+STARTUP_CODE = {
+    'plotly only': 'import plotly.graph_objects, plotly.subplots',
+    'import, eager plotly': 'import plotly.graph_objects, plotly.subplots; import orderflow_chart',
+    'import': 'import orderflow_chart',
+    'import + process': 'import orderflow_chart; from orderflow_chart.synthetic import synthetic_candles; '
+                        'c = orderflow_chart.OrderFlowChart(*synthetic_candles(200), identifier_col="identifier"); '
+                        'c.process_data(); c.get_processed_data()',
+    'import + plot': 'import orderflow_chart; from orderflow_chart.synthetic import synthetic_candles; '
+                     'c = orderflow_chart.OrderFlowChart(*synthetic_candles(200), identifier_col="identifier"); '
+                     'c.plot(return_figure=True)',
+}
+# the peak resident memory of the interpreter in KiB, from /proc as getrusage reports the peak of the parent
+STARTUP_REPORT = ("; import sys, time; elapsed = time.perf_counter() - start; "
+                  "rss = [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0]; "
+                  "print(elapsed, rss, 'plotly' in sys.modules)")
+
+
+def bench_startup(args):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd(), os.environ.get('PYTHONPATH', '')]))
+    for name, code in STARTUP_CODE.items():
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, '-c', 'import time; start = time.perf_counter(); ' + code
+                                     + STARTUP_REPORT], capture_output=True, text=True, check=True, env=env).stdout
+            elapsed, rss, plotly_loaded = output.split()[-3:]
+            runs.append((float(elapsed), int(rss), plotly_loaded))
+        elapsed, rss, plotly_loaded = min(runs)
+        print("{:<21} {:.3f}s  peak rss: {:>6,.1f} MiB  plotly loaded: {}".format(name, elapsed, rss / 1024,
+                                                                                plotly_loaded))
+
+
+def directory_bytes(path):
+    """
+    Return the bytes of the files under path.
+    """
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_store(args):
+    orderflow_data, ohlc_data = synthetic_candles(args.days * 1440, levels=args.levels, layout='time',
+                                                  seed=args.seed, freq='1min')
+    print("{} days, {:,} candles, {:,} footprint rows".format(args.days, ohlc_data.shape[0], orderflow_data.shape[0]))
+    end = ohlc_data.index[-1]
+    start = end - pd.Timedelta(args.window) + pd.Timedelta('1ns')
+    with tempfile.TemporaryDirectory() as tmp:
+        orderflow_path, ohlc_path = os.path.join(tmp, 'candles.csv'), os.path.join(tmp, 'ohlc.csv')
+        write_csv(orderflow_data, ohlc_data, orderflow_path, ohlc_path, layout='time')
+        store = SessionStore(os.path.join(tmp, 'store'))
+        elapsed, _ = timed(store.write, 'ES', '1min', orderflow_data, ohlc_data, integer_codes=True)
+        print("write:            {:.3f}s  {:,.1f} MiB on disk".format(elapsed, directory_bytes(store.directory) / 2 ** 20))
+        imported = SessionStore(os.path.join(tmp, 'imported'))
+        elapsed, _ = timed(imported.import_csv, 'ES', '1min', orderflow_path, ohlc_path, layout='time',
+                           chunksize=args.chunksize, integer_codes=True)
+        print("import_csv:       {:.3f}s  in batches of {:,} rows".format(elapsed, args.chunksize))
+
+        elapsed, chart = timed(OrderFlowChart.from_csv, orderflow_path, ohlc_path, layout='time', integer_codes=True)
+        print("csv, all candles: {:.3f}s".format(elapsed))
+        for name, query in [('last ' + args.window, (start, end)), ('last day', (end.normalize(), end)),
+                            ('all candles', (None, None))]:
+            elapsed, chart = timed(store.chart, 'ES', '1min', *query, repeat=args.repeat)
+            print("store, {:<11} {:.3f}s  {:,} candles".format(name + ':', elapsed, chart.ohlc_data.shape[0]))
+        elapsed, _ = timed(store.chart, 'ES', '1min', start, end, integer_codes=True, repeat=args.repeat)
+        print("store, last {} reprocessed: {:.3f}s".format(args.window, elapsed))
+
+
+async def websocket_client(port, stats):
+    """
+    Connect to a ChartServer websocket and count its messages and bytes until it closes.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(('GET /ws HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                  'Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n').format(key).encode())
+    await reader.readuntil(b'\r\n\r\n')
+    while True:
+        opcode, payload = await read_frame(reader)
+        if opcode == 0x8:
+            break
+        stats['messages'] += 1
+        stats['bytes'] += len(payload)
+    writer.close()
+
+
+async def run_serve(args):
+    orderflow_data, ohlc_data = synthetic_footprint(args.history + args.candles, seed=args.seed)
+    ids = ohlc_data['identifier']
+    head = orderflow_data['identifier'] <= ids.iloc[args.history - 1]
+    chart = OrderFlowChart(orderflow_data[head].copy(), ohlc_data.iloc[:args.history].copy(),
+                           identifier_col='identifier', integer_codes=True, lazy_text=True)
+    chart.process_data()
+    server = ChartServer(chart, window=args.window, fps=args.fps)
+    await server.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+
+    clients = [{'messages': 0, 'bytes': 0} for _ in range(args.clients)]
+    tasks = [asyncio.ensure_future(websocket_client(port, stats)) for stats in clients]
+    await asyncio.sleep(0.5)
+
+    # each new candle is built by args.ticks updates of growing size, arriving every args.tick_ms
+    rows = orderflow_data[~head]
+    ticks = 0
+    started = time.perf_counter()
+    for position in range(args.history, args.history + args.candles):
+        candle = rows[rows['identifier'] == ids.iloc[position]]
+        ohlc_row = ohlc_data.iloc[position:position + 1]
+        for tick in range(1, args.ticks + 1):
+            partial = candle.assign(bid_size=np.ceil(candle['bid_size'] * tick / args.ticks),
+                                    ask_size=np.ceil(candle['ask_size'] * tick / args.ticks))
+            if tick == 1:
+                server.append(partial, ohlc_row)
+            else:
+                server.update_last_candle(partial, ohlc_row)
+            ticks += 1
+            await asyncio.sleep(args.tick_ms / 1000)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(3 / args.fps)
+    await server.stop()
+    await asyncio.gather(*tasks)
+
+    frames = server.revision
+    per_client = sum(stats['bytes'] for stats in clients) / len(clients)
+    print("{} ticks in {:.2f}s coalesced into {} frames ({:.1f} ticks per frame at {} fps)".format(
+        ticks, elapsed, frames, ticks / max(frames, 1), args.fps))
+    print("{} clients: {:,.0f} KiB received per client".format(len(clients), per_client / 1024))
+
+
+def bench_serve(args):
+    asyncio.run(run_serve(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    aggregate = subparsers.add_parser('aggregate', help='raw trades to footprint aggregation')
+    aggregate.add_argument('--rows', type=int, default=10_000_000)
+    aggregate.add_argument('--bar', default='time', choices=['time', 'tick', 'volume', 'range'])
+    aggregate.add_argument('--bar-size', default='1min')
+    aggregate.add_argument('--seed', type=int, default=0)
+    aggregate.add_argument('--repeat', type=int, default=3)
+    aggregate.set_defaults(func=bench_aggregate)
+
+    append = subparsers.add_parser('append', help='incremental append/update_last_candle latency')
+    append.add_argument('--candles', type=int, default=20000)
+    append.add_argument('--history', type=int, nargs='+', default=[100, 1000, 10000])
+    append.add_argument('--updates', type=int, default=50)
+    append.add_argument('--seed', type=int, default=0)
+    append.add_argument('--integer-codes', action='store_true')
+    append.set_defaults(func=bench_append)
+
+    text = subparsers.add_parser('text', help='footprint and volume profile text columns, before/after')
+    text.add_argument('--scale', type=int, default=1000, help='times data/range_candles.csv is repeated')
+    text.set_defaults(func=bench_text)
+
+    params = subparsers.add_parser('params', help='calc_params single pass aggregation, before/after')
+    params.add_argument('--candles', type=int, default=100_000)
+    params.add_argument('--seed', type=int, default=0)
+    params.set_defaults(func=bench_params)
+
+    codes = subparsers.add_parser('codes', help='process_data with string identifiers and integer codes')
+    codes.add_argument('--candles', type=int, default=100_000)
+    codes.add_argument('--seed', type=int, default=0)
+    codes.set_defaults(func=bench_codes)
+
+    storage = subparsers.add_parser('storage', help='processed data JSON export against the .npz format')
+    storage.add_argument('--candles', type=int, default=20_000)
+    storage.add_argument('--seed', type=int, default=0)
+    storage.set_defaults(func=bench_storage)
+
+    window = subparsers.add_parser('window', help='figure build time and size, full history against a window')
+    window.add_argument('--history', type=int, nargs='+', default=[1000, 10000, 50000])
+    window.add_argument('--window', type=int, default=100)
+    window.add_argument('--full-max', type=int, default=10000, help='largest history plotted in full')
+    window.add_argument('--seed', type=int, default=0)
+    window.set_defaults(func=bench_window)
+
+    index = subparsers.add_parser('index', help='random candle range and price band access, masks against the candle index')
+    index.add_argument('--candles', type=int, default=150_000)
+    index.add_argument('--windows', type=int, nargs='+', default=[1, 100, 1000])
+    index.add_argument('--queries', type=int, default=200)
+    index.add_argument('--seed', type=int, default=0)
+    index.set_defaults(func=bench_index)
+
+    lod = subparsers.add_parser('lod', help='level of detail pyramid build, then figure build per zoom level')
+    lod.add_argument('--candles', type=int, default=50_000)
+    lod.add_argument('--windows', type=int, nargs='+', default=[20, 200, 2000, 50_000])
+    lod.add_argument('--pixels', type=int, nargs=2, default=[1600, 780], metavar=('WIDTH', 'HEIGHT'))
+    lod.add_argument('--seed', type=int, default=0)
+    lod.set_defaults(func=bench_lod)
+
+    resample = subparsers.add_parser('resample', help='price and candle re-bucketing against rebuilding from the trades')
+    resample.add_argument('--trades', type=int, default=2_000_000)
+    resample.add_argument('--settings', nargs=2, action='append', metavar=('PRICE_TICKS', 'FREQ'),
+                          default=None, help='price ticks and candle frequency, repeatable')
+    resample.add_argument('--repeat', type=int, default=5)
+    resample.add_argument('--seed', type=int, default=0)
+    resample.set_defaults(func=bench_resample)
+
+    parallel = subparsers.add_parser('parallel', help='process_data scaling with the number of worker processes')
+    parallel.add_argument('--days', type=int, default=30, help='length of the synthetic history of 1min candles')
+    parallel.add_argument('--trades', type=int, default=5_000_000)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parallel.add_argument('--integer-codes', action='store_true')
+    parallel.add_argument('--parallel-rows', type=int, default=None,
+                          help='orderflow rows below which process_data runs serially, PARALLEL_ROWS by default')
+    parallel.add_argument('--seed', type=int, default=0)
+    parallel.set_defaults(func=bench_parallel)
+
+    imbalance = subparsers.add_parser('imbalance', help='diagonal imbalance engine throughput on the footprint cells')
+    imbalance.add_argument('--candles', type=int, default=150_000)
+    imbalance.add_argument('--ratio', type=float, default=3.0)
+    imbalance.add_argument('--stacked', type=int, default=3)
+    imbalance.add_argument('--repeat', type=int, default=3)
+    imbalance.add_argument('--seed', type=int, default=0)
+    imbalance.set_defaults(func=bench_imbalance)
+
+    indicators = subparsers.add_parser('indicators', help='session vwap, volume profile and cumulative delta '
+                                                          'throughput on the footprint cells')
+    indicators.add_argument('--cells', type=int, default=1_000_000)
+    indicators.add_argument('--levels', type=int, default=20)
+    indicators.add_argument('--session', default='1D')
+    indicators.add_argument('--updates', type=int, default=200)
+    indicators.add_argument('--repeat', type=int, default=3)
+    indicators.add_argument('--seed', type=int, default=0)
+    indicators.set_defaults(func=bench_indicators)
+
+    memory = subparsers.add_parser('memory', help='bytes held by the processed frames, default against compact dtypes')
+    memory.add_argument('--days', type=int, default=30, help='length of the synthetic history of 1min candles')
+    memory.add_argument('--trades', type=int, default=5_000_000)
+    memory.add_argument('--frames', action='store_true', help='also list the MiB of every frame')
+    memory.add_argument('--seed', type=int, default=0)
+    memory.set_defaults(func=bench_memory)
+
+    csv = subparsers.add_parser('csv', help='chunked CSV parse throughput and peak memory against pd.read_csv')
+    csv.add_argument('--candles', type=int, default=50_000)
+    csv.add_argument('--chunksize', type=int, default=200_000)
+    csv.add_argument('--repeat', type=int, default=3)
+    csv.add_argument('--process', action='store_true', help='also time from_csv with processing')
+    csv.add_argument('--seed', type=int, default=0)
+    csv.set_defaults(func=bench_csv)
+
+    cache = subparsers.add_parser('cache', help='process_data without cache, on a cache miss and on a cache hit')
+    cache.add_argument('--candles', type=int, default=20_000)
+    cache.add_argument('--repeat', type=int, default=3)
+    cache.add_argument('--seed', type=int, default=0)
+    cache.set_defaults(func=bench_cache)
+
+    candles = subparsers.add_parser('candles', help='candle wick and body segments, before/after')
+    candles.add_argument('--candles', type=int, default=100_000)
+    candles.add_argument('--repeat', type=int, default=3)
+    candles.add_argument('--seed', type=int, default=0)
+    candles.set_defaults(func=bench_candles)
+
+    render = subparsers.add_parser('render', help='figure JSON size and to_json time of the render modes')
+    render.add_argument('--candles', type=int, nargs='+', default=[100, 1000, 10_000])
+    render.add_argument('--integer-codes', action='store_true')
+    render.add_argument('--repeat', type=int, default=3)
+    render.add_argument('--seed', type=int, default=0)
+    render.set_defaults(func=bench_render)
+
+    batch = subparsers.add_parser('batch', help='batch rendering throughput with the number of worker processes')
+    batch.add_argument('--charts', type=int, default=200)
+    batch.add_argument('--candles', type=int, default=50, help='candles per chart')
+    batch.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    batch.add_argument('--formats', nargs='+', default=['html'])
+    batch.add_argument('--render', default='svg', choices=['svg', 'webgl'])
+    batch.add_argument('--repeat', type=int, default=5)
+    batch.add_argument('--seed', type=int, default=0)
+    batch.set_defaults(func=bench_batch)
+
+    stages = subparsers.add_parser('stages', help='time and peak memory of every processing, serialization and '
+                                                  'figure stage on synthetic candles, written as JSON')
+    stages.add_argument('--candles', type=int, nargs='+', default=[1000, 10000, 100000])
+    stages.add_argument('--levels', type=int, default=20, help='price levels per candle')
+    stages.add_argument('--layouts', nargs='+', default=['range', 'time'], choices=list(CSV_LAYOUTS))
+    stages.add_argument('--stages', nargs='+', choices=STAGES, help='the stages to run, all by default')
+    stages.add_argument('--repeat', type=int, default=3)
+    stages.add_argument('--integer-codes', action='store_true')
+    stages.add_argument('--lazy-text', action='store_true')
+    stages.add_argument('--compact', action='store_true')
+    stages.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run of every stage')
+    stages.add_argument('--output', help='JSON file the results are written to')
+    stages.add_argument('--compare', help='JSON file of an earlier run to compare the times against')
+    stages.add_argument('--seed', type=int, default=0)
+    stages.set_defaults(func=bench_stages)
+
+    profile = subparsers.add_parser('profile', help='stage profiler overhead, then its report of process_data and plot')
+    profile.add_argument('--candles', type=int, default=20000)
+    profile.add_argument('--levels', type=int, default=20)
+    profile.add_argument('--window', type=int, default=100)
+    profile.add_argument('--repeat', type=int, default=3)
+    profile.add_argument('--seed', type=int, default=0)
+    profile.set_defaults(func=bench_profile)
+
+    startup = subparsers.add_parser('startup', help='import time and memory of a fresh interpreter, processing '
+                                                    'without plotly against plotting')
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    store = subparsers.add_parser('store', help='charts of a time range from the session store against reading the CSV files')
+    store.add_argument('--days', type=int, default=20)
+    store.add_argument('--levels', type=int, default=20)
+    store.add_argument('--window', default='1h')
+    store.add_argument('--chunksize', type=int, default=20000, help='orderflow rows per import_csv batch')
+    store.add_argument('--repeat', type=int, default=3)
+    store.add_argument('--seed', type=int, default=0)
+    store.set_defaults(func=bench_store)
+
+    serve = subparsers.add_parser('serve', help='live server: simulated tick feed pushed to concurrent websocket clients')
+    serve.add_argument('--history', type=int, default=2000)
+    serve.add_argument('--candles', type=int, default=20, help='new candles built by the simulated feed')
+    serve.add_argument('--ticks', type=int, default=20, help='updates per new candle')
+    serve.add_argument('--tick-ms', type=float, default=5)
+    serve.add_argument('--clients', type=int, default=100)
+    serve.add_argument('--window', type=int, default=100)
+    serve.add_argument('--fps', type=int, default=10)
+    serve.add_argument('--seed', type=int, default=0)
+    serve.set_defaults(func=bench_serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
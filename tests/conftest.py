@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES
+
+
+def canonical(frame):
+    """
+    Return frame with its index as a column and its rows in a stable sorted order,
+    for comparing processed frames which hold the same rows in a different order.
+    """
+    frame = frame.copy()
+    frame.index = pd.Index(frame.index.astype(str), name='index')
+    frame = frame.reset_index()
+    return frame.sort_values(list(frame.columns), kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture
+def assert_same_frames():
+    """
+    Return a function checking that two charts hold the same processed frames, whatever their row order,
+    once their pending candles are flushed.
+    """
+    def check(expected, actual, keys=PROCESSED_FRAMES):
+        expected.flush()
+        actual.flush()
+        for key in keys:
+            pd.testing.assert_frame_equal(canonical(getattr(expected, key)), canonical(getattr(actual, key)),
+                                          obj=key)
+    return check
@@ -0,0 +1,149 @@
+"""
+The implementations replaced by the vectorised processing paths, kept as the references which
+tests/ checks the results against and scripts/benchmark.py times the new paths against.
+"""
+import numpy as np
+import pandas as pd
+
+
+def legacy_footprint_text(df):
+    """
+    The per row formatting loop calc_imbalance used before the lookup tables.
+    """
+    bids, asks = [], []
+    for b, a in zip(df['bid_size'].astype(int).astype(str),
+                    df['ask_size'].astype(int).astype(str)):
+        dif = 4 - len(a)
+        a = a + (' ' * dif)
+        dif = 4 - len(b)
+        b = (' ' * dif) + b
+        bids.append(b)
+        asks.append(a)
+    return pd.Series(bids, index=df.index) + '  ' + pd.Series(asks, index=df.index)
+
+
+def legacy_profile_text(df2):
+    """
+    The per row list comprehension annotate used before the lookup table.
+    """
+    return '                    ' + pd.Series(['█' * int(sum_ * 10) for sum_ in df2['sum']], index=df2.index)
+
+
+def legacy_calc_params(of, ohlc):
+    """
+    The calc_params implementation with four groupby passes and a string sort_index.
+    """
+    delta = of.groupby(of['identifier']).sum()['ask_size'] - \
+        of.groupby(of['identifier']).sum()['bid_size']
+    delta = delta[ohlc['identifier']]
+    cum_delta = delta.rolling(10).sum()
+    roc = cum_delta.diff()/cum_delta.shift(1) * 100
+    roc = roc.fillna(0).round(2)
+    volume = of.groupby(of['identifier']).sum()['ask_size'] + of.groupby(of['identifier']).sum()['bid_size']
+    frames = []
+    for name, values in [('delta', delta), ('cum_delta', cum_delta), ('roc', roc), ('volume', volume)]:
+        values = pd.DataFrame(values, columns=['value'])
+        values['type'] = name
+        frames.append(values)
+    labels = pd.concat(frames)
+    labels = labels.sort_index()
+    labels['text'] = labels['value'].astype(str)
+    labels['value'] = np.tanh(labels['value'])
+    return labels
+
+
+def legacy_candle_segments(ohlc, ids, type_):
+    """
+    The range_proc and candle_proc implementation, sorting and concatenating the candle points.
+    """
+    if type_ == 'hl':
+        seq = pd.concat([ohlc['low'], ohlc['high']])
+    if type_ == 'oc':
+        seq = pd.concat([ohlc['open'], ohlc['close']])
+    seq = pd.DataFrame(seq, columns=['price'])
+    seq['identifier'] = pd.concat([ohlc['identifier'], ohlc['identifier']])
+    seq['sequence'] = pd.concat([ohlc['sequence'], ohlc['sequence']])
+    seq['time'] = seq.index
+    seq = seq.sort_index().set_index('identifier').loc[ids]
+
+    df = seq.sort_values(by=['time', 'sequence', 'price'])
+    df = df.reset_index()
+    df = pd.concat([df, df.iloc[1::2].copy()])
+    df = df.sort_index()
+    df = df.set_index('identifier')
+    df = df.sort_values(by=['time', 'sequence'])
+    df[2::3] = np.nan
+    return df
+
+
+def reference_imbalance(codes, ticks, bid, ask, engine):
+    """
+    Diagonal imbalances computed candle by candle with python dicts, to check the engine against.
+    """
+    columns = {name: [None] * len(codes) for name in ['size', 'buy_imbalance', 'sell_imbalance',
+                                                      'stacked_buy', 'stacked_sell', 'unfinished']}
+    candles = {}
+    for i, code in enumerate(codes):
+        candles.setdefault(code, {})[int(ticks[i])] = i
+    for levels in candles.values():
+        for tick, i in levels.items():
+            ask_above = ask[levels[tick + 1]] if tick + 1 in levels else 0.0
+            bid_below = bid[levels[tick - 1]] if tick - 1 in levels else 0.0
+            total = bid[i] + ask_above
+            columns['size'][i] = (bid[i] - ask_above) / total if total else 0.0
+            columns['buy_imbalance'][i] = ask[i] >= engine.ratio * bid_below and ask[i] >= engine.min_volume
+            columns['sell_imbalance'][i] = bid[i] >= engine.ratio * ask_above and bid[i] >= engine.min_volume
+            traded = bid[i] > 0 and ask[i] > 0
+            columns['unfinished'][i] = (1 if tick == max(levels) and traded else
+                                        -1 if tick == min(levels) and traded else 0)
+        for side in ['buy', 'sell']:
+            flags = columns[side + '_imbalance']
+            for tick, i in levels.items():
+                run = 1
+                for direction in [1, -1]:
+                    t = tick + direction
+                    while t in levels and flags[levels[t]] and flags[i]:
+                        run += 1
+                        t += direction
+                columns['stacked_' + side][i] = bool(flags[i]) and run >= engine.stacked
+    return {name: np.asarray(values) for name, values in columns.items()}
+
+
+def legacy_session_indicators(orderflow_data, ohlc_data, indicators):
+    """
+    The session indicators computed in separate pandas passes over the footprint rows: the cumulative
+    sums of the vwap and the delta, then the cumulative profile of every candle as a pivot table,
+    from which the poc and the value area are found row by row.
+    """
+    cells = orderflow_data.assign(volume=orderflow_data['bid_size'] + orderflow_data['ask_size'],
+                                  delta=orderflow_data['ask_size'] - orderflow_data['bid_size'])
+    cells['pv'] = cells['price'] * cells['volume']
+    candles = cells.groupby('identifier', sort=False)[['volume', 'delta', 'pv']].sum().reindex(ohlc_data['identifier'])
+    sessions = indicators.session_keys(ohlc_data.index)
+    running = candles.groupby(sessions).cumsum()
+
+    profile = cells.pivot_table(index='identifier', columns='price', values='volume', aggfunc='sum', sort=False)
+    profile = profile.reindex(index=ohlc_data['identifier'], columns=sorted(profile.columns)).fillna(0)
+    profile = profile.groupby(sessions).cumsum()
+    result = {'session_vwap': (running['pv'] / running['volume']).to_numpy(),
+              'session_delta': running['delta'].to_numpy(), 'session_volume': running['volume'].to_numpy(),
+              'session_poc': [], 'session_vah': [], 'session_val': []}
+    for _, row in profile.iterrows():
+        levels = row[row > 0]
+        levels = row.loc[levels.index[0]:levels.index[-1]]
+        values = levels.to_numpy()
+        low = high = int(values.argmax())
+        covered = values[low]
+        while covered < indicators.value_area * values.sum() and (low > 0 or high < values.shape[0] - 1):
+            up = values[high + 1] if high + 1 < values.shape[0] else -1
+            down = values[low - 1] if low > 0 else -1
+            if up >= down:
+                high += 1
+                covered += up
+            else:
+                low -= 1
+                covered += down
+        result['session_poc'].append(levels.index[values.argmax()])
+        result['session_vah'].append(levels.index[high])
+        result['session_val'].append(levels.index[low])
+    return result
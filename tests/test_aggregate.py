@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import aggregate_trades, infer_granularity
+
+
+def make_trades(prices, start='2023-06-14 13:30:00', freq='10s'):
+    index = pd.date_range(start, periods=len(prices), freq=freq)
+    return pd.DataFrame({'price': prices, 'size': 1.0, 'side': [i % 2 == 0 for i in range(len(prices))]}, index=index)
+
+
+def test_infer_granularity():
+    assert infer_granularity([15000.0, 15001.25, 15000.25, 15000.0]) == 0.25
+    assert infer_granularity([15000.0, np.nan, 15000.5]) == 0.5
+    assert infer_granularity([15000.0, 15000.0]) == 1.0
+    assert infer_granularity([]) == 1.0
+
+
+def test_aggregate_trades_returns_inferred_granularity():
+    trades = make_trades([15000.0, 15000.25, 15000.5, 15001.0])
+    orderflow_data, ohlc_data, granularity = aggregate_trades(trades, bar='tick', bar_size=2,
+                                                              return_granularity=True)
+    assert granularity == 0.25
+    assert len(aggregate_trades(trades, bar='tick', bar_size=2)) == 2
+
+
+def test_from_trades_keeps_the_granularity_of_a_single_level_first_bar():
+    # the first minute only trades at one price, the next ones 5 ticks apart then one tick apart
+    prices = [15000.0] * 6 + [15001.25, 15000.0] * 3 + [15000.25, 15000.5] * 3
+    chart = OrderFlowChart.from_trades(make_trades(prices), bar='time', bar_size='1min')
+    assert chart.granularity == 0.25
+    chart.process_data()
+    assert chart.ohlc_data.shape[0] == 3
+
+
+def test_from_trades_with_a_single_price_level():
+    chart = OrderFlowChart.from_trades(make_trades([15000.0] * 4), bar='time', bar_size='1min', granularity=0.25)
+    assert chart.granularity == 0.25
+    chart.process_data()
+    assert chart.df.shape[0] == 1
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.batch import check_jobs, render_batch
+from orderflow_chart.synthetic import synthetic_candles, write_csv
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    """
+    Return two jobs, one of a processed file and one of CSV files, and the charts they plot.
+    """
+    orderflow_data, ohlc_data = synthetic_candles(40, levels=8, layout='range', seed=18)
+    processed = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier')
+    processed.save_processed(str(tmp_path / 'processed.npz'))
+    orderflow_data, ohlc_data = synthetic_candles(30, levels=6, layout='time', seed=19)
+    write_csv(orderflow_data, ohlc_data, tmp_path / 'candles.csv', tmp_path / 'ohlc.csv', layout='time')
+    csv = OrderFlowChart.from_csv(str(tmp_path / 'candles.csv'), str(tmp_path / 'ohlc.csv'), layout='time')
+    return [
+        ({'processed': str(tmp_path / 'processed.npz'), 'plot': {'window': 20}}, processed.plot(
+            return_figure=True, window=20)),
+        ({'orderflow': str(tmp_path / 'candles.csv'), 'ohlc': str(tmp_path / 'ohlc.csv'), 'layout': 'time',
+          'name': 'csv'}, csv.plot(return_figure=True)),
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_figures_match_plot(jobs, tmp_path, workers):
+    results = list(render_batch([job for job, _ in jobs], str(tmp_path / 'out'), formats=['json', 'html'],
+                                workers=workers))
+    assert sorted(result['name'] for result in results) == ['csv', 'processed']
+    for (job, fig), name in zip(jobs, ['processed', 'csv']):
+        result = next(result for result in results if result['name'] == name)
+        assert result['error'] is None
+        assert result['log'] != ''
+        with open(os.path.join(str(tmp_path / 'out'), name + '.json')) as f:
+            assert json.load(f) == json.loads(fig.to_json())
+        assert os.path.getsize(os.path.join(str(tmp_path / 'out'), name + '.html')) > 0
+
+
+def test_failing_jobs_and_invalid_batches(tmp_path):
+    results = list(render_batch([{'processed': str(tmp_path / 'missing.npz')}], str(tmp_path), workers=1))
+    assert results[0]['error'] is not None and results[0]['outputs'] == []
+    with pytest.raises(ValueError):
+        check_jobs([{'orderflow': 'a.csv'}], ['html'])
+    with pytest.raises(ValueError):
+        check_jobs([{'processed': 'a.npz'}, {'processed': 'b/a.npz'}], ['html'])
+    with pytest.raises(ValueError):
+        check_jobs([{'processed': 'a.npz'}], ['gif'])
+
+
+def test_import_does_not_load_plotly():
+    code = "import sys, orderflow_chart.batch; print('plotly' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.strip() == 'False'
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart, ProcessedCache
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES
+from orderflow_chart.synthetic import synthetic_candles
+
+
+@pytest.fixture(scope='module')
+def candles():
+    return synthetic_candles(300, levels=10, layout='range', seed=8)
+
+
+def process(candles, cache=None, **kwargs):
+    orderflow_data, ohlc_data = candles
+    chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                           cache=cache, **kwargs)
+    chart.process_data()
+    return chart
+
+
+def test_a_hit_returns_the_processed_frames(candles, tmp_path):
+    cache = ProcessedCache(tmp_path)
+    expected = process(candles)
+    process(candles, cache)
+    chart = process(candles, cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    for name in PROCESSED_FRAMES:
+        pd.testing.assert_frame_equal(getattr(chart, name), getattr(expected, name), obj=name)
+
+
+def test_settings_are_part_of_the_key_and_old_entries_are_evicted(candles, tmp_path):
+    cache = ProcessedCache(tmp_path)
+    process(candles, cache)
+    cache.max_bytes = cache.info()['bytes']
+    chart = process(candles, cache, cum_delta_window=5)
+    assert cache.misses == 2
+    assert cache.info()['entries'] == 1
+    pd.testing.assert_frame_equal(chart.labels, process(candles, cum_delta_window=5).labels)
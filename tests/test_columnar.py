@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.columnar import load_frames, save_frames
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES
+from orderflow_chart.synthetic import synthetic_candles
+
+MODES = [{}, {'integer_codes': True}, {'compact': True},
+         {'imbalance_engine': 'diagonal', 'indicators': 'session', 'stats': ['poc', 'vwap']}]
+
+
+def memory_mapped(array):
+    """
+    Return whether array is a view of a memory mapped file.
+    """
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+@pytest.mark.parametrize('mmap', [True, False])
+def test_processed_chart_round_trip(tmp_path, assert_same_frames, kwargs, mmap):
+    orderflow_data, ohlc_data = synthetic_candles(200, levels=10, layout='time', seed=15)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, **kwargs)
+    path = str(tmp_path / 'chart.npz')
+    chart.save_processed(path)
+    loaded = OrderFlowChart.load_processed(path, mmap=mmap)
+    assert_same_frames(chart, loaded, keys=PROCESSED_FRAMES)
+    assert loaded.granularity == chart.granularity
+    assert loaded.processed_frames()[1] == chart.processed_frames()[1]
+    assert len(loaded.plot(return_figure=True, window=20).data) > 0
+
+
+def test_mmap_maps_the_numeric_columns(tmp_path):
+    orderflow_data, ohlc_data = synthetic_candles(50, levels=10, layout='range', seed=16)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', integer_codes=True)
+    chart.save_processed(str(tmp_path / 'chart.npz'))
+    frames, _ = load_frames(str(tmp_path / 'chart.npz'), mmap=True)
+    assert memory_mapped(frames['orderflow']['bid_size'].to_numpy())
+    frames, _ = load_frames(str(tmp_path / 'chart.npz'), mmap=False)
+    assert not memory_mapped(frames['orderflow']['bid_size'].to_numpy())
+
+
+def test_frames_keep_their_dtypes(tmp_path):
+    orderflow_data, ohlc_data = synthetic_candles(20, levels=5, layout='time', seed=17)
+    frames = {'orderflow': orderflow_data.assign(flag=orderflow_data['bid_size'] > 5), 'ohlc': ohlc_data}
+    save_frames(str(tmp_path / 'frames.npz'), frames, {'note': 'raw'})
+    loaded, attrs = load_frames(str(tmp_path / 'frames.npz'), mmap=False)
+    assert attrs == {'note': 'raw'}
+    for key, frame in frames.items():
+        assert loaded[key].equals(frame)
+        assert list(loaded[key].dtypes) == list(frame.dtypes)
+        assert loaded[key].index.equals(frame.index)
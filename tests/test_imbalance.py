@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from legacy import reference_imbalance
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import aggregate_trades
+from orderflow_chart.imbalance import DiagonalImbalance, build_engine
+from orderflow_chart.synthetic import synthetic_trades
+
+
+@pytest.fixture(scope='module')
+def footprint():
+    trades = synthetic_trades(500 * 50, seed=7)
+    return aggregate_trades(trades, bar='tick', bar_size=50, granularity=0.25)
+
+
+@pytest.mark.parametrize('settings', [{}, {'ratio': 2.0, 'stacked': 2, 'min_volume': 3}])
+def test_engine_matches_the_per_candle_reference(footprint, settings):
+    orderflow_data, _ = footprint
+    codes, _ = pd.factorize(orderflow_data['identifier'])
+    ticks = np.rint(orderflow_data['price'].to_numpy() / 0.25)
+    bid, ask = orderflow_data['bid_size'].to_numpy(), orderflow_data['ask_size'].to_numpy()
+    engine = DiagonalImbalance(**settings)
+    expected = reference_imbalance(codes, ticks, bid, ask, engine)
+    for name, values in engine(codes, ticks, bid, ask).items():
+        np.testing.assert_array_equal(values, expected[name].astype(values.dtype), err_msg=name)
+
+
+def test_build_engine():
+    assert build_engine(None) is None
+    assert isinstance(build_engine('diagonal'), DiagonalImbalance)
+    assert build_engine({'name': 'diagonal', 'ratio': 2.5}).ratio == 2.5
+    with pytest.raises(ValueError):
+        build_engine('horizontal')
+
+
+def test_engine_stats_need_an_engine(footprint):
+    orderflow_data, ohlc_data = footprint
+    with pytest.raises(ValueError):
+        OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', stats=['stacked_buy'])
+    chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier',
+                           imbalance_engine='diagonal', stats=['stacked_buy', 'unfinished_high'])
+    chart.process_data()
+    assert {'stacked_buy', 'unfinished_high'} <= set(chart.labels['type'])
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from legacy import legacy_session_indicators
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import SessionIndicators, build_indicators
+from orderflow_chart.synthetic import synthetic_candles
+
+
+@pytest.fixture(scope='module')
+def candles():
+    return synthetic_candles(600, levels=10, layout='range', seed=9)
+
+
+@pytest.mark.parametrize('settings', [{'session': '1h'}, {'session': '30min', 'offset': '10min', 'value_area': 0.5}])
+def test_indicators_match_the_pandas_passes(candles, settings):
+    orderflow_data, ohlc_data = candles
+    indicators = SessionIndicators(**settings)
+    chart = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier', indicators=indicators)
+    chart.granularity = 0.25
+    columns, _, _ = chart.session_indicators(orderflow_data, ohlc_data)
+    expected = legacy_session_indicators(orderflow_data, ohlc_data, indicators)
+    assert len(set(indicators.session_keys(ohlc_data.index))) > 1
+    for name in ['session_delta', 'session_volume', 'session_poc', 'session_vah', 'session_val']:
+        np.testing.assert_allclose(columns[name], np.asarray(expected[name], dtype=float), err_msg=name)
+    np.testing.assert_allclose(columns['session_vwap'], np.round(expected['session_vwap'], 2), atol=0.01)
+
+
+def test_build_indicators():
+    assert build_indicators(None) is None
+    indicators = build_indicators({'name': 'session', 'session': '4h', 'offset': '1h'})
+    assert build_indicators(indicators.params()).params() == indicators.params()
+    with pytest.raises(ValueError):
+        build_indicators('weekly')
+    with pytest.raises(ValueError):
+        SessionIndicators(value_area=1.5)
@@ -0,0 +1,41 @@
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.loader import read_candles
+from orderflow_chart.synthetic import synthetic_candles, write_csv
+
+
+@pytest.fixture(scope='module')
+def time_csv(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('time')
+    paths = str(directory / 'orderflow.csv'), str(directory / 'ohlc.csv')
+    write_csv(*synthetic_candles(50000, levels=5, layout='time', seed=4), *paths, layout='time')
+    return paths
+
+
+def test_read_candles_yields_whole_candles(time_csv):
+    batches = list(read_candles(*time_csv, layout='time', chunksize=60000))
+    assert len(batches) > 4
+    assert sum(ohlc_rows.shape[0] for _, ohlc_rows in batches) == 50000
+    for orderflow_rows, ohlc_rows in batches:
+        assert orderflow_rows.index.unique().equals(ohlc_rows.index)
+
+
+def test_from_csv_over_many_chunks_of_time_candles(time_csv, assert_same_frames):
+    chart = OrderFlowChart.from_csv(*time_csv, layout='time', chunksize=60000)
+    chart.flush()
+    assert chart.ohlc_data.shape[0] == 50000
+    assert chart.ohlc_data['identifier'].is_unique
+    whole = OrderFlowChart.from_csv(*time_csv, layout='time', chunksize=1_000_000)
+    assert_same_frames(whole, chart)
+    assert set(chart.get_processed_data()) >= {'orderflow', 'ohlc'}
+    assert len(chart.plot(return_figure=True, window=50).data) > 0
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'integer_codes': True}])
+def test_from_csv_over_many_chunks_of_range_candles(tmp_path, kwargs, assert_same_frames):
+    paths = str(tmp_path / 'orderflow.csv'), str(tmp_path / 'ohlc.csv')
+    write_csv(*synthetic_candles(2000, levels=12, layout='range', seed=5), *paths, layout='range')
+    chart = OrderFlowChart.from_csv(*paths, layout='range', chunksize=5000, **kwargs)
+    whole = OrderFlowChart.from_csv(*paths, layout='range', **kwargs)
+    assert_same_frames(whole, chart)
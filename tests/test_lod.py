@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.synthetic import synthetic_candles
+
+CANDLES = 203
+
+
+@pytest.fixture(scope='module', params=[{}, {'integer_codes': True}, {'compact': True}])
+def chart(request):
+    orderflow_data, ohlc_data = synthetic_candles(CANDLES, levels=12, layout='range', seed=20)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', **request.param)
+    chart.process_data()
+    return chart
+
+
+def candle_volumes(chart):
+    """
+    Return the bid and ask sizes of every candle of a chart, in the ohlc order.
+    """
+    sizes = chart.df.groupby(level=0, sort=False)[['bid_size', 'ask_size']].sum()
+    return sizes.reindex(chart.ohlc_data['identifier'].to_numpy()).to_numpy(dtype=float)
+
+
+def test_levels_merge_pairs_of_candles_and_keep_the_volumes(chart):
+    levels = chart.build_pyramid(min_candles=16)
+    assert sorted(levels) == [1, 2, 4, 8, 16]
+    assert levels[1] is chart
+    base = candle_volumes(chart)
+    for factor, level in levels.items():
+        assert level.ohlc_data.shape[0] == -(-CANDLES // factor)
+        groups = np.arange(CANDLES) // factor
+        expected = pd.DataFrame(base).groupby(groups).sum().to_numpy()
+        np.testing.assert_allclose(candle_volumes(level), expected)
+        assert level.ohlc_data['high'].max() == chart.ohlc_data['high'].max()
+        assert level.granularity == chart.granularity * factor
+    assert levels[16].ohlc_data.shape[0] <= 16 < levels[8].ohlc_data.shape[0]
+    assert chart.lod_level(4) is levels[4]
+
+
+def test_pixel_budget_picks_a_level(chart):
+    assert chart.lod_factor(0, CANDLES, (100000, 100000)) == 1
+    factor = chart.lod_factor(0, CANDLES, (800, 400))
+    assert factor > 1
+    fig = chart.plot(return_figure=True, start=0, end=CANDLES, pixels=(800, 400))
+    assert list(fig.layout.xaxis.tickvals) == list(chart.lod_level(factor).ohlc_data['identifier'])
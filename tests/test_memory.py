@@ -0,0 +1,27 @@
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES
+from orderflow_chart.synthetic import synthetic_candles
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'integer_codes': True}, {'compact': True}])
+def test_memory_report_counts_every_processed_frame(kwargs):
+    orderflow_data, ohlc_data = synthetic_candles(40, levels=10, layout='range', seed=15)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', **kwargs)
+    report = chart.memory_report()
+    assert chart.is_processed
+    assert list(report.index) == list(PROCESSED_FRAMES) + ['total']
+    assert list(report.columns) == ['rows', 'bytes']
+    for key in PROCESSED_FRAMES:
+        frame = getattr(chart, key)
+        assert report.loc[key, 'rows'] == frame.shape[0]
+        assert report.loc[key, 'bytes'] == frame.memory_usage(deep=True).sum()
+    assert (report.loc['total'] == report.loc[list(PROCESSED_FRAMES)].sum()).all()
+
+
+def test_compact_frames_hold_less_memory():
+    orderflow_data, ohlc_data = synthetic_candles(40, levels=10, layout='range', seed=15)
+    totals = [OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier',
+                             compact=compact).memory_report().loc['total', 'bytes'] for compact in (False, True)]
+    assert totals[1] < totals[0]
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart, StageProfiler
+from orderflow_chart import data_wrangling
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES, aggregate_trades
+from orderflow_chart.synthetic import synthetic_trades
+
+
+@pytest.fixture(scope='module')
+def candles():
+    trades = synthetic_trades(200_000, seed=5, session='2D')
+    return aggregate_trades(trades, bar='time', bar_size='5min', granularity=0.25)
+
+
+def process(candles, workers, **kwargs):
+    chart = OrderFlowChart(*[frame.copy() for frame in candles], identifier_col='identifier',
+                           profiler=StageProfiler(), **kwargs)
+    chart.process_data(workers=workers)
+    return chart, [record['stage'] for record in chart.profiler.records]
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'integer_codes': True}, {'imbalance_engine': 'diagonal'}])
+def test_workers_match_the_serial_path(candles, kwargs, monkeypatch):
+    # the pool is used whatever the size of the input and the cpus of the machine
+    monkeypatch.setattr(data_wrangling, 'PARALLEL_ROWS', 0)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 4)
+    serial, stages = process(candles, 1, **kwargs)
+    assert 'process_partitions' not in stages
+    parallel, stages = process(candles, 2, **kwargs)
+    assert 'process_partitions' in stages
+    for name in PROCESSED_FRAMES:
+        pd.testing.assert_frame_equal(getattr(serial, name), getattr(parallel, name), check_exact=True, obj=name)
+
+
+@pytest.mark.parametrize('parallel_rows, cpus', [(10 ** 9, 4), (0, 1)])
+def test_small_inputs_and_single_cpus_run_serially(candles, parallel_rows, cpus, monkeypatch):
+    monkeypatch.setattr(data_wrangling, 'PARALLEL_ROWS', parallel_rows)
+    monkeypatch.setattr(os, 'cpu_count', lambda: cpus)
+    chart, stages = process(candles, 4)
+    assert 'process_partitions' not in stages
+    assert chart.candle_partitions(4) is not None
@@ -0,0 +1,56 @@
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.plot import base_layout, figure_layout, shared_figure
+from orderflow_chart.synthetic import synthetic_candles
+
+
+def test_figure_layout_is_a_copy():
+    layout = figure_layout()
+    layout['xaxis']['range'] = [0, 1]
+    layout['template']['layout']['paper_bgcolor'] = 'white'
+    assert 'range' not in figure_layout()['xaxis']
+    assert figure_layout() == base_layout()
+
+
+def test_base_layout_is_built_once():
+    base_layout.cache_clear()
+    first = base_layout()
+    assert base_layout() is first
+    assert base_layout.cache_info().hits == 1
+
+
+def test_shared_figures_are_independent():
+    fig = shared_figure()
+    fig.update_layout(title='changed', xaxis_range=[0, 5])
+    other = shared_figure()
+    assert other.layout.title.text == 'Order Book Chart'
+    assert other.layout.xaxis.range is None
+    assert other.layout.template.layout.paper_bgcolor == fig.layout.template.layout.paper_bgcolor
+
+
+@pytest.mark.parametrize('render', ['svg', 'webgl'])
+def test_plot_uses_the_shared_layout(render):
+    orderflow_data, ohlc_data = synthetic_candles(30, levels=8, layout='range')
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    fig = chart.plot(return_figure=True, window=10, render=render)
+    assert fig.layout.height == base_layout()['height']
+    assert fig.layout.xaxis.range is not None
+    assert 'xaxis2' in fig.layout
+
+
+@pytest.mark.parametrize('kwargs', [{'render': 'svg'}, {'render': 'webgl', 'integer_codes': True}])
+def test_page_matches_the_plot_of_its_window(kwargs):
+    render = kwargs.pop('render')
+    orderflow_data, ohlc_data = synthetic_candles(60, levels=8, layout='range', seed=3)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', **kwargs)
+    chart.plot(return_figure=True, window=10, render=render)
+    page = chart.page(offset=-2, render=render)
+    assert (page['start'], page['end']) == (30, 40)
+    fig = chart.plot(return_figure=True, start=page['start'], end=page['end'], render=render)
+    assert [(trace['xaxis'], trace['yaxis']) for trace in page['data']] == \
+        [(trace.xaxis, trace.yaxis) for trace in fig.data]
+    assert {trace['yaxis'] for trace in page['data']} == {'y', 'y2'}
+    assert page['layout']['xaxis.range'] == list(fig.layout.xaxis.range)
+    assert page['layout']['yaxis.range'] == list(fig.layout.yaxis.range)
+    assert page['layout']['xaxis.tickvals'] == list(fig.layout.xaxis.tickvals)
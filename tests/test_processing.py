@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import canonical
+from legacy import legacy_calc_params, legacy_candle_segments, legacy_footprint_text, legacy_profile_text
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import aggregate_trades
+from orderflow_chart.synthetic import synthetic_trades
+
+
+@pytest.fixture(scope='module')
+def footprint():
+    trades = synthetic_trades(400 * 20, seed=4)
+    return aggregate_trades(trades, bar='tick', bar_size=20, granularity=0.25)
+
+
+def test_text_matches_the_row_loops(footprint):
+    orderflow_data, ohlc_data = footprint
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    df = orderflow_data.assign(sum=orderflow_data['bid_size'] + orderflow_data['ask_size'])
+    df['sum'] = df['sum'] / df.groupby('identifier')['sum'].transform('max')
+    np.testing.assert_array_equal(chart.time_text(df.index), df.index.astype(str))
+    np.testing.assert_array_equal(chart.footprint_text(df), legacy_footprint_text(df))
+    np.testing.assert_array_equal(chart.profile_text(df), legacy_profile_text(df))
+
+
+def test_calc_params_matches_the_groupby_passes(footprint):
+    chart = OrderFlowChart(*[frame.copy() for frame in footprint], identifier_col='identifier')
+    chart.process_data()
+    pd.testing.assert_frame_equal(canonical(legacy_calc_params(chart.df, chart.ohlc_data)),
+                                  canonical(chart.calc_params(chart.df, chart.ohlc_data)))
+
+
+def test_candle_segments_match_the_sorted_points(footprint):
+    chart = OrderFlowChart(*footprint, identifier_col='identifier', integer_codes=True)
+    orderflow_data, ohlc_data = chart.encode_candles(*footprint)
+    chart.assign_sequence(orderflow_data, ohlc_data)
+    green = ohlc_data['close'] >= ohlc_data['open']
+    for type_ in ['hl', 'oc']:
+        for mask in [green, ~green]:
+            pd.testing.assert_frame_equal(legacy_candle_segments(ohlc_data, ohlc_data.loc[mask, 'identifier'], type_),
+                                          chart.candle_segments(ohlc_data[mask], type_=type_), check_exact=True)
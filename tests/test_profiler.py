@@ -0,0 +1,79 @@
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart, StageProfiler
+from orderflow_chart.profiler import NO_STAGE, build_profiler, staged
+from orderflow_chart.synthetic import synthetic_candles
+
+
+class Stages():
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.calls = []
+
+    @staged('outer', key=lambda self, frame, name: name)
+    def outer(self, frame, name):
+        self.calls.append(name)
+        return self.inner(frame.head(2))
+
+    @staged('inner')
+    def inner(self, frame):
+        return frame.shape[0]
+
+
+def test_staged_records_every_call():
+    records = []
+    stages = Stages(StageProfiler(callback=records.append))
+    frame = pd.DataFrame({'a': range(5)})
+    assert stages.outer(frame, 'first') == 2
+    assert stages.outer(frame, 'second') == 2
+    assert [(r['stage'], r['key'], r['parent'], r['depth'], r['rows']) for r in stages.profiler.records] == [
+        ('inner', None, 'outer', 1, 2), ('outer', 'first', None, 0, 5),
+        ('inner', None, 'outer', 1, 2), ('outer', 'second', None, 0, 5)]
+    assert records == stages.profiler.records
+    assert all(r['seconds'] >= 0 and r['allocated'] is None for r in records)
+    report = stages.profiler.report()
+    assert list(report['stage']) == ['inner', 'outer', 'outer']
+    assert list(report['calls']) == [2, 1, 1]
+
+
+def test_staged_adds_nothing_without_a_profiler():
+    stages = Stages()
+    frame = pd.DataFrame({'a': range(5)})
+    assert stages.outer(frame, 'first') == 2
+    assert stages.calls == ['first']
+    # the wrapper calls the method itself, and the stages of a chart share a context doing nothing
+    assert Stages.outer.__wrapped__(stages, frame, 'second') == 2
+    chart = OrderFlowChart(*synthetic_candles(20, levels=5, layout='range'), identifier_col='identifier')
+    assert chart.profiler is None
+    assert chart.stage('calc_params') is NO_STAGE
+    tracing = tracemalloc.is_tracing()
+    chart.process_data()
+    assert tracemalloc.is_tracing() == tracing
+
+
+def test_chart_stages_and_memory():
+    profiler = StageProfiler(memory=True)
+    try:
+        chart = OrderFlowChart(*synthetic_candles(50, levels=5, layout='range'), identifier_col='identifier',
+                               profiler=profiler)
+        chart.process_data()
+        chart.plot(return_figure=True)
+    finally:
+        tracemalloc.stop()
+    stages = {r['stage'] for r in profiler.records}
+    assert {'process_data', 'calc_imbalance', 'annotate', 'calc_params', 'candle_segments', 'plot',
+            'window_frames', 'figure_traces'} <= stages
+    process = next(r for r in profiler.records if r['stage'] == 'process_data')
+    assert process['rows'] == 250 and process['depth'] == 0 and process['allocated'] is not None
+    assert next(r for r in profiler.records if r['stage'] == 'calc_params')['parent'] == 'process_data'
+
+
+def test_build_profiler():
+    assert build_profiler(None) is None and build_profiler(False) is None
+    assert isinstance(build_profiler(True), StageProfiler)
+    assert build_profiler(print).callback is print
+    with pytest.raises(ValueError):
+        build_profiler('yes')
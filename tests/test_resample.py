@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.synthetic import synthetic_candles
+
+LEVELS = 8
+
+
+def grouped(chart, groups):
+    """
+    Return the expected ohlc rows and candle bid/ask sums of the candles of chart merged by groups,
+    the group of every candle, computed with pandas.
+    """
+    ohlc = chart.ohlc_data.assign(group=groups).groupby('group')
+    expected = pd.DataFrame({'open': ohlc['open'].first(), 'high': ohlc['high'].max(),
+                             'low': ohlc['low'].min(), 'close': ohlc['close'].last()})
+    codes = pd.Series(groups, index=chart.ohlc_data['identifier'].to_numpy())
+    sizes = chart.df.assign(group=codes.reindex(chart.df.index).to_numpy()).groupby('group')
+    expected['bid_size'] = sizes['bid_size'].sum()
+    expected['ask_size'] = sizes['ask_size'].sum()
+    return expected.reset_index(drop=True)
+
+
+def merged(resampled):
+    """
+    Return the ohlc rows and candle bid/ask sums of a resampled chart.
+    """
+    sizes = resampled.df.groupby(level=0, sort=False)[['bid_size', 'ask_size']].sum()
+    sizes = sizes.reindex(resampled.ohlc_data['identifier'].to_numpy())
+    ohlc = resampled.ohlc_data[['open', 'high', 'low', 'close']].reset_index(drop=True)
+    return ohlc.assign(bid_size=sizes['bid_size'].to_numpy(), ask_size=sizes['ask_size'].to_numpy())
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'integer_codes': True}])
+@pytest.mark.parametrize('candles', [5, 7])
+def test_merged_candles_sum_their_candles(candles, kwargs):
+    # 103 candles: the last group is shorter for both factors
+    orderflow_data, ohlc_data = synthetic_candles(103, levels=LEVELS, layout='range', seed=13)
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier', **kwargs)
+    chart.process_data()
+    resampled = chart.resample(candles=candles)
+    assert resampled.ohlc_data.shape[0] == -(-103 // candles)
+    pd.testing.assert_frame_equal(merged(resampled), grouped(chart, np.arange(103) // candles))
+
+    deltas = pd.Series(merged(resampled).eval('ask_size - bid_size'))
+    labels = resampled.labels[resampled.labels['type'] == 'cum_delta']
+    labels = labels.reindex(resampled.ohlc_data['identifier'].to_numpy())
+    expected = deltas.rolling(chart.cum_delta_window).sum().to_numpy()
+    np.testing.assert_allclose(np.tanh(expected), labels['value'].to_numpy())
+    assert chart.resample(candles=candles) is resampled
+
+
+def test_price_buckets_and_periods():
+    orderflow_data, ohlc_data = synthetic_candles(100, levels=LEVELS, layout='time', seed=14)
+    chart = OrderFlowChart(orderflow_data, ohlc_data)
+    chart.process_data()
+    resampled = chart.resample(price_ticks=4, freq='15min')
+    periods = chart.ohlc_data.index.floor('15min')
+    assert list(resampled.ohlc_data.index) == list(periods.unique())
+    pd.testing.assert_frame_equal(merged(resampled), grouped(chart, pd.factorize(periods)[0]))
+    ticks = np.rint(resampled.df['price'].to_numpy() / chart.granularity)
+    assert (ticks % 4 == 0).all()
+    assert resampled.granularity == chart.granularity * 4
+    assert resampled.df['bid_size'].sum() == chart.df['bid_size'].sum()
+
+
+def test_invalid_settings():
+    orderflow_data, ohlc_data = synthetic_candles(10, levels=LEVELS, layout='range')
+    chart = OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier')
+    assert chart.resample() is chart
+    for kwargs in [{'candles': 0}, {'price_ticks': 1.5}, {'candles': 2, 'freq': '5min'}]:
+        with pytest.raises(ValueError):
+            chart.resample(**kwargs)
@@ -0,0 +1,176 @@
+import asyncio
+import base64
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.server import CLIENT_SCRIPT, TRACE_KEYS, ChartServer, read_frame
+from orderflow_chart.synthetic import synthetic_candles
+
+LEVELS = 8
+HISTORY = 40
+CANDLES = 12
+WINDOW = 20
+TICKS = 3
+
+# runs the page script on the messages of a client, with stubs of the browser and of Plotly.react,
+# and prints the data and layout of the figure it ends up with
+NODE_RUNNER = """
+const fs = require('fs');
+const [script, messages] = process.argv.slice(1).map(path => fs.readFileSync(path, 'utf8'));
+const div = {data: [], layout: {}};
+const sockets = [];
+global.document = {getElementById: () => div};
+global.location = {protocol: 'http:', host: 'localhost'};
+global.Plotly = {react: (gd, data, layout) => { gd.data = data; gd.layout = layout; }};
+global.WebSocket = function (url) { sockets.push(this); };
+eval(script);
+JSON.parse(messages).forEach(msg => sockets[0].onmessage({data: JSON.stringify(msg)}));
+process.stdout.write(JSON.stringify({data: div.data, layout: div.layout}));
+"""
+
+
+def apply_message(figure, message):
+    """
+    Apply a ChartServer message to a figure dict, as the page script does.
+    """
+    if message['type'] == 'figure':
+        figure['data'], figure['layout'] = message['data'], message['layout']
+        return
+    remove = set(message['remove'])
+    for trace, points in zip(figure['data'], message['traces']):
+        keep = [i for i, x in enumerate(trace['x']) if x not in remove]
+        for key, values in points.items():
+            trace[key] = [trace.get(key, [])[i] for i in keep] + values
+    for path, value in message['layout'].items():
+        axis, key = path.split('.')
+        figure['layout'].setdefault(axis, {})[key] = value
+
+
+def figure_state(figure):
+    """
+    Return the points of every trace, in a sorted order, and the axis ranges and ticks of a figure dict.
+    """
+    points = [sorted(zip(*[trace[key] for key in TRACE_KEYS if key in trace]), key=repr) for trace in figure['data']]
+    axes = {axis: {key: figure['layout'][axis].get(key) for key in ['range', 'tickvals', 'ticktext']}
+            for axis in ['xaxis', 'xaxis2', 'yaxis']}
+    return points, axes
+
+
+async def websocket_client(port, messages):
+    """
+    Connect to a ChartServer websocket and collect its messages until it closes.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(('GET /ws HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                  'Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n').format(key).encode())
+    assert (await reader.readuntil(b'\r\n\r\n')).startswith(b'HTTP/1.1 101')
+    while True:
+        opcode, payload = await read_frame(reader)
+        if opcode == 0x8:
+            break
+        messages.append(json.loads(payload))
+    writer.close()
+
+
+async def serve_feed(clients, late_clients):
+    """
+    Serve a chart processed on HISTORY candles while CANDLES more are built tick by tick, with clients
+    connected from the start and late_clients connecting halfway through. Return the messages of every
+    client and the figure of plot for the final window.
+    """
+    orderflow_data, ohlc_data = synthetic_candles(HISTORY + CANDLES, levels=LEVELS, layout='range', seed=6)
+    chart = OrderFlowChart(orderflow_data.iloc[:HISTORY * LEVELS].copy(), ohlc_data.iloc[:HISTORY].copy(),
+                           identifier_col='identifier', integer_codes=True, lazy_text=True)
+    chart.process_data()
+    server = ChartServer(chart, window=WINDOW, fps=50)
+    await server.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+
+    received = [[] for _ in range(clients + late_clients)]
+    tasks = [asyncio.ensure_future(websocket_client(port, messages)) for messages in received[:clients]]
+    await asyncio.sleep(0.2)
+    for position in range(HISTORY, HISTORY + CANDLES):
+        if position == HISTORY + CANDLES // 2:
+            tasks += [asyncio.ensure_future(websocket_client(port, messages)) for messages in received[clients:]]
+        candle = orderflow_data.iloc[position * LEVELS:(position + 1) * LEVELS]
+        ohlc_row = ohlc_data.iloc[position:position + 1]
+        for tick in range(1, TICKS + 1):
+            partial = candle.assign(bid_size=np.ceil(candle['bid_size'] * tick / TICKS),
+                                    ask_size=np.ceil(candle['ask_size'] * tick / TICKS))
+            if tick == 1:
+                server.append(partial, ohlc_row)
+            else:
+                server.update_last_candle(partial, ohlc_row)
+            await asyncio.sleep(0.005)
+    await asyncio.sleep(0.2)
+    assert server._dirty is None
+
+    fig = chart.plot(return_figure=True, window=WINDOW)
+    expected = json.loads(json.dumps({'data': [trace.to_plotly_json() for trace in fig.data],
+                                      'layout': fig.layout.to_plotly_json()}, cls=PlotlyJSONEncoder))
+    await server.stop()
+    await asyncio.gather(*tasks)
+    return received, expected
+
+
+@pytest.fixture(scope='module')
+def feed():
+    return asyncio.run(serve_feed(clients=3, late_clients=2))
+
+
+def test_every_client_rebuilds_the_figure_of_plot(feed):
+    received, expected = feed
+    for messages in received:
+        assert messages[0]['type'] == 'figure'
+        figure = {}
+        for message in messages:
+            apply_message(figure, message)
+        assert figure_state(figure) == figure_state(expected)
+
+
+def test_deltas_move_the_view_to_the_new_candles(feed):
+    received, expected = feed
+    deltas = [message for message in received[0] if message['type'] == 'delta']
+    moved = [message for message in deltas if 'xaxis.range' in message['layout']]
+    assert moved
+    assert all(message['end'] - message['start'] == WINDOW for message in deltas)
+    assert moved[-1]['layout']['xaxis.range'] == expected['layout']['xaxis']['range']
+    assert moved[-1]['layout']['yaxis.range'] == expected['layout']['yaxis']['range']
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node to run the page script')
+def test_page_script_rebuilds_the_figure_of_plot(feed, tmp_path):
+    received, expected = feed
+    script = tmp_path / 'client.js'
+    script.write_text(CLIENT_SCRIPT.replace('{plot_id}', 'orderflow-chart'))
+    for i, messages in enumerate(received):
+        path = tmp_path / 'messages{}.json'.format(i)
+        path.write_text(json.dumps(messages))
+        output = subprocess.run(['node', '-e', NODE_RUNNER, str(script), str(path)],
+                                capture_output=True, text=True, check=True).stdout
+        assert figure_state(json.loads(output)) == figure_state(expected)
+
+
+def test_page_is_served():
+    async def get_page():
+        orderflow_data, ohlc_data = synthetic_candles(10, levels=LEVELS, layout='range')
+        server = ChartServer(OrderFlowChart(orderflow_data, ohlc_data, identifier_col='identifier'))
+        await server.start(port=0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+        writer.write(b'GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        await server.stop()
+        return response.decode()
+
+    response = asyncio.run(get_page())
+    assert response.startswith('HTTP/1.1 200 OK')
+    assert "new WebSocket(" in response
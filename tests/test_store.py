@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+from conftest import canonical
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.data_wrangling import PROCESSED_FRAMES
+from orderflow_chart.store import SessionStore
+from orderflow_chart.synthetic import synthetic_candles, write_csv
+
+LEVELS = 5
+# the modes partitions are processed with, the session indicators change at midnight with the partitions
+MODES = [{}, {'integer_codes': True}, {'compact': True},
+         {'imbalance_engine': 'diagonal', 'indicators': {'name': 'session', 'session': '1D'}}]
+
+
+@pytest.fixture(scope='module')
+def time_csv(tmp_path_factory):
+    # 1min candles over four days
+    orderflow_data, ohlc_data = synthetic_candles(4000, levels=LEVELS, layout='time', seed=11)
+    path = tmp_path_factory.mktemp('csv')
+    write_csv(orderflow_data, ohlc_data, path / 'orderflow.csv', path / 'ohlc.csv', layout='time')
+    return str(path / 'orderflow.csv'), str(path / 'ohlc.csv')
+
+
+def assert_same_partitions(expected, actual):
+    """
+    Check that two series of ES 1min hold the same raw frames in every partition, and the same
+    processed frames whatever their row order.
+    """
+    assert expected.days('ES', '1min') == actual.days('ES', '1min')
+    for day in expected.days('ES', '1min'):
+        start, end = day + ' 00:00', day + ' 23:59:59'
+        for a, b in zip(expected.read('ES', '1min', start, end), actual.read('ES', '1min', start, end)):
+            pd.testing.assert_frame_equal(a, b)
+        charts = [store.chart('ES', '1min', start, end) for store in [expected, actual]]
+        assert charts[0].granularity == charts[1].granularity
+        for key in PROCESSED_FRAMES:
+            pd.testing.assert_frame_equal(canonical(getattr(charts[0], key)), canonical(getattr(charts[1], key)),
+                                          obj=key)
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+def test_import_batches_match_a_single_write(time_csv, tmp_path, kwargs):
+    whole = SessionStore(str(tmp_path / 'whole'))
+    whole.import_csv('ES', '1min', *time_csv, layout='time', chunksize=10 ** 6, **kwargs)
+    batches = SessionStore(str(tmp_path / 'batches'))
+    batches.import_csv('ES', '1min', *time_csv, layout='time', chunksize=1000, **kwargs)
+    assert len(batches.days('ES', '1min')) == 4
+    assert_same_partitions(whole, batches)
+
+
+def test_batches_are_processed_on_their_own(time_csv, tmp_path, monkeypatch):
+    processed = []
+    process_data = OrderFlowChart.process_data
+
+    def count(self, *args, **kwargs):
+        processed.append(self.ohlc_data.shape[0])
+        return process_data(self, *args, **kwargs)
+
+    monkeypatch.setattr(OrderFlowChart, 'process_data', count)
+    store = SessionStore(str(tmp_path))
+    store.import_csv('ES', '1min', *time_csv, layout='time', chunksize=1000)
+    # only the first batch of every day is processed as a whole
+    assert len(processed) == 4
+    assert max(processed) <= 1000 // LEVELS
+
+
+def test_replaced_and_earlier_candles_process_the_day_again(tmp_path):
+    orderflow_data, ohlc_data = synthetic_candles(300, levels=LEVELS, layout='range', seed=12)
+    whole = SessionStore(str(tmp_path / 'whole'))
+    whole.write('ES', '1min', orderflow_data, ohlc_data, identifier_col='identifier')
+
+    store = SessionStore(str(tmp_path / 'store'))
+    rows = lambda first, last: (orderflow_data.iloc[first * LEVELS:last * LEVELS], ohlc_data.iloc[first:last])
+    store.write('ES', '1min', *rows(100, 200), identifier_col='identifier')
+    store.write('ES', '1min', *rows(0, 100), identifier_col='identifier')
+    changed = orderflow_data.iloc[250 * LEVELS:260 * LEVELS].assign(bid_size=0.0)
+    store.write('ES', '1min', changed, ohlc_data.iloc[250:260], identifier_col='identifier')
+    store.write('ES', '1min', *rows(200, 300), identifier_col='identifier')
+    assert_same_partitions(whole, store)
+
+
+@pytest.mark.parametrize('kwargs', MODES[:2])
+def test_cumulative_delta_runs_on_across_days(time_csv, tmp_path, kwargs):
+    store = SessionStore(str(tmp_path))
+    store.import_csv('ES', '1min', *time_csv, layout='time', chunksize=1000, **kwargs)
+    chart = store.chart('ES', '1min')
+    full = OrderFlowChart(*store.read('ES', '1min'), **kwargs)
+    full.process_data()
+    for labels in [chart.labels, full.labels]:
+        assert labels[labels['type'] == 'cum_delta']['value'].isna().sum() == full.cum_delta_window - 1
+    for name in ['delta', 'cum_delta', 'roc', 'volume']:
+        expected, actual = [labels[labels['type'] == name] for labels in [full.labels, chart.labels]]
+        pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual.reset_index(drop=True), obj=name)
+    assert chart.ohlc_data['identifier'].is_unique
+    assert len(chart.plot(return_figure=True, window=50).data) > 0
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orderflow_chart import OrderFlowChart
+from orderflow_chart.synthetic import synthetic_candles
+
+LEVELS = 10
+MODES = [{}, {'integer_codes': True}, {'compact': True},
+         {'imbalance_engine': 'diagonal', 'indicators': {'name': 'session', 'session': '1h'}}]
+
+
+def candle_rows(orderflow_data, ohlc_data, start, end):
+    """
+    Return the orderflow and ohlc rows of the candles in [start, end) of synthetic candles.
+    """
+    return orderflow_data.iloc[start * LEVELS:end * LEVELS], ohlc_data.iloc[start:end]
+
+
+def partial(orderflow_rows, fraction):
+    """
+    Return the rows of a candle still being built, with a fraction of its final sizes.
+    """
+    return orderflow_rows.assign(bid_size=np.floor(orderflow_rows['bid_size'] * fraction),
+                                 ask_size=np.floor(orderflow_rows['ask_size'] * fraction))
+
+
+def stream(orderflow_data, ohlc_data, history, batch, identifier_col, **kwargs):
+    """
+    Return a chart processed on the first history candles, to which the others are appended batch
+    candles at a time, the last candle of every batch first coming in half built.
+    """
+    chart = OrderFlowChart(*[frame.copy() for frame in candle_rows(orderflow_data, ohlc_data, 0, history)],
+                           identifier_col=identifier_col, **kwargs)
+    chart.process_data()
+    for start in range(history, ohlc_data.shape[0], batch):
+        end = min(start + batch, ohlc_data.shape[0])
+        orderflow_rows, ohlc_rows = candle_rows(orderflow_data, ohlc_data, start, end)
+        last = orderflow_rows.iloc[-LEVELS:]
+        chart.append(pd.concat([orderflow_rows.iloc[:-LEVELS], partial(last, 0.5)]), ohlc_rows)
+        chart.update_last_candle(last, ohlc_rows.iloc[-1:])
+    return chart
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+def test_append_and_update_match_a_full_recompute(kwargs, assert_same_frames):
+    orderflow_data, ohlc_data = synthetic_candles(300, levels=LEVELS, layout='range', seed=1)
+    chart = stream(orderflow_data, ohlc_data, 100, 7, 'identifier', **kwargs)
+    full = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col='identifier', **kwargs)
+    full.process_data()
+    assert_same_frames(full, chart)
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+def test_candles_without_identifiers_stay_unique_across_batches(kwargs, assert_same_frames):
+    orderflow_data, ohlc_data = synthetic_candles(3000, levels=LEVELS, layout='time', seed=2)
+    chart = stream(orderflow_data, ohlc_data, 500, 50, None, **kwargs)
+    chart.flush()
+    assert chart.ohlc_data['identifier'].is_unique
+    full = OrderFlowChart(orderflow_data.copy(), ohlc_data.copy(), identifier_col=None, **kwargs)
+    full.process_data()
+    assert_same_frames(full, chart)
+    fig = chart.plot(return_figure=True, window=20)
+    assert len(fig.data) > 0
+
+
+def test_updates_before_a_flush_are_merged_once():
+    orderflow_data, ohlc_data = synthetic_candles(30, levels=LEVELS, layout='range', seed=3)
+    chart = OrderFlowChart(*[frame.copy() for frame in candle_rows(orderflow_data, ohlc_data, 0, 20)],
+                           identifier_col='identifier')
+    chart.process_data()
+    orderflow_rows, ohlc_rows = candle_rows(orderflow_data, ohlc_data, 20, 21)
+    chart.append(partial(orderflow_rows, 0.3), ohlc_rows)
+    for fraction in [0.6, 0.9, 1.0]:
+        chart.update_last_candle(partial(orderflow_rows, fraction), ohlc_rows)
+    chart.flush()
+    chart.flush()
+    assert chart.ohlc_data.shape[0] == 21
+    assert chart.df.shape[0] == 21 * LEVELS
+    last = chart.df[chart.df.index == ohlc_rows['identifier'].iloc[0]]
+    np.testing.assert_array_equal(np.sort(last['bid_size'].to_numpy()), np.sort(orderflow_rows['bid_size'].to_numpy()))